@@ -1 +1 @@
-from .api import black_category,black_user,black_exclusion
\ No newline at end of file
+from .api import black_category,black_user,black_exclusion,black_changes,black_jobs
\ No newline at end of file
@@ -1,3 +1,5 @@
 from .category import black_category
 from .exclusion import black_exclusion
-from .user import black_user
\ No newline at end of file
+from .user import black_user
+from .changes import black_changes
+from .jobs import black_jobs
\ No newline at end of file
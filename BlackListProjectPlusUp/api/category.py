@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from fastapi.encoders import jsonable_encoder
 
 from utils.BaseResponse import success_response, error_response, GeneralResponse
@@ -8,14 +8,20 @@ from utils.BaseResponse import success_response, error_response, GeneralResponse
 from enum import IntEnum
 from typing import List, Union
 from fastapi import status
+
+from BlackListProjectPlusUp.jobs import job_runner
+from BlackListProjectPlusUp.membership import ChangeSet
 from BlackListProjectPlusUp.models import BlacklistCategory
+from BlackListProjectPlusUp.registry import category_registry
+from BlackListProjectPlusUp.replicas import prefer_replica, primary_transaction
 from BlackListProjectPlusUp.schemas import ReadBlacklistCategory, CreateBlacklistCategory, CategoryEnum, \
     CategoryUpdateRequest, BlacklistCategoryQueryParams
 
 
 black_category = APIRouter()
 
-@black_category.get("/", response_model=GeneralResponse[Union[List[ReadBlacklistCategory], ReadBlacklistCategory]])
+@black_category.get("/", response_model=GeneralResponse[Union[List[ReadBlacklistCategory], ReadBlacklistCategory]],
+                    dependencies=[Depends(prefer_replica)])
 async def query_categories(params: BlacklistCategoryQueryParams = Depends()):
     """
     统一的黑名单类别查询接口
@@ -111,18 +117,25 @@ async def create_category(data: CreateBlacklistCategory):
         entry_name_en=data.entry_name_en,
         describe=data.describe
     )
+    category_registry.invalidate()
+    changes = ChangeSet()
+    changes.set_category(created.id, created.classification)
+    changes.publish()
     return success_response(message="Category insert successfully",
         data=jsonable_encoder(ReadBlacklistCategory.model_validate(created, from_attributes=True)),
         code=status.HTTP_200_OK)
 
 
 @black_category.delete("/{cat_id}", response_model=GeneralResponse)
-async def delete_category(cat_id: int):
+async def delete_category(cat_id: int,
+                          background: bool = Query(False, description="转为后台任务分块删除，返回202")):
     """
     删除指定ID的黑名单类别
 
     请求示例：
     - DELETE /{cat_id}
+    - DELETE /{cat_id}?background=true：分类下记录较多时使用，后台分块删除其下的白名单、黑名单并逐块提交，
+      最后删除分类本身；返回 202 与 job_id，进度通过 GET /blacklist/jobs/{job_id} 查询
 
     返回结果示例：
     - 成功删除返回被删除的类别信息
@@ -135,8 +148,23 @@ async def delete_category(cat_id: int):
             return error_response(message=f"Category {category} is not exist",
                 code=status.HTTP_404_NOT_FOUND)
 
-        # 删除该分类
-        await category.delete()
+        if background:
+            async with primary_transaction() as connection:
+                job = await job_runner.register('category_delete', {'category_id': cat_id}, using_db=connection)
+            job_runner.enqueue(job.id)
+            return success_response(message=f"Category {cat_id} deletion queued as job {job.id}",
+                data={**jsonable_encoder(ReadBlacklistCategory.model_validate(category, from_attributes=True)),
+                      'job_id': job.id},
+                code=status.HTTP_202_ACCEPTED)
+
+        # 删除该分类（外键级联删除该分类下的黑名单记录）
+        changes = ChangeSet()
+        changes.remove_category(cat_id)
+        async with primary_transaction():
+            await category.delete()
+            await changes.write_journal()
+        category_registry.invalidate()
+        changes.publish()
 
         return success_response(message=f"Category with ID {cat_id} has been successfully deleted",
             data=jsonable_encoder(ReadBlacklistCategory.model_validate(category, from_attributes=True)),
@@ -205,6 +233,10 @@ async def update_category(cat_id: int, request: CategoryUpdateRequest):
             category.entry_name_en = request.entry_name_en
     
     await category.save()
+    category_registry.invalidate()
+    changes = ChangeSet()
+    changes.set_category(category.id, category.classification)
+    changes.publish()
 
     return success_response(message="Category updated successfully",
         data=jsonable_encoder(ReadBlacklistCategory.model_validate(category, from_attributes=True)),
@@ -0,0 +1,72 @@
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Literal, Optional
+
+from fastapi import APIRouter, status, Query
+from starlette.responses import Response, StreamingResponse
+from tortoise import timezone as tortoise_timezone
+
+from BlackListProjectPlusUp.models import BlacklistChange
+from utils.BaseResponse import error_response
+
+
+black_changes = APIRouter()
+
+CHANGE_COLUMNS = ('id', 'entity', 'op', 'target_id', 'target_value', 'brand_id', 'category_id', 'level',
+                  'modify_user', 'create_time')
+
+# 只返回写入超过该秒数的变更：序号在插入时分配、提交时才可见，较小序号的事务可能晚于较大序号提交，
+# 直接读到最新序号会让消费方以 since 跳过仍在途的变更
+CHANGE_FEED_LAG_SECONDS = float(os.getenv("CHANGE_FEED_LAG_SECONDS", "2"))
+
+
+async def stream_changes(query, since: int, max_seq: int, chunk_size: int) -> AsyncIterator[bytes]:
+    """按序号分段读取 (since, max_seq] 范围内的变更，逐行输出 NDJSON"""
+    while True:
+        rows = await query.filter(id__gt=since, id__lte=max_seq).order_by('id').limit(chunk_size).values_list(
+            *CHANGE_COLUMNS)
+        if not rows:
+            return
+        lines = []
+        for row in rows:
+            change = dict(zip(('seq',) + CHANGE_COLUMNS[1:], row))
+            change['create_time'] = change['create_time'].isoformat() if change['create_time'] is not None else None
+            lines.append(json.dumps(change, ensure_ascii=False) + '\n')
+        yield ''.join(lines).encode('utf-8')
+        since = rows[-1][0]
+
+
+@black_changes.get('/')
+async def list_changes(since: int = Query(0, ge=0, description="上次同步响应头 X-Change-Seq 的值，首次为0"),
+                       entity: Optional[Literal['user', 'exclusion', 'category']] = None,
+                       chunk_size: int = Query(5000, ge=100, le=50000)):
+    """
+    黑名单/白名单变更日志（增量同步）
+
+    - 返回序号大于 since 的全部变更，NDJSON 每行一条：
+      seq,entity,op,target_id,target_value,brand_id,category_id,level,modify_user,create_time
+    - entity：user-黑名单，exclusion-白名单，category-分类删除（其下黑/白名单随之级联删除，不再逐条记录）
+    - 响应头 X-Change-Seq 为本次返回的最大序号，下次以 since=该值 继续；无新变更时返回 304
+    - 为避免跳过尚未提交的事务，只返回写入超过 CHANGE_FEED_LAG_SECONDS 秒的变更
+
+    请求示例：GET /blacklist/changes?since=123456&entity=user
+    """
+    try:
+        query = BlacklistChange.all()
+        if entity is not None:
+            query = query.filter(entity=entity)
+
+        visible_before = tortoise_timezone.make_naive(
+            datetime.now(timezone.utc) - timedelta(seconds=CHANGE_FEED_LAG_SECONDS))
+        latest = await query.filter(id__gt=since, create_time__lte=visible_before).order_by('-id').limit(
+            1).values_list('id', flat=True)
+        if not latest:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={'X-Change-Seq': str(since)})
+
+        max_seq = latest[0]
+        return StreamingResponse(stream_changes(query, since, max_seq, chunk_size),
+                                 media_type='application/x-ndjson', headers={'X-Change-Seq': str(max_seq)})
+
+    except Exception as e:
+        return error_response(message=f"Query changes failed: {str(e)}", code=status.HTTP_400_BAD_REQUEST)
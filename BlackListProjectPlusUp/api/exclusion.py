@@ -1,19 +1,29 @@
-from typing import List, Union, Optional
+from typing import Dict, List, Union, Optional, Tuple
 
-from fastapi import APIRouter, status, Depends
+from fastapi import APIRouter, status, Depends, Query
 from fastapi.encoders import jsonable_encoder
-from tortoise.transactions import in_transaction
-
-from BlackListProjectPlusUp.models import BlacklistUserExclusion, BlacklistCategory, BlacklistUser
+from tortoise.exceptions import IntegrityError
+
+from BlackListProjectPlusUp.counts import count_rows
+from BlackListProjectPlusUp.jobs import cleanup_covers, job_runner
+from BlackListProjectPlusUp.keys import canonical_value, target_filter
+from BlackListProjectPlusUp.membership import ChangeSet
+from BlackListProjectPlusUp.models import BlacklistJob, BlacklistUserExclusion, BlacklistUser
+from BlackListProjectPlusUp.queries import fetch_by_tuples
+from BlackListProjectPlusUp.registry import category_registry
+from BlackListProjectPlusUp.replicas import prefer_replica, primary_transaction
 from BlackListProjectPlusUp.schemas import CreateBlacklistExclusion, ReadBlacklistExclusion, CreationResult, DeleteResult, \
     BlacklistExclusionQueryParams, DeleteBlacklistExclusion
 from utils.BaseResponse import success_response, error_response, GeneralResponse
+from utils.Pagination import fetch_page
 
 black_exclusion = APIRouter()
 
 
 @black_exclusion.post('/', response_model=GeneralResponse)
-async def create_exclusions(request: List[CreateBlacklistExclusion]):
+async def create_exclusions(request: List[CreateBlacklistExclusion], bulk: bool = False,
+                            chunk_size: int = Query(1000, ge=1, le=5000),
+                            background: bool = Query(False, description="level=1/2 的黑名单清理转为后台任务，返回202")):
     """
     批量创建白名单用户
 
@@ -24,6 +34,11 @@ async def create_exclusions(request: List[CreateBlacklistExclusion]):
        - level=2：删除同classification下所有category的黑名单记录
        - level=1：删除该target的所有黑名单记录
     3. 支持单条和批量创建
+    4. bulk=true 时使用集合化批量写入：按 chunk_size 分块，块内事务中集合查询已存在的白名单、按 level 分组
+       集合查询待清理的黑名单，每块一次 DELETE ... WHERE id IN (...) 与一次多行 INSERT 并逐块提交，
+       removed_from_blacklist 与跳过/失败项和逐条模式一致
+    5. background=true 时白名单立即写入（新的黑名单写入随即被拦截），level=1/2 的黑名单清理登记为后台任务，
+       返回 202 与 job_id，清理进度通过 GET /blacklist/jobs/{job_id} 查询；removed_from_blacklist 只含同步清理的记录
 
     请求参数：
     - target_id: 目标类型（如 1-uid, 2-设备，3-IP，4-电话，5-邮箱 等，必填）
@@ -66,56 +81,81 @@ async def create_exclusions(request: List[CreateBlacklistExclusion]):
     result = CreationResult(success_count=0, failed_count=0, skipped_count=0, skipped_items=[], failed_items=[],
         removed_from_blacklist=0
     )
-
+    deferred = []  # background=true 时转为后台任务的 level=1/2 清理
+    job_id = None  # 清理任务在写入事务内登记，提交后排队
     try:
-        async with in_transaction():
-            for item in request:
-                try:
-                    # 设置默认level=3
-                    level = item.level if item.level is not None else 3
-                    item.target_value = str(item.target_value)
-
-                    # 检查是否已存在相同记录
-                    if await BlacklistUserExclusion.filter(
+        if bulk:
+            job_id = await ingest_exclusions(request, result, chunk_size=chunk_size,
+                                             deferred=deferred if background else None)
+        else:
+            changes = ChangeSet()
+            async with primary_transaction() as connection:
+                for item in request:
+                    try:
+                        # 设置默认level=3
+                        level = item.level if item.level is not None else 3
+                        item.target_value = canonical_value(item.target_id, item.target_value)
+
+                        # 检查是否已存在相同记录
+                        if await BlacklistUserExclusion.filter(
+                                **target_filter(item.target_id, item.target_value),
+                                category_id=item.category_id).exists():
+                            result.skipped_count += 1
+                            result.skipped_items.append(item.dict())
+                            continue
+
+                        # 根据level清理黑名单
+                        if background and level in (1, 2):
+                            deferred.append([item.target_id, item.target_value, item.category_id, level,
+                                             item.modify_user])
+                        else:
+                            removed_count = await clean_blacklist_by_level(
+                                target_id=item.target_id,
+                                target_value=item.target_value,
+                                category_id=item.category_id,
+                                level=level,
+                                changes=changes,
+                                modify_user=item.modify_user
+                            )
+                            result.removed_from_blacklist += removed_count
+
+                        # 创建白名单记录
+                        await BlacklistUserExclusion.create(
                             target_id=item.target_id,
                             target_value=item.target_value,
-                            category_id=item.category_id).exists():
-                        result.skipped_count += 1
-                        result.skipped_items.append(item.dict())
-                        continue
-
-                    # 根据level清理黑名单
-                    removed_count = await clean_blacklist_by_level(
-                        target_id=item.target_id,
-                        target_value=item.target_value,
-                        category_id=item.category_id,
-                        level=level
-                    )
-                    result.removed_from_blacklist += removed_count
-
-                    # 创建白名单记录
-                    await BlacklistUserExclusion.create(
-                        target_id=item.target_id,
-                        target_value=item.target_value,
-                        category_id=item.category_id,
-                        describe=item.describe,
-                        level=level,
-                        modify_user=item.modify_user
-                    )
-                    result.success_count += 1
-
-                except Exception as e:
-                    result.failed_count += 1
-                    result.failed_items.append({
-                        "data": item.dict(),
-                        "reason": str(e)
-                    })
+                            category_id=item.category_id,
+                            describe=item.describe,
+                            level=level,
+                            modify_user=item.modify_user
+                        )
+                        changes.set_exclusion(item.target_id, item.target_value, item.category_id, level,
+                                              op='insert', modify_user=item.modify_user)
+                        result.success_count += 1
+
+                    except Exception as e:
+                        result.failed_count += 1
+                        result.failed_items.append({
+                            "data": item.dict(),
+                            "reason": str(e)
+                        })
+                if deferred:
+                    job_id = (await job_runner.register('exclusion_cleanup', {'targets': deferred},
+                                                        modify_user=deferred[0][4], using_db=connection)).id
+                await changes.write_journal()
+            changes.publish()
 
         response_data = result.dict()
         status_code = status.HTTP_207_MULTI_STATUS if result.failed_count > 0 else status.HTTP_201_CREATED
+        message = f"Created {result.success_count} exclusions, removed {result.removed_from_blacklist} from blacklist"
+        if job_id is not None:
+            job_runner.enqueue(job_id)
+            response_data['job_id'] = job_id
+            if result.failed_count == 0:
+                status_code = status.HTTP_202_ACCEPTED
+            message += f", cleanup of {len(deferred)} level 1/2 exclusions queued as job {job_id}"
 
         return success_response(
-            message=f"Created {result.success_count} exclusions, removed {result.removed_from_blacklist} from blacklist",
+            message=message,
             data=response_data,
             code=status_code
         )
@@ -127,7 +167,174 @@ async def create_exclusions(request: List[CreateBlacklistExclusion]):
         )
 
 
-async def clean_blacklist_by_level(target_id: int, target_value: str, category_id: int, level: int) -> int:
+CLEAN_COLUMNS = ('id', 'target_id', 'target_value', 'brand_id', 'category_id')
+
+
+async def ingest_exclusions(items: List[CreateBlacklistExclusion], result: CreationResult, chunk_size: int = 1000,
+                            deferred: Optional[list] = None) -> Optional[int]:
+    """
+    集合化批量创建白名单
+
+    1. 分类从进程级分类注册表解析为 {category_id: classification}
+    2. 批内重复项按已存在跳过
+    3. 存活记录按 chunk_size 分块由 insert_new_exclusions 写入，每块在一个事务内按 (target_id, target_value, category_id)
+       元组集合查询并跳过已存在的白名单，其余按 level 分组取出待清理的黑名单：
+       - level=1/2：按 (target_id, target_value) 一次元组查询，level=2 在内存中按 classification 过滤
+       - level=3：按 (target_id, target_value, category_id) 一次元组查询
+       一次 DELETE ... WHERE id IN (...) 清理、一次多行 INSERT 写入白名单，写入变更日志后提交，提交后同步内存结构
+
+    deferred 不为 None 时 level=1/2 不在块内清理，以 [target_id, target_value, category_id, level, modify_user]
+    登记到同一个清理任务：首个需要清理的块在其事务内创建任务，之后的块在各自事务内追加，提交后追加到 deferred
+
+    跳过/失败项与逐条写入一致（按请求顺序），结果累加到 result 中；返回清理任务 id（未登记时为 None），由调用方排队
+    """
+    max_length = BlacklistUserExclusion._meta.fields_map['target_value'].max_length
+    outcomes = {}  # 请求下标 -> (是否跳过, 原因)
+
+    for item in items:
+        item.target_value = canonical_value(item.target_id, item.target_value)
+    levels = [item.level if item.level is not None else 3 for item in items]
+
+    classifications = await category_registry.classifications()
+
+    valid = []
+    for index, item in enumerate(items):
+        if item.category_id not in classifications:
+            outcomes[index] = (False, f"Category {item.category_id} not found")
+        elif len(item.target_value) > max_length:
+            outcomes[index] = (False, f"target_value exceeds {max_length} characters")
+        else:
+            valid.append(index)
+
+    # 批内重复项按已存在跳过
+    keys = {index: (items[index].target_id, items[index].target_value, items[index].category_id) for index in valid}
+    seen = set()
+    pending = []
+    for index in valid:
+        if keys[index] in seen:
+            outcomes[index] = (True, None)
+            continue
+        seen.add(keys[index])
+        pending.append(index)
+
+    job_id = None
+    for i in range(0, len(pending), chunk_size):
+        chunk = pending[i:i + chunk_size]
+        try:
+            inserted, removed, job_id = await insert_new_exclusions(items, keys, levels, chunk, classifications,
+                                                                    deferred=deferred, job_id=job_id)
+        except Exception as e:
+            for index in chunk:
+                outcomes[index] = (False, str(e))
+            continue
+
+        result.success_count += len(inserted)
+        result.removed_from_blacklist += removed
+        for index in set(chunk) - set(inserted):
+            outcomes[index] = (True, None)
+
+    for index in sorted(outcomes):
+        skipped, reason = outcomes[index]
+        if skipped:
+            result.skipped_count += 1
+            result.skipped_items.append(items[index].dict())
+        else:
+            result.failed_count += 1
+            result.failed_items.append({"data": items[index].dict(), "reason": reason})
+    return job_id
+
+
+EXCLUSION_KEY_COLUMNS = ('target_id', 'target_value', 'category_id')
+
+
+async def insert_new_exclusions(items: List[CreateBlacklistExclusion], keys: Dict[int, Tuple[int, str, int]],
+                                levels: List[int], chunk: List[int], classifications: Dict[int, int],
+                                deferred: Optional[list] = None, job_id: Optional[int] = None,
+                                retries: int = 2) -> Tuple[List[int], int, Optional[int]]:
+    """
+    在一个事务内写入 chunk 中尚不存在的白名单并清理其覆盖的黑名单，提交后同步内存结构
+
+    事务内先按元组查询已存在的白名单并跳过，只清理、插入、记录变更日志并同步其余记录
+    （不用 INSERT IGNORE，被忽略的冲突行会被误计为成功并写入变更日志）；
+    查询之后被并发写入抢先的键触发唯一键冲突，整块回滚后重新查询再写入，最多重试 retries 次。
+    deferred 不为 None 时 level=1/2 不在块内清理，而是在同一事务内登记清理任务（job_id 为 None 时创建，
+    否则把本块目标追加到已提交的 deferred 之后），提交后本块目标追加到 deferred
+
+    返回 (实际插入的请求下标, 清理的黑名单条数, 清理任务 id)
+    """
+    clean_wide = deferred is None
+    for attempt in range(retries + 1):
+        changes = ChangeSet()
+        try:
+            async with primary_transaction() as connection:
+                existing = set(await fetch_by_tuples(BlacklistUserExclusion, EXCLUSION_KEY_COLUMNS,
+                                                     [keys[index] for index in chunk], EXCLUSION_KEY_COLUMNS))
+                inserted = [index for index in chunk if keys[index] not in existing]
+
+                rows_by_target: Dict[Tuple[int, str], Dict[int, tuple]] = {}
+                wide = [keys[index][:2] for index in inserted if levels[index] in (1, 2) and clean_wide]
+                narrow = [keys[index] for index in inserted if levels[index] not in (1, 2)]
+                rows = []
+                if wide:
+                    rows += await fetch_by_tuples(BlacklistUser, ('target_id', 'target_value'), wide, CLEAN_COLUMNS)
+                if narrow:
+                    rows += await fetch_by_tuples(BlacklistUser, ('target_id', 'target_value', 'category_id'), narrow,
+                                                  CLEAN_COLUMNS)
+                for row in rows:
+                    rows_by_target.setdefault((row[1], row[2]), {})[row[0]] = row
+
+                # 按请求顺序认领各自范围内的黑名单，被多条白名单覆盖的记录只清理一次
+                removed = []
+                for index in inserted:
+                    target_id, target_value, category_id = keys[index]
+                    level = levels[index]
+                    if level in (1, 2) and not clean_wide:
+                        continue
+                    target_rows = rows_by_target.get((target_id, target_value), {})
+                    for row_id, row in list(target_rows.items()):
+                        if cleanup_covers(level, category_id, row[4], classifications):
+                            del target_rows[row_id]
+                            removed.append(row_id)
+                            changes.remove_user(target_id, target_value, row[3], row[4],
+                                                modify_user=items[index].modify_user)
+
+                if removed:
+                    await BlacklistUser.filter(id__in=removed).delete()
+                if inserted:
+                    await BlacklistUserExclusion.bulk_create([
+                        BlacklistUserExclusion(target_id=items[index].target_id,
+                                               target_value=items[index].target_value,
+                                               category_id=items[index].category_id,
+                                               describe=items[index].describe,
+                                               level=levels[index],
+                                               modify_user=items[index].modify_user)
+                        for index in inserted
+                    ])
+                for index in inserted:
+                    changes.set_exclusion(*keys[index], levels[index], op='insert',
+                                          modify_user=items[index].modify_user)
+                targets = [] if clean_wide else [[*keys[index], levels[index], items[index].modify_user]
+                                                 for index in inserted if levels[index] in (1, 2)]
+                chunk_job_id = job_id
+                if targets and job_id is None:
+                    chunk_job_id = (await job_runner.register('exclusion_cleanup', {'targets': targets},
+                                                              modify_user=targets[0][4], using_db=connection)).id
+                elif targets:
+                    await BlacklistJob.filter(id=job_id).using_db(connection).update(
+                        params={'targets': deferred + targets})
+                await changes.write_journal()
+        except IntegrityError:
+            if attempt == retries:
+                raise
+            continue
+        changes.publish()
+        if targets:
+            deferred.extend(targets)
+        return inserted, len(removed), chunk_job_id
+
+
+async def clean_blacklist_by_level(target_id: int, target_value: str, category_id: int, level: int,
+                                   changes: Optional[ChangeSet] = None, modify_user: int = 0) -> int:
     """
     根据白名单级别清理黑名单
 
@@ -136,33 +343,38 @@ async def clean_blacklist_by_level(target_id: int, target_value: str, category_i
     - level=2：删除同classification下所有category的该target黑名单记录
     - level=3（默认）：仅删除相同category的该target黑名单记录
 
+    changes: 逐条记录被清理的黑名单（含变更日志），由调用方在事务内写入日志、提交后统一发布
+
     返回删除的记录数
     """
+    changes = changes if changes is not None else ChangeSet()
+    query = BlacklistUser.filter(**target_filter(target_id, target_value))
     if level == 1:
         # 删除该uid的所有黑名单记录
-        return await BlacklistUser.filter(target_id=target_id,target_value=target_value).delete()
+        pass
 
     elif level == 2:
         # 获取当前category的classification
-        category = await BlacklistCategory.get(id=category_id)
-        # 获取同classification的所有category_id
-        category_ids = await BlacklistCategory.filter(
-            classification=category.classification
-        ).values_list('id', flat=True)
-        # 删除这些category下的该uid记录
-        return await BlacklistUser.filter(
-            target_id=target_id,target_value=target_value,
-            category_id__in=category_ids
-        ).delete()
+        category = await category_registry.get(category_id)
+        if not category:
+            raise ValueError(f"Category {category_id} not found")
+        # 获取同classification的所有category_id，删除这些category下的该uid记录
+        category_ids = await category_registry.ids_for_classification(category['classification'])
+        query = query.filter(category_id__in=category_ids)
 
     else:  # level=3或未指定
         # 仅删除相同category的记录
-        return await BlacklistUser.filter(
-            target_id=target_id,target_value=target_value,
-            category_id=category_id
-        ).delete()
+        query = query.filter(category_id=category_id)
 
-@black_exclusion.get('/',response_model_exclude_unset=True)
+    # 先取出被清理的记录再按主键删除，变更日志与实际删除的行一一对应
+    rows = await query.values_list('id', 'brand_id', 'category_id')
+    if not rows:
+        return 0
+    for _, brand_id, row_category_id in rows:
+        changes.remove_user(target_id, target_value, brand_id, row_category_id, modify_user=modify_user)
+    return await BlacklistUser.filter(id__in=[row[0] for row in rows]).delete()
+
+@black_exclusion.get('/',response_model_exclude_unset=True, dependencies=[Depends(prefer_replica)])
 async def query_exclusions(params: BlacklistExclusionQueryParams = Depends()):
     """
     统一白名单查询接口
@@ -179,15 +391,20 @@ async def query_exclusions(params: BlacklistExclusionQueryParams = Depends()):
     - 查询指定分类: GET /?category_id=1
     - 查询指定目标和分类: GET /?target_id=1&target_value=xxx&category_id=1
     - 分页查询：GET /?offset=10&limit=20
+    - 游标分页：GET /?limit=20&after_id=上一页返回的 next_cursor（按主键升序，深分页与首页代价相同）
+    - 总数策略 count_mode：exact（默认，精确计数并按条件缓存，白名单写入后失效）、
+      estimate（按表统计信息估算，count_estimated=true）、none（不计数）
 
     返回结果：
-    - 返回符合条件的白名单记录列表
+    - 返回符合条件的白名单记录列表，next_cursor 为空表示没有下一页
     - 如果无记录，返回错误信息
     """
     try:
 
         # 添加过滤条件
         filter_params = {}
+        if params.target_id is not None and params.target_value is not None:
+            params.target_value = canonical_value(params.target_id, params.target_value)
         if params.target_id is not None:
             filter_params.update({
                 "target_id": params.target_id,
@@ -195,14 +412,20 @@ async def query_exclusions(params: BlacklistExclusionQueryParams = Depends()):
             })
         if params.category_id is not None:
             # 检查分类是否存在
-            if not await BlacklistCategory.filter(id=params.category_id).exists():
+            if not await category_registry.get(params.category_id):
                 return error_response(message=f"Category ID {params.category_id} does not exist", code=status.HTTP_404_NOT_FOUND)
             filter_params["category_id"] = params.category_id
         
-        query = BlacklistUserExclusion.filter(**filter_params)
-        total_length = await query.count()
-        # 检查是否存在符合条件的记录
-        if not await query.exists():
+        query_params = dict(filter_params)
+        if params.target_id is not None and params.target_value is not None:
+            # 按 target_key 匹配（兼容历史写法）；计数缓存仍以规范写法的条件为键，与写入路径的失效条件一致
+            del query_params['target_value']
+            query_params.update(target_filter(params.target_id, params.target_value))
+        query = BlacklistUserExclusion.filter(**query_params)
+        result, next_cursor = await fetch_page(query, params.limit, params.offset, params.after_id)
+
+        # 首页为空即不存在符合条件的记录，无需额外的 exists() 查询
+        if not result and not params.offset and not params.after_id:
             error_msg = "No exclusion records found"
             if params.target_id and params.target_value and params.category_id:
                 error_msg = f"User {params.target_id,params.target_value} has no exclusions in category {params.category_id}"
@@ -212,14 +435,15 @@ async def query_exclusions(params: BlacklistExclusionQueryParams = Depends()):
                 error_msg = f"No exclusions found for category {params.category_id}"
 
             return error_response(message=error_msg, code=status.HTTP_200_OK)
-        
-        # 执行查询
-        result = await query.offset(params.offset).limit(params.limit).all()
-    
+
+        total_length, estimated = await count_rows(BlacklistUserExclusion, query, filter_params, params.count_mode)
+
         return {
             'message':"Successfully retrieved exclusion data",
-            'data':jsonable_encoder(result),
+            'data':jsonable_encoder([ReadBlacklistExclusion.model_validate(r, from_attributes=True) for r in result]),
             'count':total_length,
+            'count_estimated':estimated,
+            'next_cursor':next_cursor,
             'code':status.HTTP_200_OK
         }
 
@@ -263,12 +487,13 @@ async def delete_exclusions(requests: Union[DeleteBlacklistExclusion, List[Delet
 
     result = DeleteResult(success_count=0, failed_count=0, skipped_count=0, skipped_items=[], failed_items=[],
         deleted_items=[])
+    changes = ChangeSet()
 
     try:
-        async with in_transaction():
+        async with primary_transaction():
             for req in request_list:
                 try:
-                    req.target_value = str(req.target_value)
+                    req.target_value = canonical_value(req.target_id, req.target_value)
                     # 构建查询条件
                     query = BlacklistUserExclusion
                     if req.id is not None:
@@ -276,8 +501,8 @@ async def delete_exclusions(requests: Union[DeleteBlacklistExclusion, List[Delet
                     else:
                         if req.target_id is None or req.target_value is None or req.category_id is None:
                             raise ValueError("Must provide either id or both target_id, target_value and category_id")
-                        query = query.filter(target_id=req.target_id,
-                        target_value=req.target_value, category_id=req.category_id)
+                        query = query.filter(**target_filter(req.target_id, req.target_value),
+                                             category_id=req.category_id)
 
                     # 执行删除
                     exclusion = await query.first()
@@ -287,12 +512,16 @@ async def delete_exclusions(requests: Union[DeleteBlacklistExclusion, List[Delet
                         continue
 
                     await exclusion.delete()
+                    changes.remove_exclusion(exclusion.target_id, exclusion.target_value, exclusion.category_id,
+                                             level=exclusion.level)
                     result.success_count += 1
                     result.deleted_items.append(jsonable_encoder(ReadBlacklistExclusion.model_validate(exclusion)))
 
                 except Exception as e:
                     result.failed_count += 1
                     result.failed_items.append({"request": req.dict(), "reason": str(e)})
+            await changes.write_journal()
+        changes.publish()
 
         # 构造响应
         response_data = result.dict()
@@ -319,7 +548,8 @@ async def delete_exclusions(requests: Union[DeleteBlacklistExclusion, List[Delet
 
 
 @black_exclusion.put('/', response_model=GeneralResponse)
-async def update_exclusions(request: CreateBlacklistExclusion):
+async def update_exclusions(request: CreateBlacklistExclusion,
+                            background: bool = Query(False, description="level 改为1/2时黑名单清理转为后台任务，返回202")):
     """
       更新白名单记录
 
@@ -337,6 +567,7 @@ async def update_exclusions(request: CreateBlacklistExclusion):
          - level=3：删除该目标在相同category下的黑名单记录
          - level=2：删除该目标在相同classification下的所有category记录
          - level=1：删除该目标所有黑名单记录
+         - background=true 且新 level 为 1/2 时清理登记为后台任务，返回 202 与 job_id
 
       请求示例：
       ```
@@ -392,10 +623,9 @@ async def update_exclusions(request: CreateBlacklistExclusion):
         if request.id is not None:
             exclusion = await query.filter(id=request.id).first()
         else:
-            request.target_value = str(request.target_value)
+            request.target_value = canonical_value(request.target_id, request.target_value)
             exclusion = await query.filter(
-                target_id=request.target_id,
-                target_value=request.target_value,
+                **target_filter(request.target_id, request.target_value),
                 category_id=request.category_id
             ).first()
 
@@ -414,26 +644,51 @@ async def update_exclusions(request: CreateBlacklistExclusion):
         if request.level is not None:
             update_data['level'] = request.level
 
-        async with in_transaction():
+        changes = ChangeSet()
+        job_id = None
+        async with primary_transaction() as connection:
             # 执行黑名单清理
             removed_count = 0
-            if need_clean:
+            defer_clean = need_clean and background and new_level in (1, 2)
+            if need_clean and not defer_clean:
                 removed_count = await clean_blacklist_by_level(
                     target_id=exclusion.target_id,
                     target_value=exclusion.target_value,
                     category_id=exclusion.category_id,
-                    level=new_level
+                    level=new_level,
+                    changes=changes,
+                    modify_user=request.modify_user
                 )
 
             # 更新白名单记录
             if update_data:
                 await BlacklistUserExclusion.filter(id=exclusion.id).update(**update_data)
                 exclusion = await BlacklistUserExclusion.get(id=exclusion.id)
+            changes.set_exclusion(exclusion.target_id, exclusion.target_value, exclusion.category_id, exclusion.level,
+                                  op='update', modify_user=request.modify_user)
+            if defer_clean:
+                job_id = (await job_runner.register('exclusion_cleanup', {'targets': [[
+                    exclusion.target_id, exclusion.target_value, exclusion.category_id, new_level,
+                    request.modify_user]]}, modify_user=request.modify_user, using_db=connection)).id
+            await changes.write_journal()
+        changes.publish()
+
+        if defer_clean:
+            job_runner.enqueue(job_id)
+            return success_response(
+                message=f"Update successful, blacklist cleanup queued as job {job_id}",
+                data={
+                    "updated_record": jsonable_encoder(ReadBlacklistExclusion.model_validate(exclusion, from_attributes=True)),
+                    "removed_from_blacklist": 0,
+                    "job_id": job_id
+                },
+                code=status.HTTP_202_ACCEPTED
+            )
 
         return success_response(
             message=f"Update successful{' and cleaned ' + str(removed_count) + ' blacklist records' if need_clean else ''}",
             data={
-                "updated_record": jsonable_encoder(exclusion),
+                "updated_record": jsonable_encoder(ReadBlacklistExclusion.model_validate(exclusion, from_attributes=True)),
                 "removed_from_blacklist": removed_count
             }
         )
@@ -0,0 +1,53 @@
+from typing import Literal, Optional
+
+from fastapi import APIRouter, status, Query
+from fastapi.encoders import jsonable_encoder
+from tortoise import timezone
+
+from BlackListProjectPlusUp.models import BlacklistJob
+from utils.BaseResponse import success_response, error_response, GeneralResponse
+
+
+black_jobs = APIRouter()
+
+
+def describe_job(job: BlacklistJob) -> dict:
+    """任务状态，附带进度（processed/total）与吞吐（行/秒）"""
+    data = jsonable_encoder(job)
+    elapsed = None
+    if job.start_time is not None:
+        end = job.finish_time if job.finish_time is not None else timezone.now()
+        elapsed = max((end - job.start_time).total_seconds(), 0.0)
+    data['elapsed_seconds'] = round(elapsed, 3) if elapsed is not None else None
+    data['progress'] = round(job.processed / job.total, 4) if job.total else (1.0 if job.status == 'succeeded' else None)
+    data['rows_per_second'] = round(job.processed / elapsed, 1) if elapsed else None
+    return data
+
+
+@black_jobs.get('/{job_id}', response_model=GeneralResponse)
+async def get_job(job_id: int):
+    """
+    查询后台任务状态
+
+    返回 status（pending/running/succeeded/failed）、total（开始执行时统计的待处理行数）、processed、chunks、
+    progress、rows_per_second、elapsed_seconds，失败时 error 为失败原因
+    """
+    job = await BlacklistJob.get_or_none(id=job_id)
+    if job is None:
+        return error_response(message=f"Job {job_id} not found", code=status.HTTP_404_NOT_FOUND)
+    return success_response(data=describe_job(job))
+
+
+@black_jobs.get('/', response_model=GeneralResponse)
+async def list_jobs(status_filter: Optional[Literal['pending', 'running', 'succeeded', 'failed']] = Query(
+                        None, alias='status'),
+                    kind: Optional[str] = None,
+                    limit: int = Query(20, ge=1, le=200)):
+    """按创建时间倒序列出最近的后台任务，可按 status、kind 过滤"""
+    query = BlacklistJob.all()
+    if status_filter is not None:
+        query = query.filter(status=status_filter)
+    if kind is not None:
+        query = query.filter(kind=kind)
+    jobs = await query.order_by('-id').limit(limit)
+    return success_response(data=[describe_job(job) for job in jobs])
@@ -1,13 +1,30 @@
-from typing import List, Union, Optional
-
-from fastapi import APIRouter, status, Depends
+import codecs
+import csv
+import io
+import json
+import os
+import zlib
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import List, Union, Optional, Set, Tuple, AsyncIterator, Dict, Literal
+
+from fastapi import APIRouter, status, Depends, Query, Request
 from fastapi.encoders import jsonable_encoder
-from tortoise.exceptions import DBConnectionError
-
-from tortoise.transactions import in_transaction
-from BlackListProjectPlusUp.models import BlacklistUserExclusion, BlacklistUser, BlacklistCategory
+from starlette.responses import Response, StreamingResponse
+from tortoise import timezone as tortoise_timezone
+from tortoise.exceptions import DBConnectionError, IntegrityError
+
+from BlackListProjectPlusUp.bloom import negative_filter
+from BlackListProjectPlusUp.effective import audit_effective_blacklist
+from BlackListProjectPlusUp.keys import canonical_value, target_filter, target_hashes, target_key, target_keys
+from BlackListProjectPlusUp.membership import membership_index, effective_blacklist, ChangeSet
+from BlackListProjectPlusUp.models import BlacklistUserExclusion, BlacklistUser
+from BlackListProjectPlusUp.queries import fetch_by_tuples, fetch_exclusions_for_targets, target_value_filter
+from BlackListProjectPlusUp.registry import category_registry
+from BlackListProjectPlusUp.replicas import prefer_replica, primary_transaction, replica_pool
 from BlackListProjectPlusUp.schemas import *
 from utils.BaseResponse import success_response, error_response, GeneralResponse
+from utils.Pagination import fetch_page
 
 
 black_user = APIRouter()
@@ -15,7 +32,8 @@ black_user = APIRouter()
 
 
 @black_user.post('/', response_model=GeneralResponse)
-async def create_blacklist_users(request: List[CreateBlacklistUser]):
+async def create_blacklist_users(request: List[CreateBlacklistUser], bulk: bool = False,
+                                 chunk_size: int = Query(1000, ge=1, le=5000)):
     """
     批量创建黑名单用户
 
@@ -26,6 +44,8 @@ async def create_blacklist_users(request: List[CreateBlacklistUser]):
        - level=2：校验相同classification下的所有category白名单记录，若IM相关的属于该级别及以上，则可以被所有品牌账号发推送
        - level=1：校验该target的所有白名单记录
     3. 如果记录已存在或存在于白名单中，则自动跳过
+    4. bulk=true 时使用集合化批量写入：分类一次性解析、白名单按批集合查询，
+       存活记录按 chunk_size 分块，块内事务中集合查询已存在记录后多行 INSERT 并逐块提交，返回结构与逐条模式一致
 
     请求参数：
     - target_id: 目标类型（如 1-uid, 2-设备，3-IP，4-电话，5-邮箱 等，必填）
@@ -60,56 +80,70 @@ async def create_blacklist_users(request: List[CreateBlacklistUser]):
     """
     result = CreationResult(success_count=0, failed_count=0, skipped_count=0, skipped_items=[], failed_items=[],
                             removed_from_blacklist=0)
-
     try:
-        async with in_transaction():
-            for item in request:
-                try:
-                    item.target_value = str(item.target_value)
-                    # 获取当前category的classification
-                    category = await BlacklistCategory.get_or_none(id=item.category_id)
-                    if not category:
-                        raise ValueError(f"Category {item.category_id} not found")
-
-                    # 检查白名单（按level分级校验）
-                    skip_reason = await check_exclusion_levels(item.target_id,item.target_value, item.category_id, category.classification)
-                    if skip_reason:
-                        result.skipped_count += 1
-                        result.skipped_items.append({
-                            "data": item.dict(),
-                            "reason": skip_reason
-                        })
-                        continue
-
-                    # 检查是否已存在于黑名单
-                    if await BlacklistUser.filter(target_id=item.target_id,
-                                                  target_value = item.target_value,
-                                                  brand_id = item.brand_id,
-                                                  category_id=item.category_id).exists():
-                        result.skipped_count += 1
-                        result.skipped_items.append({
+        if bulk:
+            await ingest_blacklist_users(request, result, chunk_size=chunk_size)
+        else:
+            changes = ChangeSet()
+            async with primary_transaction():
+                # 一次取出涉及的分类，并对整批目标做白名单（按level分级）校验
+                for item in request:
+                    item.target_value = canonical_value(item.target_id, item.target_value)
+                classifications = await category_registry.classifications()
+                skip_reasons = await check_exclusion_levels_batch([
+                    (item.target_id, item.target_value, item.category_id, classifications[item.category_id])
+                    for item in request if item.category_id in classifications
+                ])
+                skip_reasons = iter(skip_reasons)
+
+                for item in request:
+                    try:
+                        # 校验category是否存在
+                        if item.category_id not in classifications:
+                            raise ValueError(f"Category {item.category_id} not found")
+
+                        # 检查白名单（按level分级校验）
+                        skip_reason = next(skip_reasons)
+                        if skip_reason:
+                            result.skipped_count += 1
+                            result.skipped_items.append({
+                                "data": item.dict(),
+                                "reason": skip_reason
+                            })
+                            continue
+
+                        # 检查是否已存在于黑名单
+                        if await BlacklistUser.filter(**target_filter(item.target_id, item.target_value),
+                                                      brand_id = item.brand_id,
+                                                      category_id=item.category_id).exists():
+                            result.skipped_count += 1
+                            result.skipped_items.append({
+                                "data": item.dict(),
+                                "reason": "Already in blacklist"
+                            })
+                            continue
+
+                        # 创建黑名单记录
+                        await BlacklistUser.create(target_id=item.target_id,
+                                                   target_value = item.target_value,
+                                                   brand_id = item.brand_id,
+                                                   category_id=item.category_id,
+                                                   modify_user = item.modify_user,
+                                                   describe = item.describe,
+                        )
+                        changes.add_user(item.target_id, item.target_value, item.brand_id, item.category_id,
+                                         modify_user=item.modify_user)
+                        result.success_count += 1
+
+
+                    except Exception as e:
+                        result.failed_count += 1
+                        result.failed_items.append({
                             "data": item.dict(),
-                            "reason": "Already in blacklist"
+                            "reason": str(e)
                         })
-                        continue
-
-                    # 创建黑名单记录
-                    await BlacklistUser.create(target_id=item.target_id,
-                                               target_value = item.target_value,
-                                               brand_id = item.brand_id,
-                                               category_id=item.category_id,
-                                               modify_user = item.modify_user,
-                                               describe = item.describe,
-                    )
-                    result.success_count += 1
-
-
-                except Exception as e:
-                    result.failed_count += 1
-                    result.failed_items.append({
-                        "data": item.dict(),
-                        "reason": str(e)
-                    })
+                await changes.write_journal()
+            changes.publish()
 
         response_data = {
             "success_count": result.success_count,
@@ -139,6 +173,369 @@ async def create_blacklist_users(request: List[CreateBlacklistUser]):
         )
 
 
+async def ingest_blacklist_users(items: List[CreateBlacklistUser], result: CreationResult, chunk_size: int = 1000):
+    """
+    集合化批量写入黑名单
+
+    1. 分类从进程级分类注册表解析为 {category_id: classification}
+    2. 整批目标的白名单通过 check_exclusion_levels_batch 一次集合查询判定
+    3. 存活记录按 chunk_size 分块由 insert_new_users 写入：事务内按 (target_id, target_value, brand_id, category_id)
+       元组集合查询已存在记录并跳过，只插入、记录变更日志并同步实际写入的行
+
+    跳过/失败项的内容、原因与逐条写入一致（按请求顺序），结果累加到 result 中
+    """
+    max_length = BlacklistUser._meta.fields_map['target_value'].max_length
+    outcomes = {}  # 请求下标 -> (是否跳过, 原因)
+
+    for item in items:
+        item.target_value = canonical_value(item.target_id, item.target_value)
+
+    classifications = await category_registry.classifications()
+
+    valid = []
+    for index, item in enumerate(items):
+        if item.category_id not in classifications:
+            outcomes[index] = (False, f"Category {item.category_id} not found")
+        elif item.brand_id is None:
+            outcomes[index] = (False, "brand_id cannot be null")
+        elif len(item.target_value) > max_length:
+            outcomes[index] = (False, f"target_value exceeds {max_length} characters")
+        else:
+            valid.append(index)
+
+    # 整批目标的白名单一次集合查询
+    skip_reasons = await check_exclusion_levels_batch([
+        (items[index].target_id, items[index].target_value, items[index].category_id,
+         classifications[items[index].category_id])
+        for index in valid
+    ])
+    candidates = []
+    for index, skip_reason in zip(valid, skip_reasons):
+        if skip_reason:
+            outcomes[index] = (True, skip_reason)
+        else:
+            candidates.append(index)
+
+    # 批内重复项与逐条模式一致，按已存在跳过
+    keys = {index: (items[index].target_id, items[index].target_value, items[index].brand_id,
+                    items[index].category_id) for index in candidates}
+    seen = set()
+    pending = []
+    for index in candidates:
+        if keys[index] in seen:
+            outcomes[index] = (True, "Already in blacklist")
+            continue
+        seen.add(keys[index])
+        pending.append(index)
+
+    for i in range(0, len(pending), chunk_size):
+        chunk = pending[i:i + chunk_size]
+        try:
+            inserted = set(await insert_new_users(items, keys, chunk))
+        except Exception as e:
+            for index in chunk:
+                outcomes[index] = (False, str(e))
+            continue
+
+        for index in chunk:
+            if index in inserted:
+                result.success_count += 1
+            else:
+                outcomes[index] = (True, "Already in blacklist")
+
+    for index in sorted(outcomes):
+        skipped, reason = outcomes[index]
+        if skipped:
+            result.skipped_count += 1
+            result.skipped_items.append({"data": items[index].dict(), "reason": reason})
+        else:
+            result.failed_count += 1
+            result.failed_items.append({"data": items[index].dict(), "reason": reason})
+
+
+async def insert_new_users(items: List[CreateBlacklistUser], keys: Dict[int, Tuple[int, str, int, int]],
+                           chunk: List[int], retries: int = 2) -> List[int]:
+    """
+    在一个事务内写入 chunk 中尚不存在的记录，提交后同步成员索引，返回实际插入的请求下标
+
+    事务内先按元组查询已存在的键，只插入其余记录（不用 INSERT IGNORE，被忽略的冲突行会被误计为成功并写入变更日志）；
+    查询之后被并发写入抢先的键触发唯一键冲突，整块回滚后重新查询再写入，最多重试 retries 次
+    """
+    for attempt in range(retries + 1):
+        changes = ChangeSet()
+        try:
+            async with primary_transaction():
+                existing = await fetch_existing_user_keys([keys[index] for index in chunk])
+                inserted = [index for index in chunk if keys[index] not in existing]
+                if inserted:
+                    await BlacklistUser.bulk_create([
+                        BlacklistUser(target_id=items[index].target_id,
+                                      target_value=items[index].target_value,
+                                      brand_id=items[index].brand_id,
+                                      category_id=items[index].category_id,
+                                      modify_user=items[index].modify_user,
+                                      describe=items[index].describe)
+                        for index in inserted
+                    ])
+                for index in inserted:
+                    changes.add_user(*keys[index], modify_user=items[index].modify_user)
+                await changes.write_journal()
+        except IntegrityError:
+            if attempt == retries:
+                raise
+            continue
+        changes.publish()
+        return inserted
+
+
+IMPORT_CONTENT_TYPES = {
+    'application/x-ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+    'text/csv': 'csv',
+}
+
+
+async def iter_body_lines(request: Request) -> AsyncIterator[str]:
+    """逐块读取请求体并按行切分，内存中只保留当前未结束的一行"""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    pending = ''
+    async for chunk in request.stream():
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split('\n')
+        for line in lines:
+            yield line
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+
+async def iter_import_rows(request: Request, fmt: str) -> AsyncIterator[Tuple[int, Union[dict, str]]]:
+    """
+    逐行解析导入数据，返回 (行号, 行数据)
+
+    - ndjson：每行一个JSON对象
+    - csv：首行为表头（target_id,target_value,brand_id,category_id,modify_user,describe），不支持字段内换行；
+      空字段视为未填写
+    解析失败的行返回原始字符串，由调用方记为失败
+    """
+    header = None
+    line_no = 0
+    async for line in iter_body_lines(request):
+        line_no += 1
+        line = line.strip('\r')
+        if not line.strip():
+            continue
+        try:
+            if fmt == 'ndjson':
+                yield line_no, json.loads(line)
+                continue
+            values = next(csv.reader([line]))
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            yield line_no, {key: value for key, value in zip(header, values) if value != ''}
+        except (ValueError, csv.Error):
+            yield line_no, line
+
+
+@black_user.post('/import', response_model=GeneralResponse)
+async def import_blacklist_users(request: Request, chunk_size: int = Query(1000, ge=1, le=5000),
+                                 max_report_items: int = Query(1000, ge=0)):
+    """
+    流式导入黑名单（NDJSON / CSV）
+
+    适用于百万级 uid/设备/电话 的导入，请求体边读取边解析、逐行校验，
+    每满 chunk_size 条按集合化批量模式写入一次，内存占用与上传大小无关。
+
+    请求头：
+    - Content-Type: application/x-ndjson（或 application/jsonl）
+    - Content-Type: text/csv，首行为表头
+
+    请求体示例：
+    ```
+    {"target_id": 1, "target_value": "123", "brand_id": 0, "category_id": 1, "modify_user": 152}
+    {"target_id": 1, "target_value": "456", "category_id": 2, "modify_user": 152, "describe": "可以不填"}
+    ```
+    或
+    ```
+    target_id,target_value,brand_id,category_id,modify_user,describe
+    1,123,0,1,152,
+    1,456,0,2,152,可以不填
+    ```
+
+    返回结构与批量创建接口一致（CreationResult），skipped_items/failed_items 最多保留 max_report_items 条，
+    计数为完整结果
+    """
+    content_type = request.headers.get('content-type', '').split(';')[0].strip().lower()
+    fmt = IMPORT_CONTENT_TYPES.get(content_type)
+    if fmt is None:
+        return error_response(
+            message=f"Unsupported content type '{content_type}', expected one of {list(IMPORT_CONTENT_TYPES)}",
+            code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+        )
+
+    result = CreationResult(success_count=0, failed_count=0, skipped_count=0, skipped_items=[], failed_items=[],
+                            removed_from_blacklist=0)
+
+    async def flush(chunk: List[CreateBlacklistUser]):
+        chunk_result = CreationResult(success_count=0, failed_count=0, skipped_count=0, skipped_items=[],
+                                      failed_items=[], removed_from_blacklist=0)
+        await ingest_blacklist_users(chunk, chunk_result, chunk_size=chunk_size)
+        result.success_count += chunk_result.success_count
+        result.failed_count += chunk_result.failed_count
+        result.skipped_count += chunk_result.skipped_count
+        result.skipped_items.extend(chunk_result.skipped_items[:max_report_items - len(result.skipped_items)])
+        result.failed_items.extend(chunk_result.failed_items[:max_report_items - len(result.failed_items)])
+
+    try:
+        chunk = []
+        async for line_no, row in iter_import_rows(request, fmt):
+            try:
+                if not isinstance(row, dict):
+                    raise ValueError(f"Malformed {fmt} line")
+                chunk.append(CreateBlacklistUser.model_validate(row))
+            except ValueError as e:
+                result.failed_count += 1
+                if len(result.failed_items) < max_report_items:
+                    result.failed_items.append({"data": row, "reason": f"line {line_no}: {e}"})
+                continue
+
+            if len(chunk) >= chunk_size:
+                await flush(chunk)
+                chunk = []
+        if chunk:
+            await flush(chunk)
+
+    except Exception as e:
+        return error_response(
+            message=f"Import aborted after {result.success_count} records: {str(e)}",
+            data=result.dict(),
+            code=status.HTTP_400_BAD_REQUEST
+        )
+
+    if result.failed_count > 0:
+        return success_response(
+            message=f"Import completed with {result.failed_count} failures",
+            data=result.dict(),
+            code=status.HTTP_207_MULTI_STATUS
+        )
+    return success_response(
+        message=f"Imported {result.success_count} records",
+        data=result.dict(),
+        code=status.HTTP_201_CREATED
+    )
+
+
+EXPORT_COLUMNS = ('id', 'target_id', 'target_value', 'brand_id', 'category_id', 'create_time')
+
+
+async def iter_export_chunks(query, after_id: int, max_id: int, chunk_size: int) -> AsyncIterator[List[tuple]]:
+    """按主键分段读取 (after_id, max_id] 范围内的记录，内存中只保留当前一段"""
+    while True:
+        rows = await query.filter(id__gt=after_id, id__lte=max_id).order_by('id').limit(chunk_size).values_list(
+            *EXPORT_COLUMNS)
+        if not rows:
+            return
+        yield rows
+        after_id = rows[-1][0]
+
+
+def encode_export_chunk(rows: List[tuple], fmt: str) -> bytes:
+    # create_time 为最后一列，与查询接口一致输出 ISO 格式
+    rows = [row[:-1] + (row[-1].isoformat() if row[-1] is not None else None,) for row in rows]
+    if fmt == 'ndjson':
+        return ''.join(json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False) + '\n'
+                       for row in rows).encode('utf-8')
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerows(rows)
+    return buffer.getvalue().encode('utf-8')
+
+
+async def stream_export(query, fmt: str, compress: str, after_id: int, max_id: int,
+                        chunk_size: int) -> AsyncIterator[bytes]:
+    """逐段编码导出数据，compress=gzip 时流式压缩"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress == 'gzip' else None
+    encode = compressor.compress if compressor is not None else (lambda data: data)
+    if fmt == 'csv':
+        yield encode((','.join(EXPORT_COLUMNS) + '\n').encode('utf-8'))
+    async for rows in iter_export_chunks(query, after_id, max_id, chunk_size):
+        yield encode(encode_export_chunk(rows, fmt))
+    if compressor is not None:
+        yield compressor.flush()
+
+
+@black_user.get('/export', dependencies=[Depends(prefer_replica)])
+async def export_blacklist_users(request: Request,
+                                 format: Literal['ndjson', 'csv'] = 'ndjson',
+                                 category_id: Optional[int] = None,
+                                 classification: Optional[int] = None,
+                                 target_id: Optional[int] = None,
+                                 since_id: int = Query(0, ge=0, description="增量水位：上次导出的 X-Export-Watermark"),
+                                 compress: Literal['none', 'gzip'] = 'none',
+                                 chunk_size: int = Query(5000, ge=100, le=50000)):
+    """
+    流式导出黑名单（替代按 limit=100 翻页拉取全量）
+
+    - 过滤条件：category_id / classification / target_id，可组合，均不传则导出全表
+    - format：ndjson（每行一个JSON对象）或 csv（首行为表头），字段为 id,target_id,target_value,brand_id,category_id,create_time
+    - compress=gzip：流式 gzip 压缩（Content-Encoding: gzip）
+    - 按主键分段读取，内存占用与总行数无关；导出范围在开始时固定为当前最大主键，导出期间的新增留给下一次增量
+
+    增量拉取：
+    - 响应头 X-Export-Watermark 为本次导出的最大主键，下次以 since_id=该值 只拉取新增记录
+    - 也可使用 If-Modified-Since（按 create_time），无新增记录时返回 304，响应头 Last-Modified 为最新记录的创建时间；
+      HTTP 时间只精确到秒，同一秒内的记录可能重复导出，需要精确去重时使用 since_id
+    - 删除不会体现在增量导出中
+
+    请求示例：GET /export?classification=1&format=csv&compress=gzip&since_id=123456
+    """
+    try:
+        query = BlacklistUser.all()
+        if category_id is not None:
+            query = query.filter(category_id=category_id)
+        if classification is not None:
+            category_ids = await category_registry.ids_for_classification(classification)
+            if not category_ids:
+                return error_response(message=f"No categories found for classification {classification}",
+                                      code=status.HTTP_404_NOT_FOUND)
+            query = query.filter(category_id__in=category_ids)
+        if target_id is not None:
+            query = query.filter(target_id=target_id)
+
+        if_modified_since = request.headers.get('if-modified-since')
+        if if_modified_since:
+            try:
+                modified_since = parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return error_response(message=f"Invalid If-Modified-Since header: {if_modified_since}",
+                                      code=status.HTTP_400_BAD_REQUEST)
+            if modified_since.tzinfo is None:
+                modified_since = modified_since.replace(tzinfo=timezone.utc)
+            query = query.filter(create_time__gt=tortoise_timezone.make_naive(modified_since))
+
+        latest = await query.filter(id__gt=since_id).order_by('-id').limit(1).values_list('id', 'create_time')
+        if not latest and (if_modified_since or since_id):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={'X-Export-Watermark': str(since_id)})
+        max_id, last_modified = latest[0] if latest else (since_id, None)
+
+        headers = {
+            'X-Export-Watermark': str(max_id),
+            'Content-Disposition': f'attachment; filename="blacklist-users.{format}"',
+        }
+        if last_modified is not None:
+            if tortoise_timezone.is_naive(last_modified):
+                last_modified = tortoise_timezone.make_aware(last_modified)
+            headers['Last-Modified'] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+        if compress == 'gzip':
+            headers['Content-Encoding'] = 'gzip'
+        media_type = 'application/x-ndjson' if format == 'ndjson' else 'text/csv; charset=utf-8'
+        return StreamingResponse(stream_export(query, format, compress, since_id, max_id, chunk_size),
+                                 media_type=media_type, headers=headers)
+
+    except Exception as e:
+        return error_response(message=f"Export failed: {str(e)}", code=status.HTTP_400_BAD_REQUEST)
+
+
 async def check_exclusion_levels(target_id: int, target_value: str, category_id: int, classification: int) -> Optional[str]:
     """
     检查白名单级别限制
@@ -149,29 +546,164 @@ async def check_exclusion_levels(target_id: int, target_value: str, category_id:
     - level=2：阻止同classification下所有category的黑名单创建
     - level=3（默认）：仅阻止相同category的黑名单创建
     """
-    # 获取所有该用户的白名单记录
-    exclusions = await BlacklistUserExclusion.filter(target_id=target_id,target_value=target_value).prefetch_related('category')
+    return (await check_exclusion_levels_batch([(target_id, target_value, category_id, classification)]))[0]
+
+
+async def check_exclusion_levels_batch(items: List[Tuple[int, str, int, int]]) -> List[Optional[str]]:
+    """
+    批量检查白名单级别限制
+
+    items: [(target_id, target_value, category_id, classification), ...]
+    所有目标的白名单记录通过一次关联分类表的查询取出，返回与 items 一一对应的跳过原因（None表示可以通过）
+    """
+    exclusions = await fetch_exclusions_for_targets([(item[0], item[1]) for item in items])
+    return [
+        exclusion_skip_reason(exclusions.get((target_id, target_value), []), category_id, classification)
+        for target_id, target_value, category_id, classification in items
+    ]
+
+
+def exclusion_skip_reason(exclusions: List[Tuple[int, Optional[int], int]], category_id: int,
+                          classification: int) -> Optional[str]:
+    """
+    按白名单级别判定是否跳过
 
-    for exclusion in exclusions:
+    exclusions: 该目标的白名单记录 (category_id, level, classification)
+    """
+    for excl_category_id, level, excl_classification in exclusions:
         # level=1：完全阻止
-        if exclusion.level == 1:
-            return f"UID blocked by level=1 exclusion (category_id={exclusion.category_id})"
+        if level == 1:
+            return f"UID blocked by level=1 exclusion (category_id={excl_category_id})"
 
         # level=2：同classification阻止
-        if exclusion.level == 2:
-            # 获取白名单记录的classification
-            excl_classification = exclusion.category.classification
-            if classification == excl_classification:
-                return f"UID blocked by level=2 exclusion (same classification {classification})"
+        if level == 2 and classification == excl_classification:
+            return f"UID blocked by level=2 exclusion (same classification {classification})"
 
         # level=3：相同category阻止（默认）
-        if (exclusion.level == 3 or exclusion.level is None) and exclusion.category_id == category_id:
+        if (level == 3 or level is None) and excl_category_id == category_id:
             return f"UID blocked by level=3 exclusion (category_id={category_id})"
 
     return None
 
 
-@black_user.get('/', response_model_exclude_unset=True)
+USER_KEY_COLUMNS = ('target_id', 'target_value', 'brand_id', 'category_id')
+
+
+async def fetch_existing_user_keys(keys: List[Tuple[int, str, int, int]], match_mode: str = 'tuple',
+                                   batch_size: int = 200) -> Set[Tuple[int, str, int, int]]:
+    """
+    查询请求中已存在于黑名单的 (target_id, target_value, brand_id, category_id)
+
+    match_mode：
+    - tuple（默认）：按元组精确匹配，数据库只返回命中的行
+    - cross：四个独立的 IN 条件，数据库返回笛卡尔积范围内的所有行后在内存中过滤
+    """
+    if match_mode == 'tuple':
+        return set(await fetch_by_tuples(BlacklistUser, USER_KEY_COLUMNS, keys, USER_KEY_COLUMNS,
+                                         chunk_size=batch_size))
+
+    existing_set = set()
+    for i in range(0, len(keys), batch_size):
+        batch = keys[i:i + batch_size]
+        existing_records = await BlacklistUser.filter(
+            target_id__in=list({key[0] for key in batch}),
+            target_value__in=list({key[1] for key in batch}),
+            brand_id__in=list({key[2] for key in batch}),
+            category_id__in=list({key[3] for key in batch})
+        ).values_list(*USER_KEY_COLUMNS)
+        existing_set.update(existing_records)
+    return existing_set
+
+
+async def fetch_existing_with_filter(keys: List[Tuple[int, str, int, int]],
+                                     match_mode: str = 'tuple') -> Set[Tuple[int, str, int, int]]:
+    """
+    先经负向过滤器排除一定不在黑名单中的键，只把可能存在的键交给 fetch_existing_user_keys 查询；
+    过滤器未加载时直接查询
+    """
+    if not negative_filter.ready:
+        return await fetch_existing_user_keys(keys, match_mode)
+
+    candidates = [key for key in dict.fromkeys(keys) if negative_filter.might_contain(*key)]
+    existing_set = await fetch_existing_user_keys(candidates, match_mode) if candidates else set()
+    negative_filter.record_false_positives(sum(1 for key in candidates if key not in existing_set))
+    return existing_set
+
+
+@black_user.get('/filter-stats', response_model=GeneralResponse)
+async def negative_filter_stats(detail: bool = Query(False, description="是否返回每个分组的过滤器信息")):
+    """
+    负向查询过滤器统计：分组数、占用字节、查询次数、直接判定不存在的比例，以及数据库确认后的实际误判率
+    """
+    return success_response(message="Negative lookup filter stats", data=negative_filter.stats(detail),
+                            code=status.HTTP_200_OK)
+
+
+@black_user.get('/replica-stats', response_model=GeneralResponse)
+async def replica_stats():
+    """
+    只读副本统计：各副本最近一次检查的复制延迟、是否参与路由及检查失败原因
+    """
+    return success_response(message="Read replica stats", data=replica_pool.stats(), code=status.HTTP_200_OK)
+
+
+@black_user.get('/effective', response_model=GeneralResponse, dependencies=[Depends(prefer_replica)])
+async def check_effective_blacklist(target_id: int, target_value: str, category_id: int, brand_id: int = 0):
+    """
+    查询目标在指定分类/品牌下是否生效拉黑（在黑名单中且未被任何级别的白名单排除）
+
+    - 生效黑名单就绪时为内存点查，source=index
+    - 否则查询数据库并按白名单级别判定，source=database；
+      excluded_by 非空表示黑名单中存在该记录但被白名单覆盖（数据不一致，可调用 /effective-audit 修复）
+
+    请求示例：GET /effective?target_id=1&target_value=123&category_id=1&brand_id=0
+    """
+    try:
+        target_value = canonical_value(target_id, target_value)
+        if effective_blacklist.ready:
+            return success_response(data={
+                "blocked": effective_blacklist.is_blocked(target_id, target_value, brand_id, category_id),
+                "source": "index"})
+
+        category = await category_registry.get(category_id)
+        if not category:
+            return error_response(message=f"Category {category_id} not found", code=status.HTTP_404_NOT_FOUND)
+
+        in_blacklist = await BlacklistUser.filter(**target_filter(target_id, target_value),
+                                                  brand_id=brand_id, category_id=category_id).exists()
+        excluded_by = None
+        if in_blacklist:
+            exclusions = await fetch_exclusions_for_targets([(target_id, target_value)])
+            excluded_by = exclusion_skip_reason(exclusions.get((target_id, target_value), []), category_id,
+                                                category['classification'])
+        return success_response(data={"blocked": in_blacklist and excluded_by is None, "source": "database",
+                                      "excluded_by": excluded_by})
+
+    except Exception as e:
+        return error_response(message=f"Failed to check effective blacklist: {str(e)}",
+                              code=status.HTTP_400_BAD_REQUEST)
+
+
+@black_user.post('/effective-audit', response_model=GeneralResponse)
+async def audit_effective(repair: bool = False, max_report_items: int = Query(100, ge=0, le=10000)):
+    """
+    黑名单/白名单一致性审计
+
+    - violations：仍被白名单覆盖的黑名单记录数，violation_samples 为前 max_report_items 条明细
+    - index：生效黑名单就绪时，内存结构相对数据库缺失/多余的记录数
+    - repair=true：删除违规的黑名单记录；内存结构不一致时重新加载
+    """
+    try:
+        report = await audit_effective_blacklist(effective_blacklist, repair=repair,
+                                                 max_report_items=max_report_items)
+        return success_response(message=f"Found {report['violations']} blacklist records covered by exclusions",
+                                data=jsonable_encoder(report))
+    except Exception as e:
+        return error_response(message=f"Effective blacklist audit failed: {str(e)}",
+                              code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@black_user.get('/', response_model_exclude_unset=True, dependencies=[Depends(prefer_replica)])
 async def query_blacklist_users(params: BlacklistUserQueryParams = Depends()):
     """
     统一黑名单查询接口
@@ -184,17 +716,17 @@ async def query_blacklist_users(params: BlacklistUserQueryParams = Depends()):
     - target_id/target_value + category_id: 查询指定目标在指定分类的黑名单记录
     - target_id/target_value + classification: 查询指定目标在指定分类的黑名单记录
     - 分页查询：offset/limit
+    - 游标分页：after_id=上一页返回的 next_cursor（按主键升序，深分页与首页代价相同：游标页不计数，count 返回 null）
 
     返回结果示例：
-    - 返回符合条件的黑名单记录列表
+    - 返回符合条件的黑名单记录列表，count 为符合条件的总数（仅未传 after_id 时计算），next_cursor 为空表示没有下一页
     - 如果无记录，返回404
     """
     try:
         # 1. 处理 classification 参数，获取对应的 category_ids
         category_ids = None
         if params.classification is not None:
-            categories = await BlacklistCategory.filter(classification=params.classification).values('id')
-            category_ids = [cat['id'] for cat in categories]
+            category_ids = await category_registry.ids_for_classification(int(params.classification))
 
             # 如果没有找到任何 category，直接返回空结果
             if not category_ids:
@@ -205,10 +737,15 @@ async def query_blacklist_users(params: BlacklistUserQueryParams = Depends()):
 
         # 2. 构建查询条件（动态构建 filter_params）
         filter_params = {}
+        value_filters = []
         if params.target_id is not None:
             filter_params['target_id'] = params.target_id
         if params.target_value is not None:
-            filter_params['target_value'] = params.target_value
+            if params.target_id is not None:
+                params.target_value = canonical_value(params.target_id, params.target_value)
+                filter_params.update(target_filter(params.target_id, params.target_value))
+            else:
+                value_filters.append(await target_value_filter(BlacklistUser, params.target_value))
         if params.brand_id !=0:
             filter_params['brand_id'] = params.brand_id
         if category_ids is not None:
@@ -217,12 +754,13 @@ async def query_blacklist_users(params: BlacklistUserQueryParams = Depends()):
             filter_params['category_id'] = params.category_id
 
         # 3. 直接查询数据（避免先 exists() 再 all()）
-        query = BlacklistUser.filter(**filter_params)
-        total_length = await query.count()
-        result = await query.offset(params.offset).limit(params.limit).all()
+        query = BlacklistUser.filter(*value_filters, **filter_params)
+        # 总数只在首页计算，游标页不重复执行全量 COUNT
+        total_length = None if params.after_id else await query.count()
+        result, next_cursor = await fetch_page(query, params.limit, params.offset, params.after_id)
 
-        # 4. 如果结果为空，构造错误信息
-        if not result:
+        # 4. 如果结果为空，构造错误信息（游标分页翻到末尾时正常返回空列表）
+        if not result and not params.after_id:
             error_msg = "No matching blacklist records found"
             if params.target_id and params.target_value and category_ids:
                 if len(category_ids) == 1:
@@ -248,8 +786,9 @@ async def query_blacklist_users(params: BlacklistUserQueryParams = Depends()):
         # 5. 返回查询结果
         return {
             'message':f"Successfully retrieved blacklist records",
-            'data':jsonable_encoder(result),
+            'data':jsonable_encoder([ReadBlacklistUser.model_validate(r, from_attributes=True) for r in result]),
             'count':total_length,
+            'next_cursor':next_cursor,
             'code':status.HTTP_200_OK
         }
 
@@ -266,7 +805,8 @@ async def query_blacklist_users(params: BlacklistUserQueryParams = Depends()):
 
 
 
-@black_user.post('/bulk-check-optimized', response_model=GeneralResponse, response_model_exclude_unset=True)
+@black_user.post('/bulk-check-optimized', response_model=GeneralResponse, response_model_exclude_unset=True,
+                  dependencies=[Depends(prefer_replica)])
 async def bulk_check_users_in_blacklist_optimized(request: List[BlacklistUserCheckParams]):
     """
     批量检查目标是否在某一具体类的黑名单中
@@ -287,33 +827,19 @@ async def bulk_check_users_in_blacklist_optimized(request: List[BlacklistUserChe
     }
     """
     try:
-        batch_size = 200
-        results = []
-
-        for i in range(0, len(request), batch_size):
-            batch = request[i:i + batch_size]
-
-            # 查询所有匹配项
-            target_ids = list({user.target_id for user in batch})
-            target_values = list({str(user.target_value) for user in batch})
-            brand_ids = list({user.brand_id for user in batch})
-            category_ids = list({user.category_id for user in batch})
-
-            existing_records = await BlacklistUser.filter(
-                target_id__in=target_ids,
-                target_value__in=target_values,
-                brand_id__in=brand_ids,
-                category_id__in=category_ids
-            ).values_list('target_id', 'target_value', 'brand_id', 'category_id')
-
-            # 构建结果
-            existing_set = set(existing_records)
-            results.extend([
-                (user.target_id, user.target_value, user.brand_id, user.category_id) in existing_set
-                for user in batch
+        # 成员索引就绪时直接在内存中判定，无需访问数据库
+        if membership_index.ready:
+            return success_response(data=[
+                membership_index.contains(user.target_id, canonical_value(user.target_id, user.target_value),
+                                          user.brand_id, user.category_id)
+                for user in request
             ])
 
-        return success_response(data=results)
+        keys = [(user.target_id, canonical_value(user.target_id, user.target_value), user.brand_id, user.category_id)
+                for user in request]
+        existing_set = await fetch_existing_with_filter(keys, os.getenv("BULK_CHECK_MATCH_MODE", "tuple"))
+
+        return success_response(data=[key in existing_set for key in keys])
 
     except Exception as e:
         return error_response(
@@ -323,11 +849,15 @@ async def bulk_check_users_in_blacklist_optimized(request: List[BlacklistUserChe
 
 
 @black_user.delete('/', response_model=GeneralResponse, response_model_exclude_unset=True)
-async def delete_blacklist_users(requests: Union[DeleteBlacklistUser, List[DeleteBlacklistUser]]):
+async def delete_blacklist_users(requests: Union[DeleteBlacklistUser, List[DeleteBlacklistUser]], bulk: bool = False,
+                                 chunk_size: int = Query(1000, ge=1, le=5000),
+                                 returning: bool = Query(True, description="是否返回被删除记录的详情")):
     """
     统一删除黑名单用户接口（支持单条和批量）
 
     支持通过id或(target_id, target_value, category_id)删除。
+    bulk=true 时使用集合化批量删除：按 chunk_size 分块，每块一次解析id与自然键、一次 DELETE ... WHERE id IN (...)
+    并逐块提交，锁持有时间与往返次数随块数而非条数增长；returning=false 时不返回 deleted_items
 
     请求体示例：
     - 单条删除（通过ID）: {"id": 1}
@@ -360,40 +890,45 @@ async def delete_blacklist_users(requests: Union[DeleteBlacklistUser, List[Delet
                           skipped_items=[],
                           failed_items=[],
                           deleted_items=[])
-
     try:
-        async with in_transaction():
-            for req in request_list:
-                try:
-                    # Build query
-                    query = BlacklistUser
-                    if req.id is not None:
-                        query = query.filter(id=req.id)
-                    else:
-                        if req.target_id is None or req.target_value is None or req.category_id is None:
-                            raise ValueError("Must provide either id or both uid and category_id")
-                        req.target_value = str(req.target_value)
-                        query = query.filter(target_id=req.target_id,
-                                             target_value= req.target_value,
-                                             category_id=req.category_id,
-                                             brand_id=req.brand_id)
-
-                    # Execute deletion
-                    user = await query.first()
-                    if not user:
-                        result.skipped_count += 1
-                        result.skipped_items.append(req)
-                        continue
-
-                    await user.delete()
-                    result.success_count += 1
-                    result.deleted_items.append(
-                        jsonable_encoder(ReadBlacklistUser.model_validate(user, from_attributes=True)))
-
-
-                except Exception as e:
-                    result.failed_count += 1
-                    result.failed_items.append({"request": req.dict(), "reason": str(e)})
+        if bulk:
+            await purge_blacklist_users(request_list, result, chunk_size=chunk_size, returning=returning)
+        else:
+            changes = ChangeSet()
+            async with primary_transaction():
+                for req in request_list:
+                    try:
+                        # Build query
+                        query = BlacklistUser
+                        if req.id is not None:
+                            query = query.filter(id=req.id)
+                        else:
+                            if req.target_id is None or req.target_value is None or req.category_id is None:
+                                raise ValueError("Must provide either id or both uid and category_id")
+                            req.target_value = canonical_value(req.target_id, req.target_value)
+                            query = query.filter(**target_filter(req.target_id, req.target_value),
+                                                 category_id=req.category_id,
+                                                 brand_id=req.brand_id)
+
+                        # Execute deletion
+                        user = await query.first()
+                        if not user:
+                            result.skipped_count += 1
+                            result.skipped_items.append(req)
+                            continue
+
+                        await user.delete()
+                        changes.remove_user(user.target_id, user.target_value, user.brand_id, user.category_id)
+                        result.success_count += 1
+                        result.deleted_items.append(
+                            jsonable_encoder(ReadBlacklistUser.model_validate(user, from_attributes=True)))
+
+
+                    except Exception as e:
+                        result.failed_count += 1
+                        result.failed_items.append({"request": req.dict(), "reason": str(e)})
+                await changes.write_journal()
+            changes.publish()
 
         # Prepare response
         response_data = result.dict()
@@ -418,7 +953,128 @@ async def delete_blacklist_users(requests: Union[DeleteBlacklistUser, List[Delet
         return error_response(message= str(e),code=status.HTTP_400_BAD_REQUEST)
 
 
-@black_user.post('/check-all-black', response_model=GeneralResponse, response_model_exclude_unset=True)
+DELETE_KEY_COLUMNS = ('target_id', 'target_value', 'brand_id', 'category_id')
+DELETE_RETURNING_COLUMNS = ('id',) + DELETE_KEY_COLUMNS + ('modify_user', 'describe', 'create_time')
+
+
+async def purge_blacklist_users(requests: List[DeleteBlacklistUser], result: DeleteResult, chunk_size: int = 1000,
+                                returning: bool = True):
+    """
+    集合化批量删除黑名单
+
+    按请求顺序分块，每块在一个事务内：
+    1. 自然键 (target_id, target_value, brand_id, category_id) 一次元组匹配查询解析为 id
+    2. 连同按 id 删除的请求一次取出被删除记录（returning=false 时只取键列）
+    3. 一次 DELETE ... WHERE id IN (...)，写入变更日志后提交，提交后同步成员索引
+
+    跳过/失败项与逐条删除一致（按请求顺序）：同一记录被多个请求命中时只有第一个计为删除；
+    某一块执行失败时该块的请求全部计为失败，不影响其他块
+    """
+    columns = DELETE_RETURNING_COLUMNS if returning else ('id',) + DELETE_KEY_COLUMNS
+    outcomes = {}  # 请求下标 -> 被删除记录 / None（跳过）/ 失败原因
+
+    valid = []
+    for index, req in enumerate(requests):
+        if req.id is None:
+            if req.target_id is None or req.target_value is None or req.category_id is None:
+                outcomes[index] = "Must provide either id or both uid and category_id"
+                continue
+            req.target_value = canonical_value(req.target_id, req.target_value)
+        valid.append(index)
+
+    for i in range(0, len(valid), chunk_size):
+        chunk = valid[i:i + chunk_size]
+        changes = ChangeSet()
+        try:
+            async with primary_transaction():
+                keys = [(requests[index].target_id, requests[index].target_value, requests[index].brand_id,
+                         requests[index].category_id) for index in chunk if requests[index].id is None]
+                id_by_key = {}
+                if keys:
+                    rows = await fetch_by_tuples(BlacklistUser, DELETE_KEY_COLUMNS, keys,
+                                                 ('id',) + DELETE_KEY_COLUMNS)
+                    id_by_key = {row[1:]: row[0] for row in rows}
+
+                ids = {requests[index].id for index in chunk if requests[index].id is not None}
+                ids.update(id_by_key.values())
+                rows_by_id = {}
+                if ids:
+                    rows_by_id = {row['id']: row for row in
+                                  await BlacklistUser.filter(id__in=list(ids)).values(*columns)}
+
+                deleted = {}  # 请求下标 -> 被删除记录
+                for index in chunk:
+                    req = requests[index]
+                    row_id = req.id if req.id is not None else id_by_key.get(
+                        (req.target_id, req.target_value, req.brand_id, req.category_id))
+                    row = rows_by_id.pop(row_id, None)
+                    if row is not None:
+                        deleted[index] = row
+
+                if deleted:
+                    await BlacklistUser.filter(id__in=[row['id'] for row in deleted.values()]).delete()
+                    for row in deleted.values():
+                        changes.remove_user(*(row[column] for column in DELETE_KEY_COLUMNS))
+                    await changes.write_journal()
+        except Exception as e:
+            for index in chunk:
+                outcomes[index] = str(e)
+            continue
+
+        changes.publish()
+        for index in chunk:
+            outcomes[index] = deleted.get(index)
+
+    for index in sorted(outcomes):
+        outcome = outcomes[index]
+        if isinstance(outcome, str):
+            result.failed_count += 1
+            result.failed_items.append({"request": requests[index].dict(), "reason": outcome})
+        elif outcome is None:
+            result.skipped_count += 1
+            result.skipped_items.append(requests[index])
+        else:
+            result.success_count += 1
+            if returning:
+                result.deleted_items.append(jsonable_encoder(ReadBlacklistUser.model_validate(outcome)))
+
+
+async def fetch_target_entries(targets: List[Tuple[int, str]], chunk_size: int = 500
+                               ) -> Tuple[Dict[Tuple[int, str], List[Tuple[int, int]]], Dict[Tuple[int, str], str]]:
+    """
+    批量取出多个目标所在的全部 (category_id, brand_id)
+
+    成员索引就绪时直接读内存；否则按 chunk_size 分块，每块一次元组匹配查询后在内存中分组。
+    某一块查询失败时只影响该块内的目标，返回 (分组结果, {目标: 错误信息})
+    """
+    if membership_index.ready:
+        return {
+            target: [(cat_id, brand_id) for brand_id, cat_id in membership_index.entries(*target)]
+            for target in targets
+        }, {}
+
+    entries_by_target: Dict[Tuple[int, str], List[Tuple[int, int]]] = {}
+    errors: Dict[Tuple[int, str], str] = {}
+    targets = list(dict.fromkeys(targets))
+    for i in range(0, len(targets), chunk_size):
+        chunk = targets[i:i + chunk_size]
+        try:
+            rows = await fetch_by_tuples(BlacklistUser, ('target_id', 'target_value'), chunk,
+                                         ('target_id', 'target_value', 'category_id', 'brand_id'))
+        except DBConnectionError:
+            errors.update({target: "Database connection error" for target in chunk})
+            continue
+        except Exception:
+            errors.update({target: "Query failed" for target in chunk})
+            continue
+        for target_id, target_value, category_id, brand_id in rows:
+            entries_by_target.setdefault((target_id, target_value), []).append((category_id, brand_id))
+
+    return entries_by_target, errors
+
+
+@black_user.post('/check-all-black', response_model=GeneralResponse, response_model_exclude_unset=True,
+                  dependencies=[Depends(prefer_replica)])
 async def check_all_category(requests: Union[BlacklistAllCheckParams, List[BlacklistAllCheckParams]]):
     """
     校验目标值所属的所有的类型的黑名单
@@ -485,9 +1141,7 @@ async def check_all_category(requests: Union[BlacklistAllCheckParams, List[Black
 
         # 获取所有黑名单分类
         try:
-            all_categories = await BlacklistCategory.all().values(
-                "id", "entry_name","classification"
-            )
+            all_categories = await category_registry.all()
             if not all_categories:
                 return error_response(
                     message="No blacklist categories found",
@@ -500,66 +1154,52 @@ async def check_all_category(requests: Union[BlacklistAllCheckParams, List[Black
                 code=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+        # 一次（分块）取出所有目标的黑名单记录，在内存中按目标分组；按规范写法查询，响应中原样返回请求的 target_value
+        targets = [(request_item.target_id, canonical_value(request_item.target_id, request_item.target_value))
+                   for request_item in request_list]
+        entries_by_target, errors = await fetch_target_entries(targets)
+
         # 构建结果列表
         response_data = []
 
-        for request_item in request_list:
-            target_value = str(request_item.target_value)
-            target_id = request_item.target_id
-
-            try:
-                # 查询该目标值存在的所有黑名单分类
-                existing_entries = await BlacklistUser.filter(
-                    target_id=target_id,
-                    target_value=target_value
-                ).values_list("category_id","brand_id")
-
-                # 构建 {category_id: [brand_ids]} 的映射
-                existing_category_ids = set()
-                category_brands_map = {}
-                for cat_id, brand_id in existing_entries:
-                    existing_category_ids.add(cat_id)
-                    if cat_id not in category_brands_map:
-                        category_brands_map[cat_id] = []
-                    if brand_id:  # 确保brand_id不为空
-                        category_brands_map[cat_id].append(brand_id)
-
-
-                # 构建该目标值的检查结果
-                category_results = []
-                for category in all_categories:
-                    category_results.append({
-                        "category_id": category["id"],
-                        "entry_name": category["entry_name"],
-                        "classification":category["classification"],
-                        "black_flag": category["id"] in existing_category_ids,
-                        "black_brand": category_brands_map.get(category["id"], [])  # 新增品牌列表
-                    })
-
-                # 添加到响应数据中
-                response_data.append({
-                    "target_id": target_id,
-                    "target_value": target_value,
-                    "result": category_results
-                })
-
-            except DBConnectionError:
+        for request_item, (target_id, target_value) in zip(request_list, targets):
+            if (target_id, target_value) in errors:
                 # 对于单个目标值查询失败，不中断整个流程，返回部分结果
                 response_data.append({
                     "target_id": target_id,
-                    "target_value": target_value,
+                    "target_value": request_item.target_value,
                     "result": [],
-                    "error": "Database connection error"
+                    "error": errors[(target_id, target_value)]
                 })
                 continue
-            except Exception:
-                response_data.append({
-                    "target_id": target_id,
-                    "target_value": target_value,
-                    "result": [],
-                    "error": "Query failed"
+
+            # 构建 {category_id: [brand_ids]} 的映射
+            existing_category_ids = set()
+            category_brands_map = {}
+            for cat_id, brand_id in entries_by_target.get((target_id, target_value), []):
+                existing_category_ids.add(cat_id)
+                if cat_id not in category_brands_map:
+                    category_brands_map[cat_id] = []
+                if brand_id:  # 确保brand_id不为空
+                    category_brands_map[cat_id].append(brand_id)
+
+            # 构建该目标值的检查结果
+            category_results = []
+            for category in all_categories:
+                category_results.append({
+                    "category_id": category["id"],
+                    "entry_name": category["entry_name"],
+                    "classification":category["classification"],
+                    "black_flag": category["id"] in existing_category_ids,
+                    "black_brand": category_brands_map.get(category["id"], [])  # 新增品牌列表
                 })
-                continue
+
+            # 添加到响应数据中
+            response_data.append({
+                "target_id": target_id,
+                "target_value": request_item.target_value,
+                "result": category_results
+            })
 
         return success_response(data=response_data)
 
@@ -575,7 +1215,8 @@ async def check_all_category(requests: Union[BlacklistAllCheckParams, List[Black
         )
 
 
-@black_user.post('/return-blacklist-value', response_model=GeneralResponse, response_model_exclude_unset=True)
+@black_user.post('/return-blacklist-value', response_model=GeneralResponse, response_model_exclude_unset=True,
+                  dependencies=[Depends(prefer_replica)])
 async def check_value_blacklist(request:BlacklistQuickCheck):
     """
     快速校验那些值在指定的黑名单中，并返回存在于校验类型黑名单中的值
@@ -609,14 +1250,32 @@ async def check_value_blacklist(request:BlacklistQuickCheck):
             )
 
 
-        request.target_value = [str(request.target_value)] if not isinstance(request.target_value, list) else [str(v) for v in request.target_value]
-
-        matched_records = await BlacklistUser.filter(
-            target_id=request.target_id,
-            brand_id=request.brand_id,
-            category_id=request.category_id,
-            target_value__in=request.target_value
-        ).values_list('target_value', flat=True)
+        # 按规范写法查询，返回命中的请求原值 {请求值: 规范写法}
+        values = {str(v): canonical_value(request.target_id, v) for v in (
+            request.target_value if isinstance(request.target_value, list) else [request.target_value])}
+
+        if membership_index.ready:
+            matched_records = [
+                value for value, canonical in values.items()
+                if membership_index.contains(request.target_id, canonical, request.brand_id, request.category_id)
+            ]
+        else:
+            canonicals = list(dict.fromkeys(values.values()))
+            if negative_filter.ready:
+                # 负向过滤器判定一定不在黑名单中的值不再查询数据库
+                canonicals = [value for value in canonicals if negative_filter.might_contain(
+                    request.target_id, value, request.brand_id, request.category_id)]
+            matched_keys = set(await BlacklistUser.filter(
+                target_id=request.target_id,
+                brand_id=request.brand_id,
+                category_id=request.category_id,
+                target_hash__in=target_hashes(request.target_id, canonicals),
+                target_key__in=target_keys(request.target_id, canonicals)
+            ).values_list('target_key', flat=True)) if canonicals else set()
+            matched = {value for value in canonicals if target_key(request.target_id, value) in matched_keys}
+            matched_records = [value for value, canonical in values.items() if canonical in matched]
+            if negative_filter.ready:
+                negative_filter.record_false_positives(len(canonicals) - len(matched))
 
         return success_response(message=f"Found {len(matched_records)} items matching the blacklist",data=matched_records)
 
@@ -633,7 +1292,8 @@ async def check_value_blacklist(request:BlacklistQuickCheck):
 
 
 
-@black_user.post('/return-all-black-brand', response_model=GeneralResponse, response_model_exclude_unset=True)
+@black_user.post('/return-all-black-brand', response_model=GeneralResponse, response_model_exclude_unset=True,
+                  dependencies=[Depends(prefer_replica)])
 async def query_black_brands(request:BlacklistBlackBrand):
     """
     返回目标字段拉黑的所有的品牌
@@ -672,20 +1332,32 @@ async def query_black_brands(request:BlacklistBlackBrand):
                 code=status.HTTP_400_BAD_REQUEST
             )
 
-        request.target_value = [str(request.target_value)] if not isinstance(request.target_value, list) else [str(v) for v in request.target_value]
+        # 按规范写法查询，响应中原样返回请求的 target_value：[(请求值, 规范写法)]
+        values = [(str(v), canonical_value(request.target_id, v)) for v in (
+            request.target_value if isinstance(request.target_value, list) else [request.target_value])]
+        canonicals = list(dict.fromkeys(canonical for _, canonical in values))
 
         # 获取IM类别下的所有category_id
-        category_ids = await BlacklistCategory.filter(
-            classification=2
-        ).values_list('id', flat=True)
-
-        existing_entries = await BlacklistUser.filter(
-            target_id=request.target_id,
-            target_value__in=request.target_value,
-            category_id__in=category_ids  # 外键的classification属于IM类别
-        ).exclude(
-            brand_id=0
-        ).values_list('target_value','brand_id')
+        category_ids = await category_registry.ids_for_classification(2)
+
+        if membership_index.ready:
+            im_category_ids = set(category_ids)
+            existing_entries = [
+                (val, brand_id)
+                for val in canonicals
+                for brand_id, cat_id in membership_index.entries(request.target_id, val)
+                if cat_id in im_category_ids and brand_id != 0
+            ]
+        else:
+            existing_entries = [(canonical_value(request.target_id, target_value), brand_id)
+                                for target_value, brand_id in await BlacklistUser.filter(
+                target_id=request.target_id,
+                target_hash__in=target_hashes(request.target_id, canonicals),
+                target_key__in=target_keys(request.target_id, canonicals),
+                category_id__in=category_ids  # 外键的classification属于IM类别
+            ).exclude(
+                brand_id=0
+            ).values_list('target_value','brand_id')]
 
 
         # 构建 {category_id: [brand_ids]} 的映射
@@ -701,9 +1373,9 @@ async def query_black_brands(request:BlacklistBlackBrand):
         black_brand_result = [
             {
                 "target_value": val,
-                "black_brand": category_brands_map.get(val,[])
+                "black_brand": category_brands_map.get(canonical,[])
             }
-            for val in request.target_value
+            for val, canonical in values
         ]
 
         return success_response(data=black_brand_result)
@@ -0,0 +1,200 @@
+import hashlib
+import logging
+import math
+import os
+from typing import Dict, List, Optional, Tuple
+
+from tortoise.functions import Count
+
+from BlackListProjectPlusUp.keys import canonical_value
+from BlackListProjectPlusUp.models import BlacklistUser
+
+FilterKey = Tuple[int, int, int]  # (category_id, target_id, brand_id)
+
+
+class BloomFilter:
+    """定长布隆过滤器，按容量与误判率计算位数和哈希次数，使用双重哈希生成位置"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.num_bits = max(64, int(math.ceil(-self.capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.num_hashes = max(1, int(round(self.num_bits / self.capacity * math.log(2))))
+        self.count = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, value: str):
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+
+    def add(self, value: str):
+        for pos in self._positions(value):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, value: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(value))
+
+    @property
+    def estimated_error_rate(self) -> float:
+        """按当前写入量估算的误判率"""
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+
+class ScalableBloomFilter:
+    """
+    可扩容布隆过滤器
+
+    当前分片写满后追加容量翻倍、误判率减半的新分片，整体误判率上界约为 2 * error_rate
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.error_rate = error_rate
+        self._filters = [BloomFilter(capacity, error_rate / 2)]
+
+    def add(self, value: str):
+        current = self._filters[-1]
+        if current.count >= current.capacity:
+            current = BloomFilter(current.capacity * 2, current.error_rate / 2)
+            self._filters.append(current)
+        current.add(value)
+
+    def __contains__(self, value: str) -> bool:
+        return any(value in f for f in self._filters)
+
+    @property
+    def count(self) -> int:
+        return sum(f.count for f in self._filters)
+
+    @property
+    def size_bytes(self) -> int:
+        return sum(len(f._bits) for f in self._filters)
+
+    @property
+    def estimated_error_rate(self) -> float:
+        return 1 - math.prod(1 - f.estimated_error_rate for f in self._filters)
+
+    def stats(self) -> dict:
+        return {
+            "count": self.count,
+            "slices": len(self._filters),
+            "size_bytes": self.size_bytes,
+            "estimated_error_rate": round(self.estimated_error_rate, 6),
+        }
+
+
+class NegativeLookupFilter:
+    """
+    黑名单负向查询过滤器
+
+    按 (category_id, target_id, brand_id) 分组，每组一个可扩容布隆过滤器，存放该组下的 target_value。
+    过滤器判定不存在即一定不在黑名单中，校验接口无需访问 MySQL/Redis；判定可能存在时再走原查询路径。
+    - 启动时按各组记录数确定初始容量并全量加载，新增记录由 ChangeSet.publish() 写入
+    - 删除不回写过滤器（布隆过滤器不支持删除），只会让少量已删除值多一次数据库确认
+    - 与成员索引一样是进程级结构，仅在单 worker 部署下能看到全部新增
+    """
+
+    def __init__(self, error_rate: float = 0.01, min_capacity: int = 64, growth: float = 1.5):
+        self.error_rate = error_rate
+        self.min_capacity = min_capacity
+        self.growth = growth
+        self.ready = False
+        self._filters: Dict[FilterKey, ScalableBloomFilter] = {}
+        self._pending: Optional[List[Tuple[int, str, int, int]]] = None
+        self.lookups = 0
+        self.definite_misses = 0
+        self.maybe_hits = 0
+        self.false_positives = 0
+
+    def _new_filter(self, count: int) -> ScalableBloomFilter:
+        return ScalableBloomFilter(max(self.min_capacity, int(count * self.growth)), self.error_rate)
+
+    async def load(self, chunk_size: int = 50000) -> int:
+        """按各组记录数建立过滤器并按主键分段全量加载，返回加载的记录数"""
+        # 加载期间的新增先暂存，加载完成后补写，避免扫描与写入交错时漏掉记录
+        self._pending = []
+        try:
+            groups = await BlacklistUser.annotate(total=Count('id')).group_by(
+                'category_id', 'target_id', 'brand_id').values_list('category_id', 'target_id', 'brand_id', 'total')
+            filters = {(category_id, target_id, brand_id): self._new_filter(total)
+                       for category_id, target_id, brand_id, total in groups}
+
+            last_id = 0
+            total = 0
+            while True:
+                rows = await BlacklistUser.filter(id__gt=last_id).order_by('id').limit(chunk_size).values_list(
+                    'id', 'target_id', 'target_value', 'brand_id', 'category_id')
+                if not rows:
+                    break
+                for _, target_id, target_value, brand_id, category_id in rows:
+                    key = (category_id, target_id, brand_id)
+                    if key not in filters:
+                        filters[key] = self._new_filter(0)
+                    filters[key].add(canonical_value(target_id, target_value))
+                total += len(rows)
+                last_id = rows[-1][0]
+
+            self._filters = filters
+            for user in self._pending:
+                self._add(*user)
+            self.ready = True
+        finally:
+            self._pending = None
+
+        logging.info(f"Negative lookup filter loaded with {total} blacklist records in {len(self._filters)} groups")
+        return total
+
+    def _add(self, target_id: int, target_value: str, brand_id: int, category_id: int):
+        key = (category_id, target_id, brand_id)
+        if key not in self._filters:
+            self._filters[key] = self._new_filter(0)
+        self._filters[key].add(target_value)
+
+    def add(self, target_id: int, target_value: str, brand_id: int, category_id: int):
+        if self._pending is not None:
+            self._pending.append((target_id, target_value, brand_id, category_id))
+        if self.ready:
+            self._add(target_id, target_value, brand_id, category_id)
+
+    def might_contain(self, target_id: int, target_value: str, brand_id: int, category_id: int) -> bool:
+        """False 表示一定不在黑名单中"""
+        self.lookups += 1
+        bloom = self._filters.get((category_id, target_id, brand_id))
+        if bloom is None or target_value not in bloom:
+            self.definite_misses += 1
+            return False
+        self.maybe_hits += 1
+        return True
+
+    def record_false_positives(self, count: int):
+        """调用方在数据库确认后回报：过滤器判定可能存在但实际不存在的数量"""
+        self.false_positives += count
+
+    def stats(self, detail: bool = False) -> dict:
+        """过滤器大小、误判率与命中情况；detail=True 时附带每个分组的过滤器信息"""
+        lookups = self.lookups or 1
+        result = {
+            "ready": self.ready,
+            "target_error_rate": self.error_rate,
+            "groups": len(self._filters),
+            "size_bytes": sum(f.size_bytes for f in self._filters.values()),
+            "entries": sum(f.count for f in self._filters.values()),
+            "lookups": self.lookups,
+            "definite_misses": self.definite_misses,
+            "maybe_hits": self.maybe_hits,
+            "false_positives": self.false_positives,
+            "definite_miss_ratio": round(self.definite_misses / lookups, 6),
+            "observed_false_positive_rate": round(
+                self.false_positives / (self.false_positives + self.definite_misses or 1), 6),
+        }
+        if detail:
+            result["filters"] = [
+                {"category_id": category_id, "target_id": target_id, "brand_id": brand_id, **bloom.stats()}
+                for (category_id, target_id, brand_id), bloom in sorted(self._filters.items())
+            ]
+        return result
+
+
+negative_filter = NegativeLookupFilter(error_rate=float(os.getenv("NEGATIVE_FILTER_ERROR_RATE", "0.01")))
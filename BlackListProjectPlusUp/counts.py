@@ -0,0 +1,97 @@
+import json
+import logging
+import os
+import time
+from typing import Dict, Optional, Tuple, Type
+
+from tortoise.models import Model
+from tortoise.queryset import QuerySet
+
+from BlackListProjectPlusUp.replicas import read_db
+
+CountKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class CountCache:
+    """
+    进程级精确计数缓存
+
+    以 (表名, 过滤条件) 为键缓存 count() 结果：
+    - 写入路径提交后调用 invalidate(table, row)，只清除条件与该行匹配的计数（如新增 category_id=3 的白名单
+      只影响无条件、category_id=3、该目标等计数）；row 为 None 时清空该表的全部计数
+    - 多 worker 部署时其他进程依赖 ttl（秒）过期后重新计数
+    """
+
+    def __init__(self, ttl: float = 60, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: Dict[CountKey, Tuple[float, int]] = {}
+        self._versions: Dict[str, int] = {}
+
+    @staticmethod
+    def _key(table: str, filters: dict) -> CountKey:
+        return table, tuple(sorted((name, str(value)) for name, value in filters.items()))
+
+    async def count(self, query: QuerySet, table: str, filters: dict) -> int:
+        key = self._key(table, filters)
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[0] < self.ttl:
+            return entry[1]
+
+        # 计数期间发生了写入，本次结果只用于当前调用，不缓存
+        version = self._versions.get(table, 0)
+        total = await query.count()
+        if version == self._versions.get(table, 0):
+            if len(self._entries) >= self.max_entries:
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (time.monotonic(), total)
+        return total
+
+    def invalidate(self, table: str, row: Optional[dict] = None):
+        self._versions[table] = self._versions.get(table, 0) + 1
+        row = {name: str(value) for name, value in row.items()} if row is not None else None
+        for key in [key for key in self._entries if key[0] == table]:
+            if row is None or all(row.get(name) == value for name, value in key[1]):
+                del self._entries[key]
+
+
+count_cache = CountCache(ttl=float(os.getenv("COUNT_CACHE_TTL", "60")))
+
+
+async def estimate_count(model: Type[Model], query: QuerySet, filters: dict) -> Optional[int]:
+    """
+    按表统计信息估算行数（仅 MySQL）：无过滤条件时读 information_schema.TABLES.TABLE_ROWS，
+    有条件时取执行计划的预估扫描行数；其他数据库或无法估算时返回 None
+    """
+    db = read_db(model)
+    if db.capabilities.dialect != 'mysql':
+        return None
+    try:
+        if not filters:
+            rows = await db.execute_query_dict(
+                "SELECT TABLE_ROWS AS total FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s", [model._meta.db_table])
+            return int(rows[0]['total']) if rows and rows[0]['total'] is not None else None
+        plan = await query.explain()
+        table = json.loads(next(iter(plan[0].values())))['query_block']['table']
+        return int(table['rows_examined_per_scan'])
+    except Exception as e:
+        logging.warning(f"Row count estimate failed for {model._meta.db_table}: {e}")
+        return None
+
+
+async def count_rows(model: Type[Model], query: QuerySet, filters: dict, mode: str = 'exact') -> Tuple[Optional[int], bool]:
+    """
+    按计数策略返回 (行数, 是否为估算值)
+
+    - exact：精确计数，按过滤条件缓存
+    - estimate：表统计信息估算，无法估算时退回 exact
+    - none：不计数，返回 (None, False)
+    """
+    if mode == 'none':
+        return None, False
+    if mode == 'estimate':
+        estimate = await estimate_count(model, query, filters)
+        if estimate is not None:
+            return estimate, True
+    return await count_cache.count(query, model._meta.db_table, filters), False
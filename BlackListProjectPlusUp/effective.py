@@ -0,0 +1,242 @@
+import logging
+from typing import Callable, Dict, FrozenSet, List, Optional, Set, Tuple
+
+from BlackListProjectPlusUp.keys import canonical_value
+from BlackListProjectPlusUp.models import BlacklistCategory, BlacklistUser, BlacklistUserExclusion
+from BlackListProjectPlusUp.queries import fetch_exclusion_violations
+from BlackListProjectPlusUp.replicas import primary_transaction
+
+TargetKey = Tuple[int, str]  # (target_id, target_value)
+
+ALL_CATEGORIES = None  # level=1 白名单：排除目标在全部分类（含之后新建的分类）下的黑名单
+
+
+class EffectiveBlacklist:
+    """
+    生效黑名单：黑名单成员索引叠加白名单级别后的结果
+
+    白名单的 level 语义原本只在写入时生效（创建黑名单时校验、创建/更新白名单时清理），
+    读取方只能假设 blacklist_users_aggregate 已经是干净的。这里把白名单预先展开为
+    (target_id, target_value) -> 被排除的 category_id 集合，与成员索引组合后，
+    "X 在分类 C/品牌 B 下是否生效拉黑" 只需两次字典查找。
+
+    - level=1：排除全部分类
+    - level=2：排除与白名单所在分类 classification 相同的全部分类
+    - level=3（默认）：仅排除白名单所在分类
+    白名单、分类 classification 的变化由 ChangeSet.publish() 增量维护；
+    与成员索引一样是进程级结构，仅在单 worker 部署下与数据库保持一致。
+    """
+
+    def __init__(self, members):
+        self.members = members
+        self._loaded = False
+        self._exclusions: Dict[TargetKey, Dict[int, int]] = {}  # 目标 -> {白名单分类: level}
+        self._classifications: Dict[int, int] = {}  # category_id -> classification
+        self._excluded: Dict[TargetKey, Optional[FrozenSet[int]]] = {}
+        self._pending: Optional[List[Tuple[Callable, tuple]]] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._loaded and self.members.ready
+
+    @property
+    def size(self) -> int:
+        return sum(len(levels) for levels in self._exclusions.values())
+
+    async def load(self, chunk_size: int = 50000) -> int:
+        """加载分类与全部白名单记录，返回加载的白名单记录数；需在成员索引加载之后调用"""
+        # 与成员索引一样：加载期间的变更先暂存，替换后按顺序重放
+        self._pending = []
+        try:
+            classifications = dict(await BlacklistCategory.all().values_list('id', 'classification'))
+            exclusions: Dict[TargetKey, Dict[int, int]] = {}
+            last_id = 0
+            total = 0
+            while True:
+                rows = await BlacklistUserExclusion.filter(id__gt=last_id).order_by('id').limit(
+                    chunk_size).values_list('id', 'target_id', 'target_value', 'category_id', 'level')
+                if not rows:
+                    break
+                for _, target_id, target_value, category_id, level in rows:
+                    exclusions.setdefault((target_id, canonical_value(target_id, target_value)), {})[category_id] = \
+                        level if level is not None else 3
+                total += len(rows)
+                last_id = rows[-1][0]
+
+            self._classifications = classifications
+            self._exclusions = exclusions
+            self._excluded = {}
+            for key in exclusions:
+                self._resolve(key)
+            for apply, args in self._pending:
+                apply(*args)
+            self._loaded = True
+        finally:
+            self._pending = None
+        logging.info(f"Effective blacklist loaded with {total} exclusion records")
+        return total
+
+    def _resolve(self, key: TargetKey):
+        """按该目标的白名单重新计算被排除的分类集合"""
+        levels = self._exclusions.get(key)
+        if not levels:
+            self._excluded.pop(key, None)
+            return
+
+        excluded: Set[int] = set()
+        for category_id, level in levels.items():
+            if level == 1:
+                self._excluded[key] = ALL_CATEGORIES
+                return
+            if level == 2:
+                classification = self._classifications.get(category_id)
+                excluded.update(cid for cid, cls in self._classifications.items() if cls == classification)
+            else:
+                excluded.add(category_id)
+        self._excluded[key] = frozenset(excluded)
+
+    def _resolve_classification_dependents(self):
+        """分类 classification 变化后，重新计算含 level=2 白名单的目标"""
+        for key, levels in self._exclusions.items():
+            if 2 in levels.values():
+                self._resolve(key)
+
+    def excludes(self, target_id: int, target_value: str, category_id: int) -> bool:
+        key = (target_id, target_value)
+        if key not in self._excluded:
+            return False
+        excluded = self._excluded[key]
+        return excluded is ALL_CATEGORIES or category_id in excluded
+
+    def is_blocked(self, target_id: int, target_value: str, brand_id: int, category_id: int) -> bool:
+        """目标在该分类/品牌下是否生效拉黑：在黑名单中且未被任何白名单排除"""
+        return (self.members.contains(target_id, target_value, brand_id, category_id)
+                and not self.excludes(target_id, target_value, category_id))
+
+    def _write(self, apply: Callable, *args):
+        if self._pending is not None:
+            self._pending.append((apply, args))
+        if self._loaded:
+            apply(*args)
+
+    def add_exclusion(self, target_id: int, target_value: str, category_id: int, level: Optional[int]):
+        self._write(self._add_exclusion, target_id, target_value, category_id, level)
+
+    def remove_exclusion(self, target_id: int, target_value: str, category_id: int):
+        self._write(self._remove_exclusion, target_id, target_value, category_id)
+
+    def set_category(self, category_id: int, classification: int):
+        self._write(self._set_category, category_id, classification)
+
+    def remove_category(self, category_id: int):
+        """分类被删除时（外键级联）移除该分类下的白名单"""
+        self._write(self._remove_category, category_id)
+
+    def _add_exclusion(self, target_id: int, target_value: str, category_id: int, level: Optional[int]):
+        key = (target_id, target_value)
+        self._exclusions.setdefault(key, {})[category_id] = level if level is not None else 3
+        self._resolve(key)
+
+    def _remove_exclusion(self, target_id: int, target_value: str, category_id: int):
+        key = (target_id, target_value)
+        levels = self._exclusions.get(key)
+        if levels is None:
+            return
+        levels.pop(category_id, None)
+        if not levels:
+            del self._exclusions[key]
+        self._resolve(key)
+
+    def _set_category(self, category_id: int, classification: int):
+        if self._classifications.get(category_id) == classification:
+            return
+        self._classifications[category_id] = classification
+        self._resolve_classification_dependents()
+
+    def _remove_category(self, category_id: int):
+        self._classifications.pop(category_id, None)
+        for key in [key for key, levels in self._exclusions.items() if category_id in levels]:
+            self._remove_exclusion(key[0], key[1], category_id)
+        self._resolve_classification_dependents()
+
+
+async def audit_effective_blacklist(effective: EffectiveBlacklist, repair: bool = False,
+                                    max_report_items: int = 100, chunk_size: int = 5000) -> dict:
+    """
+    批量校验黑名单与白名单的一致性
+
+    1. 数据库：blacklist_users_aggregate 中仍被白名单覆盖的记录（写入时清理遗漏、直接改库、分类改了 classification 等）
+    2. 内存：生效黑名单就绪时，逐段比对成员索引与白名单展开结果是否与数据库一致
+
+    repair=True 时删除违规的黑名单记录并同步成员索引；内存结构与数据库不一致时重新加载
+    """
+    from BlackListProjectPlusUp.membership import ChangeSet
+
+    report = {"violations": 0, "violation_samples": [], "removed_from_blacklist": 0}
+    violation_ids: List[int] = []
+    changes = ChangeSet()
+    async for row in fetch_exclusion_violations(chunk_size=chunk_size):
+        report["violations"] += 1
+        if len(report["violation_samples"]) < max_report_items:
+            report["violation_samples"].append(row)
+        violation_ids.append(row["id"])
+        changes.remove_user(row["target_id"], row["target_value"], row["brand_id"], row["category_id"])
+
+    if repair and violation_ids:
+        async with primary_transaction():
+            for i in range(0, len(violation_ids), chunk_size):
+                report["removed_from_blacklist"] += await BlacklistUser.filter(
+                    id__in=violation_ids[i:i + chunk_size]).delete()
+            await changes.write_journal()
+        changes.publish()
+
+    if effective.ready:
+        index = await _audit_index(effective, chunk_size)
+        if repair and (index["members_missing"] or index["members_extra"]
+                       or index["exclusions_missing"] or index["exclusions_extra"]):
+            await effective.members.load()
+            await effective.load()
+            index["reloaded"] = True
+        report["index"] = index
+
+    return report
+
+
+async def _audit_index(effective: EffectiveBlacklist, chunk_size: int) -> dict:
+    """按主键分段扫描两张表，统计内存结构缺失/多余的记录数"""
+    members = effective.members
+    matched = missing = 0
+    last_id = 0
+    while True:
+        rows = await BlacklistUser.filter(id__gt=last_id).order_by('id').limit(chunk_size).values_list(
+            'id', 'target_id', 'target_value', 'brand_id', 'category_id')
+        if not rows:
+            break
+        for _, target_id, target_value, brand_id, category_id in rows:
+            if members.contains(target_id, canonical_value(target_id, target_value), brand_id, category_id):
+                matched += 1
+            else:
+                missing += 1
+        last_id = rows[-1][0]
+
+    excl_matched = excl_missing = 0
+    last_id = 0
+    while True:
+        rows = await BlacklistUserExclusion.filter(id__gt=last_id).order_by('id').limit(chunk_size).values_list(
+            'id', 'target_id', 'target_value', 'category_id', 'level')
+        if not rows:
+            break
+        for _, target_id, target_value, category_id, level in rows:
+            key = (target_id, canonical_value(target_id, target_value))
+            if effective._exclusions.get(key, {}).get(category_id) == (level or 3):
+                excl_matched += 1
+            else:
+                excl_missing += 1
+        last_id = rows[-1][0]
+
+    return {
+        "members_missing": missing,
+        "members_extra": members.size - matched,
+        "exclusions_missing": excl_missing,
+        "exclusions_extra": effective.size - excl_matched,
+    }
@@ -0,0 +1,233 @@
+import asyncio
+import logging
+import os
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from tortoise import timezone
+
+from BlackListProjectPlusUp.membership import ChangeSet
+from BlackListProjectPlusUp.models import BlacklistCategory, BlacklistJob, BlacklistUser, BlacklistUserExclusion
+from BlackListProjectPlusUp.queries import fetch_by_tuples
+from BlackListProjectPlusUp.registry import category_registry
+from BlackListProjectPlusUp.replicas import primary_transaction
+
+CLEANUP_COLUMNS = ('id', 'target_id', 'target_value', 'brand_id', 'category_id')
+CLEANUP_TARGET_BATCH = 500  # 白名单级联清理每次元组查询的目标数
+
+
+def cleanup_covers(level: int, category_id: int, row_category_id: int, classifications: Dict[int, int]) -> bool:
+    """白名单（所在分类 category_id、级别 level）是否覆盖 row_category_id 下的黑名单"""
+    if level == 1:
+        return True
+    if level == 2:
+        return classifications.get(row_category_id) == classifications.get(category_id)
+    return row_category_id == category_id
+
+
+async def fetch_cleanup_rows(targets: List[list]) -> List[tuple]:
+    """
+    一次元组查询取出一批白名单目标需要清理的黑名单记录
+
+    targets 为 [target_id, target_value, category_id, level, modify_user]，返回 (id, target_id, target_value,
+    brand_id, category_id, modify_user)，modify_user 取第一个覆盖该记录的白名单
+    """
+    classifications = await category_registry.classifications()
+    scopes: Dict[Tuple[int, str], List[list]] = {}
+    for target in targets:
+        scopes.setdefault((target[0], target[1]), []).append(target)
+    rows = await fetch_by_tuples(BlacklistUser, ('target_id', 'target_value'), list(scopes), CLEANUP_COLUMNS)
+    covered = []
+    for row in rows:
+        for _, _, category_id, level, modify_user in scopes[(row[1], row[2])]:
+            if cleanup_covers(level, category_id, row[4], classifications):
+                covered.append(row + (modify_user,))
+                break
+    return covered
+
+
+async def delete_user_rows(rows: List[tuple]) -> int:
+    """按主键删除一块黑名单记录（含变更日志）并提交，提交后同步内存结构"""
+    changes = ChangeSet()
+    for _, target_id, target_value, brand_id, category_id, modify_user in rows:
+        changes.remove_user(target_id, target_value, brand_id, category_id, modify_user=modify_user)
+    async with primary_transaction():
+        deleted = await BlacklistUser.filter(id__in=[row[0] for row in rows]).delete()
+        await changes.write_journal()
+    changes.publish()
+    return deleted
+
+
+async def count_exclusion_cleanup(job: BlacklistJob) -> int:
+    targets = job.params['targets']
+    total = 0
+    for i in range(0, len(targets), CLEANUP_TARGET_BATCH):
+        total += len(await fetch_cleanup_rows(targets[i:i + CLEANUP_TARGET_BATCH]))
+    return total
+
+
+async def run_exclusion_cleanup(job: BlacklistJob, chunk_size: int) -> AsyncIterator[int]:
+    """level=1/2 白名单的级联清理：按目标分批集合查询，按 chunk_size 分块删除并逐块提交"""
+    targets = job.params['targets']
+    for i in range(0, len(targets), CLEANUP_TARGET_BATCH):
+        rows = await fetch_cleanup_rows(targets[i:i + CLEANUP_TARGET_BATCH])
+        for j in range(0, len(rows), chunk_size):
+            yield await delete_user_rows(rows[j:j + chunk_size])
+
+
+async def count_category_delete(job: BlacklistJob) -> int:
+    category_id = job.params['category_id']
+    if not await BlacklistCategory.filter(id=category_id).exists():
+        raise ValueError(f"Category {category_id} not found")
+    return (await BlacklistUserExclusion.filter(category_id=category_id).count()
+            + await BlacklistUser.filter(category_id=category_id).count())
+
+
+async def run_category_delete(job: BlacklistJob, chunk_size: int) -> AsyncIterator[int]:
+    """
+    删除分类：先按主键分块删除该分类下的白名单、黑名单并逐块提交（逐条记录变更日志），
+    最后删除分类本身（执行期间新写入的记录由外键级联清除）
+    """
+    category_id = job.params['category_id']
+    while True:
+        rows = await BlacklistUserExclusion.filter(category_id=category_id).order_by('id').limit(
+            chunk_size).values_list('id', 'target_id', 'target_value', 'level')
+        if not rows:
+            break
+        changes = ChangeSet()
+        for _, target_id, target_value, level in rows:
+            changes.remove_exclusion(target_id, target_value, category_id, level=level, modify_user=job.modify_user)
+        async with primary_transaction():
+            deleted = await BlacklistUserExclusion.filter(id__in=[row[0] for row in rows]).delete()
+            await changes.write_journal()
+        changes.publish()
+        yield deleted
+
+    while True:
+        rows = await BlacklistUser.filter(category_id=category_id).order_by('id').limit(chunk_size).values_list(
+            *CLEANUP_COLUMNS)
+        if not rows:
+            break
+        yield await delete_user_rows([row + (job.modify_user,) for row in rows])
+
+    category = await BlacklistCategory.get_or_none(id=category_id)
+    if category is not None:
+        changes = ChangeSet()
+        changes.remove_category(category_id, modify_user=job.modify_user)
+        async with primary_transaction():
+            await category.delete()
+            await changes.write_journal()
+        category_registry.invalidate()
+        changes.publish()
+
+
+# 任务类型 -> (统计待处理行数, 分块执行并逐块产出已处理行数)
+JOB_HANDLERS: Dict[str, Tuple[Callable, Callable]] = {
+    'exclusion_cleanup': (count_exclusion_cleanup, run_exclusion_cleanup),
+    'category_delete': (count_category_delete, run_category_delete),
+}
+
+
+class JobRunner:
+    """
+    进程内后台任务执行器
+
+    任务状态持久化在 blacklist_jobs 表中，接口在写入事务内调用 register() 登记任务，提交后调用 enqueue() 排队并返回 202
+    （任务行与触发它的写入一起提交，提交后进程退出也会由 resume() 继续执行）；
+    后台任务按提交顺序逐个执行，每块提交后更新 processed/chunks，块之间间隔 chunk_interval_ms 毫秒让出锁。
+    - resume() 在启动时重新排队未完成的任务（中断在块边界，已删除的行不会重复处理）
+    - stop() 在当前块提交后停止，执行中的任务回到 pending，下次启动继续
+    与成员索引一样按单 worker 部署设计；认领任务使用条件更新，不会被重复执行。
+    """
+
+    def __init__(self, chunk_size: int = 5000, chunk_interval_ms: float = 50):
+        self.chunk_size = chunk_size
+        self.chunk_interval = chunk_interval_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+        logging.info(f"Job runner started (chunk_size={self.chunk_size}, "
+                     f"chunk_interval={self.chunk_interval * 1000:.0f}ms)")
+
+    async def resume(self):
+        """启动执行器并重新排队上次未完成的任务"""
+        await BlacklistJob.filter(status='running').update(status='pending')
+        self.start()
+        for job_id in await BlacklistJob.filter(status='pending').order_by('id').values_list('id', flat=True):
+            self._queue.put_nowait(job_id)
+
+    async def register(self, kind: str, params: dict, modify_user: int = 0, using_db=None) -> BlacklistJob:
+        """登记任务但不排队：传入 using_db 时任务行随调用方事务提交，提交后再调用 enqueue()"""
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        return await BlacklistJob.create(kind=kind, params=params, modify_user=modify_user, using_db=using_db)
+
+    def enqueue(self, job_id: int):
+        """排队已提交的任务，未启动时在当前事件循环中启动执行器"""
+        self.start()
+        self._queue.put_nowait(job_id)
+
+    async def submit(self, kind: str, params: dict, modify_user: int = 0) -> BlacklistJob:
+        """登记任务并排队（不依附于其他写入时使用）"""
+        job = await self.register(kind, params, modify_user=modify_user)
+        self.enqueue(job.id)
+        return job
+
+    async def stop(self, timeout: float = 10):
+        if not self.running:
+            return
+        self._closing = True
+        self._queue.put_nowait(None)
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            logging.error("Job runner did not stop at a chunk boundary in time, the current job will be resumed")
+        logging.info("Job runner stopped")
+
+    async def _run(self):
+        while not self._closing:
+            job_id = await self._queue.get()
+            if job_id is not None:
+                await self._execute(job_id)
+
+    async def _execute(self, job_id: int):
+        # 条件更新认领任务，已被执行或已结束的任务直接跳过
+        if not await BlacklistJob.filter(id=job_id, status='pending').update(status='running',
+                                                                             start_time=timezone.now()):
+            return
+        job = await BlacklistJob.get(id=job_id)
+        count, run = JOB_HANDLERS[job.kind]
+        progress = BlacklistJob.filter(id=job_id)
+        try:
+            processed, chunks = job.processed, job.chunks
+            await progress.update(total=processed + await count(job))
+            async for rows in run(job, self.chunk_size):
+                processed += rows
+                chunks += 1
+                await progress.update(processed=processed, chunks=chunks)
+                if self._closing:
+                    await progress.update(status='pending')
+                    return
+                if self.chunk_interval:
+                    await asyncio.sleep(self.chunk_interval)
+            await progress.update(status='succeeded', finish_time=timezone.now())
+            logging.info(f"Job {job_id} ({job.kind}) succeeded: {processed} rows in {chunks} chunks")
+        except Exception as e:
+            logging.error(f"Job {job_id} ({job.kind}) failed: {e}")
+            await progress.update(status='failed', error=str(e), finish_time=timezone.now())
+
+
+job_runner = JobRunner(
+    chunk_size=int(os.getenv("JOB_CHUNK_SIZE", "5000")),
+    chunk_interval_ms=float(os.getenv("JOB_CHUNK_INTERVAL_MS", "50")),
+)
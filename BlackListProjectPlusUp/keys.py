@@ -0,0 +1,120 @@
+"""
+目标规范化与定长查找键
+
+target_value 统一以字符串存储，同一目标常有多种写法（" 123" 与 "123"、大小写不同的邮箱、带区号/分隔符的电话）。
+按 target_id 定义规范化规则：
+    1-uid    十进制整数（去空白、前导零），紧凑编码为 8 字节整数
+    3-IP     IPv4/IPv6 标准写法（IPv4 映射的 IPv6 地址按 IPv4 处理），紧凑编码为 4/16 字节
+    4-电话   E.164（"+" 国家码 + 号码，无国家码时按 PHONE_DEFAULT_COUNTRY_CODE 补全），紧凑编码为 8 字节整数
+    5-邮箱   去空白并转小写
+    其他     去空白
+不符合类型格式的值按去空白后的文本处理。
+
+- canonical_value()：写入与查询前对请求值规范化，target_value 保存规范写法
+- target_key()：规范值的紧凑编码（首字节区分 紧凑/文本），存于 target_key 列，按目标匹配均比较该列
+- target_hash()：由 target_id 与 target_key 得到的 63 位非负整数（SHA-256 前 8 字节右移一位），
+  (target_hash, category_id, brand_id) 联合索引按 8 字节整数定位，再以 target_key 排除哈希碰撞
+历史数据保留原写法，由迁移按同一算法回填 target_key/target_hash 后即可与规范写法匹配。
+"""
+import hashlib
+import ipaddress
+import os
+import re
+from typing import Iterable, List, Optional, Union
+
+PHONE_DEFAULT_COUNTRY_CODE = os.getenv("PHONE_DEFAULT_COUNTRY_CODE", "86")
+
+PACKED = b'\x01'  # 紧凑编码（整数/IP 地址）
+TEXT = b'\x00'  # 文本编码（UTF-8）
+
+_DIGITS = re.compile(r'\d+')
+_PHONE_SEPARATORS = re.compile(r'[\s\-().]')
+
+
+def _uid(value: str) -> Optional[int]:
+    if _DIGITS.fullmatch(value) and int(value) < 1 << 63:
+        return int(value)
+    return None
+
+
+def _ip(value: str) -> Optional[Union[ipaddress.IPv4Address, ipaddress.IPv6Address]]:
+    try:
+        address = ipaddress.ip_address(value)
+    except ValueError:
+        return None
+    if address.version == 6 and address.ipv4_mapped is not None:
+        return address.ipv4_mapped
+    return address
+
+
+def _phone(value: str) -> Optional[int]:
+    """E.164 号码（国家码+号码，不超过15位）的整数形式"""
+    value = _PHONE_SEPARATORS.sub('', value)
+    if value.startswith('+'):
+        digits = value[1:]
+    elif value.startswith('00'):
+        digits = value[2:]
+    else:
+        digits = PHONE_DEFAULT_COUNTRY_CODE + (value[1:] if value.startswith('0') else value)
+    if _DIGITS.fullmatch(digits) and len(digits) <= 15 and not digits.startswith('0'):
+        return int(digits)
+    return None
+
+
+def canonical_value(target_id: int, target_value: Union[str, int]) -> str:
+    """按 target_id 规范化目标值（幂等）"""
+    value = str(target_value).strip()
+    if target_id == 1:
+        uid = _uid(value)
+        return value if uid is None else str(uid)
+    if target_id == 3:
+        address = _ip(value)
+        return value if address is None else str(address)
+    if target_id == 4:
+        phone = _phone(value)
+        return value if phone is None else f"+{phone}"
+    if target_id == 5:
+        return value.lower()
+    return value
+
+
+def target_key(target_id: int, target_value: Union[str, int]) -> bytes:
+    """规范值的紧凑编码：uid/电话为 8 字节整数，IP 为 4/16 字节，其余为 UTF-8 文本"""
+    return pack_canonical(target_id, canonical_value(target_id, target_value))
+
+
+def pack_canonical(target_id: int, value: str) -> bytes:
+    """已是规范写法的值的紧凑编码（调用方已规范化时避免重复规范化）"""
+    if target_id == 1 and _uid(value) is not None:
+        return PACKED + int(value).to_bytes(8, 'big')
+    if target_id == 3 and _ip(value) is not None:
+        return PACKED + _ip(value).packed
+    if target_id == 4 and value.startswith('+') and _phone(value) is not None:
+        return PACKED + int(value[1:]).to_bytes(8, 'big')
+    return TEXT + value.encode('utf-8')
+
+
+def key_hash(target_id: int, key: bytes) -> int:
+    """由 target_id 与 target_key 计算 target_hash"""
+    digest = hashlib.sha256(f"{target_id}:".encode('utf-8') + key).digest()
+    return int.from_bytes(digest[:8], 'big') >> 1
+
+
+def target_hash(target_id: int, target_value: Union[str, int]) -> int:
+    return key_hash(target_id, target_key(target_id, target_value))
+
+
+def target_hashes(target_id: int, target_values: Iterable[Union[str, int]]) -> List[int]:
+    """同一 target_id 下多个值的哈希（去重，保持顺序）"""
+    return list(dict.fromkeys(target_hash(target_id, value) for value in target_values))
+
+
+def target_keys(target_id: int, target_values: Iterable[Union[str, int]]) -> List[bytes]:
+    """同一 target_id 下多个值的紧凑编码（去重，保持顺序）"""
+    return list(dict.fromkeys(target_key(target_id, value) for value in target_values))
+
+
+def target_filter(target_id: int, target_value: Union[str, int]) -> dict:
+    """按目标精确查找的过滤条件：走 target_hash 索引，并以 target_key 排除哈希碰撞"""
+    key = target_key(target_id, target_value)
+    return {'target_hash': key_hash(target_id, key), 'target_id': target_id, 'target_key': key}
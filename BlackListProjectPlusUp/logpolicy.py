@@ -0,0 +1,96 @@
+import os
+import random
+from typing import Dict, List, Mapping, Optional, Set, Tuple
+
+MUTATING_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+
+
+class LogPolicy:
+    """
+    请求日志落库策略
+
+    - 路径采样：path_rules 为 [(路径前缀, 采样率)]，最长前缀优先；采样率 0 表示不记录，1 表示全部记录
+    - 变更类请求（POST/PUT/PATCH/DELETE）在没有匹配的路径规则时始终记录，保留审计记录；
+      只读的校验接口同样是 POST，需通过路径规则单独配置采样率
+    - always_log_errors：状态码 >= 400 的请求不受采样影响，始终记录
+    - 请求体/响应体最多保留 max_request_body / max_response_body 字节
+    - header_allowlist 为 None 时记录全部请求头/响应头，否则只保留名单中的头（小写）
+    """
+
+    def __init__(self, default_sample_rate: float = 1.0, path_rules: Optional[List[Tuple[str, float]]] = None,
+                 always_log_errors: bool = True, always_log_mutations: bool = True,
+                 max_request_body: int = 65536, max_response_body: int = 65536,
+                 header_allowlist: Optional[Set[str]] = None):
+        self.default_sample_rate = default_sample_rate
+        # 按前缀长度倒序，便于最长前缀匹配
+        self.path_rules = sorted(path_rules or [], key=lambda rule: len(rule[0]), reverse=True)
+        self.always_log_errors = always_log_errors
+        self.always_log_mutations = always_log_mutations
+        self.max_request_body = max_request_body
+        self.max_response_body = max_response_body
+        self.header_allowlist = header_allowlist
+
+    @classmethod
+    def from_env(cls) -> "LogPolicy":
+        """
+        从环境变量读取：
+        LOG_SAMPLE_RATE=1.0
+        LOG_PATH_SAMPLE_RATES=/blacklist/user/bulk-check-optimized=0.01,/blacklist/user/check-all-black=0.01
+        LOG_ALWAYS_ERRORS=true
+        LOG_ALWAYS_MUTATIONS=true
+        LOG_REQUEST_MAX_BYTES=65536
+        LOG_RESPONSE_MAX_BYTES=65536
+        LOG_HEADER_ALLOWLIST=*（或逗号分隔的请求头名）
+        """
+        path_rules = []
+        for item in os.getenv("LOG_PATH_SAMPLE_RATES", "").split(","):
+            if not item.strip():
+                continue
+            path, _, rate = item.strip().rpartition("=")
+            if not path:
+                raise ValueError(f"Invalid LOG_PATH_SAMPLE_RATES entry: {item}")
+            path_rules.append((path, float(rate)))
+
+        allowlist = os.getenv("LOG_HEADER_ALLOWLIST", "*").strip()
+        return cls(
+            default_sample_rate=float(os.getenv("LOG_SAMPLE_RATE", "1.0")),
+            path_rules=path_rules,
+            always_log_errors=os.getenv("LOG_ALWAYS_ERRORS", "true").lower() == "true",
+            always_log_mutations=os.getenv("LOG_ALWAYS_MUTATIONS", "true").lower() == "true",
+            max_request_body=int(os.getenv("LOG_REQUEST_MAX_BYTES", "65536")),
+            max_response_body=int(os.getenv("LOG_RESPONSE_MAX_BYTES", "65536")),
+            header_allowlist=None if allowlist == "*" else {
+                h.strip().lower() for h in allowlist.split(",") if h.strip()},
+        )
+
+    def path_sample_rate(self, path: str) -> Optional[float]:
+        """返回最长匹配路径规则的采样率，无匹配时返回 None"""
+        for prefix, rate in self.path_rules:
+            if path.startswith(prefix):
+                return rate
+        return None
+
+    def should_log(self, method: str, path: str, status_code: int) -> bool:
+        if self.always_log_errors and status_code >= 400:
+            return True
+
+        rate = self.path_sample_rate(path)
+        if rate is None:
+            if self.always_log_mutations and method in MUTATING_METHODS:
+                return True
+            rate = self.default_sample_rate
+        return rate >= 1 or (rate > 0 and random.random() < rate)
+
+    def filter_headers(self, headers: Mapping[str, str]) -> Dict[str, str]:
+        if self.header_allowlist is None:
+            return dict(headers)
+        return {k: v for k, v in headers.items() if k.lower() in self.header_allowlist}
+
+    def describe_request_body(self, body: bytes) -> str:
+        content = body[:self.max_request_body].decode("utf-8", errors="replace")
+        if len(body) > self.max_request_body:
+            content += f"...<已截断，共 {len(body)} 字节>"
+        return content
+
+
+log_policy = LogPolicy.from_env()
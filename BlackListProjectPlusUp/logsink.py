@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import os
+from typing import List, Optional
+
+from BlackListProjectPlusUp.models import RequestLog
+
+
+class RequestLogSink:
+    """
+    请求日志异步写入器
+
+    中间件只把日志对象放入有界队列，后台任务攒批后用一条多行 INSERT 写入：
+    - 攒满 batch_size 条，或距本批开始超过 flush_interval_ms 毫秒，即写入一次
+    - 队列满时 drop_on_overflow=True 直接丢弃并计数，False 则等待队列空位（请求会被阻塞）
+    - stop() 在关闭时写完队列中剩余的日志
+    未启动时 put() 退化为同步写入，保证未注册启动事件的应用仍能记录日志。
+    """
+
+    def __init__(self, max_queue: int = 10000, batch_size: int = 200, flush_interval_ms: float = 500,
+                 drop_on_overflow: bool = True):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.drop_on_overflow = drop_on_overflow
+        self.dropped = 0
+        self.written = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+        logging.info(f"Request log sink started (batch_size={self.batch_size}, "
+                     f"flush_interval={self.flush_interval * 1000:.0f}ms, max_queue={self.max_queue})")
+
+    async def put(self, log: RequestLog) -> bool:
+        """提交一条日志，返回是否被接收"""
+        if not self.running or self._closing:
+            await log.save()
+            return True
+
+        if not self.drop_on_overflow:
+            await self._queue.put(log)
+            return True
+        try:
+            self._queue.put_nowait(log)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                logging.warning(f"Request log queue full, {self.dropped} records dropped so far")
+            return False
+
+    async def stop(self, timeout: float = 10):
+        """停止后台任务并写完队列中剩余的日志"""
+        if not self.running:
+            return
+        self._closing = True
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            logging.error(f"Request log sink flush timed out, {self._queue.qsize()} records lost")
+        logging.info(f"Request log sink stopped (written={self.written}, dropped={self.dropped})")
+
+    async def _collect(self) -> List[RequestLog]:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        batch: List[RequestLog] = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - loop.time()
+            if timeout <= 0 or self._closing:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _write(self, batch: List[RequestLog]):
+        try:
+            await RequestLog.bulk_create(batch)
+            self.written += len(batch)
+        except Exception as e:
+            logging.error(f"[日志写入失败] {len(batch)} records: {e}")
+
+    async def _run(self):
+        while not (self._closing and self._queue.empty()):
+            batch = await self._collect()
+            if batch:
+                await self._write(batch)
+
+
+request_log_sink = RequestLogSink(
+    max_queue=int(os.getenv("LOG_SINK_QUEUE_SIZE", "10000")),
+    batch_size=int(os.getenv("LOG_SINK_BATCH_SIZE", "200")),
+    flush_interval_ms=float(os.getenv("LOG_SINK_FLUSH_MS", "500")),
+    drop_on_overflow=os.getenv("LOG_SINK_DROP_ON_OVERFLOW", "true").lower() == "true",
+)
@@ -5,7 +5,7 @@ from fastapi import FastAPI
 from contextlib import asynccontextmanager
 from tortoise.contrib.fastapi import register_tortoise
 from BlackListProjectPlusUp.middle import log_requests_middleware
-from BlackListProjectPlusUp.api import black_category, black_user, black_exclusion
+from BlackListProjectPlusUp.api import black_category, black_user, black_exclusion, black_changes, black_jobs
 
 def create_app() -> FastAPI:
     @asynccontextmanager
@@ -33,5 +33,7 @@ def create_app() -> FastAPI:
     app.include_router(black_category, prefix='/blacklist/category', tags=['黑名单种类'])
     app.include_router(black_user, prefix='/blacklist/user', tags=['黑名单用户'])
     app.include_router(black_exclusion, prefix='/blacklist/exclusion', tags=['白名单用户'])
+    app.include_router(black_changes, prefix='/blacklist/changes', tags=['变更日志'])
+    app.include_router(black_jobs, prefix='/blacklist/jobs', tags=['后台任务'])
 
     return app
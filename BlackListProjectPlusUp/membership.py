@@ -0,0 +1,198 @@
+import logging
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from BlackListProjectPlusUp.bloom import negative_filter
+from BlackListProjectPlusUp.counts import count_cache
+from BlackListProjectPlusUp.effective import EffectiveBlacklist
+from BlackListProjectPlusUp.keys import canonical_value
+from BlackListProjectPlusUp.models import BlacklistChange, BlacklistUser, BlacklistUserExclusion
+
+TargetKey = Tuple[int, str]  # (target_id, target_value)
+MemberEntry = Tuple[int, int]  # (brand_id, category_id)
+
+
+class MembershipIndex:
+    """
+    进程内黑名单成员索引
+
+    以 (target_id, 规范写法的 target_value) -> {(brand_id, category_id)} 的形式常驻内存，
+    启动时从 blacklist_users_aggregate 全量加载，之后由创建/删除/白名单写入路径增量维护，
+    校验类接口在索引就绪时无需访问数据库。
+
+    注意：索引是进程级的，仅在单 worker 部署（uvicorn workers=1）下与数据库保持一致。
+    """
+
+    def __init__(self):
+        self._targets: Dict[TargetKey, Set[MemberEntry]] = {}
+        self._pending: Optional[List[Tuple[Callable, tuple]]] = None
+        self.ready = False
+
+    @property
+    def size(self) -> int:
+        return sum(len(entries) for entries in self._targets.values())
+
+    async def load(self, chunk_size: int = 50000) -> int:
+        """按主键分段全量加载黑名单，返回加载的记录数"""
+        # 加载期间的增删先暂存，替换后按顺序重放，避免扫描与写入交错时丢失变更（重新加载时同样作用于旧索引）
+        self._pending = []
+        try:
+            targets: Dict[TargetKey, Set[MemberEntry]] = {}
+            last_id = 0
+            total = 0
+            while True:
+                rows = await BlacklistUser.filter(id__gt=last_id).order_by('id').limit(chunk_size).values_list(
+                    'id', 'target_id', 'target_value', 'brand_id', 'category_id')
+                if not rows:
+                    break
+                for _, target_id, target_value, brand_id, category_id in rows:
+                    targets.setdefault((target_id, canonical_value(target_id, target_value)), set()).add(
+                        (brand_id, category_id))
+                total += len(rows)
+                last_id = rows[-1][0]
+
+            self._targets = targets
+            for apply, args in self._pending:
+                apply(*args)
+            self.ready = True
+        finally:
+            self._pending = None
+        logging.info(f"Membership index loaded with {total} blacklist records")
+        return total
+
+    def contains(self, target_id: int, target_value: str, brand_id: int, category_id: int) -> bool:
+        return (brand_id, category_id) in self._targets.get((target_id, target_value), ())
+
+    def entries(self, target_id: int, target_value: str) -> Set[MemberEntry]:
+        """返回该目标所在的所有 (brand_id, category_id)"""
+        return self._targets.get((target_id, target_value), set())
+
+    def _write(self, apply: Callable, *args):
+        if self._pending is not None:
+            self._pending.append((apply, args))
+        if self.ready:
+            apply(*args)
+
+    def add(self, target_id: int, target_value: str, brand_id: int, category_id: int):
+        self._write(self._add, target_id, target_value, brand_id, category_id)
+
+    def discard(self, target_id: int, target_value: str, brand_id: int, category_id: int):
+        self._write(self._discard, target_id, target_value, brand_id, category_id)
+
+    def discard_category(self, category_id: int):
+        """分类被删除时（外键级联）移除该分类下的全部记录"""
+        self._write(self._discard_category, category_id)
+
+    def _add(self, target_id: int, target_value: str, brand_id: int, category_id: int):
+        self._targets.setdefault((target_id, target_value), set()).add((brand_id, category_id))
+
+    def _discard(self, target_id: int, target_value: str, brand_id: int, category_id: int):
+        entries = self._targets.get((target_id, target_value))
+        if entries is None:
+            return
+        entries.discard((brand_id, category_id))
+        if not entries:
+            del self._targets[(target_id, target_value)]
+
+    def _discard_category(self, category_id: int):
+        for key in list(self._targets):
+            entries = self._targets[key]
+            entries.difference_update({entry for entry in entries if entry[1] == category_id})
+            if not entries:
+                del self._targets[key]
+
+
+membership_index = MembershipIndex()
+effective_blacklist = EffectiveBlacklist(membership_index)
+
+
+class ChangeSet:
+    """
+    事务内收集的黑名单变更
+
+    写入路径在事务中记录变更，事务提交成功后调用 publish() 统一同步到进程内结构，
+    避免事务回滚后内存状态与数据库不一致。
+
+    黑名单/白名单的每条新增、修改、删除同时生成一条变更日志，由写入路径在事务提交前调用
+    write_journal() 写入 blacklist_change_journal，与数据变更一起提交或回滚。
+
+    同步到进程内结构的目标值统一为规范写法（历史记录可能保留原写法），日志中记录传入的值。
+    """
+
+    def __init__(self):
+        self.users_added: List[Tuple[int, str, int, int]] = []
+        self.users_removed: List[Tuple[int, str, int, int]] = []
+        self.categories_removed: List[int] = []
+        self.exclusions_set: List[Tuple[int, str, int, Optional[int]]] = []
+        self.exclusions_removed: List[Tuple[int, str, int]] = []
+        self.categories_set: List[Tuple[int, int]] = []
+        self.journal: List[BlacklistChange] = []
+
+    def add_user(self, target_id: int, target_value: str, brand_id: int, category_id: int, modify_user: int = 0):
+        self.users_added.append((target_id, canonical_value(target_id, target_value), brand_id, category_id))
+        self.journal.append(BlacklistChange(entity='user', op='insert', target_id=target_id, target_value=target_value,
+                                            brand_id=brand_id, category_id=category_id, modify_user=modify_user))
+
+    def remove_user(self, target_id: int, target_value: str, brand_id: int, category_id: int, modify_user: int = 0):
+        self.users_removed.append((target_id, canonical_value(target_id, target_value), brand_id, category_id))
+        self.journal.append(BlacklistChange(entity='user', op='delete', target_id=target_id, target_value=target_value,
+                                            brand_id=brand_id, category_id=category_id, modify_user=modify_user))
+
+    def remove_category(self, category_id: int, modify_user: int = 0):
+        """分类删除（外键级联删除其下全部黑/白名单），日志中只记一条分类删除"""
+        self.categories_removed.append(category_id)
+        self.journal.append(BlacklistChange(entity='category', op='delete', category_id=category_id,
+                                            modify_user=modify_user))
+
+    def set_exclusion(self, target_id: int, target_value: str, category_id: int, level: Optional[int],
+                      op: str = 'insert', modify_user: int = 0):
+        """新增白名单（op=insert）或修改其 level（op=update）"""
+        self.exclusions_set.append((target_id, canonical_value(target_id, target_value), category_id, level))
+        self.journal.append(BlacklistChange(entity='exclusion', op=op, target_id=target_id, target_value=target_value,
+                                            category_id=category_id, level=level, modify_user=modify_user))
+
+    def remove_exclusion(self, target_id: int, target_value: str, category_id: int, level: Optional[int] = None,
+                         modify_user: int = 0):
+        self.exclusions_removed.append((target_id, canonical_value(target_id, target_value), category_id))
+        self.journal.append(BlacklistChange(entity='exclusion', op='delete', target_id=target_id,
+                                            target_value=target_value, category_id=category_id, level=level,
+                                            modify_user=modify_user))
+
+    def set_category(self, category_id: int, classification: int):
+        """新增分类或修改其 classification"""
+        self.categories_set.append((category_id, classification))
+
+    async def write_journal(self):
+        """在写入事务内调用：批量写入尚未落库的变更日志"""
+        if self.journal:
+            await BlacklistChange.bulk_create(self.journal)
+            self.journal = []
+
+    def publish(self):
+        # 负向过滤器只记录新增，删除的残留值只会多一次数据库确认
+        for user in self.users_added:
+            negative_filter.add(*user)
+
+        # 白名单计数缓存：只清除条件与变更行匹配的计数，分类级联删除时清空
+        exclusion_table = BlacklistUserExclusion._meta.db_table
+        for target_id, target_value, category_id, *_ in self.exclusions_set + self.exclusions_removed:
+            count_cache.invalidate(exclusion_table, {"target_id": target_id, "target_value": target_value,
+                                                     "category_id": category_id})
+        if self.categories_removed:
+            count_cache.invalidate(exclusion_table)
+
+        # 未加载时为空操作，加载期间暂存、加载完成后重放
+        for category_id, classification in self.categories_set:
+            effective_blacklist.set_category(category_id, classification)
+        for exclusion in self.exclusions_removed:
+            effective_blacklist.remove_exclusion(*exclusion)
+        for exclusion in self.exclusions_set:
+            effective_blacklist.add_exclusion(*exclusion)
+        for category_id in self.categories_removed:
+            effective_blacklist.remove_category(category_id)
+
+        for user in self.users_removed:
+            membership_index.discard(*user)
+        for category_id in self.categories_removed:
+            membership_index.discard_category(category_id)
+        for user in self.users_added:
+            membership_index.add(*user)
@@ -1,16 +1,53 @@
 from fastapi import Request, Response
 import json
+import logging
+import os
 import time
-from typing import Callable, Any
+from typing import Callable, Any, AsyncIterator, Awaitable
 
+from tortoise import timezone
 
+from BlackListProjectPlusUp.logpolicy import log_policy
+from BlackListProjectPlusUp.logsink import request_log_sink
 from BlackListProjectPlusUp.models import RequestLog
 
+# 流式导入的请求体不做缓存记录，避免整包读入内存
+STREAMING_CONTENT_TYPES = ("application/x-ndjson", "application/jsonl", "text/csv")
+
+# 响应体记录方式：stream（边发送边截取前缀，默认）/ buffer（整体缓冲后再发送）
+RESPONSE_CAPTURE_MODE = os.getenv("LOG_RESPONSE_CAPTURE", "stream").lower()
+
+
 async def iterate_in_chunks(data: bytes, chunk_size: int = 4096):
     for i in range(0, len(data), chunk_size):
         yield data[i:i + chunk_size]
 
 
+async def capture_body(body_iterator: AsyncIterator[bytes], limit: int,
+                       on_complete: Callable[[bytes, int], Awaitable[None]]) -> AsyncIterator[bytes]:
+    """ 透传响应分块，同时截取前 limit 字节并统计总字节数，结束（含客户端断开）后回调 on_complete """
+    prefix = bytearray()
+    total = 0
+    try:
+        async for chunk in body_iterator:
+            total += len(chunk)
+            if len(prefix) < limit:
+                prefix += chunk[:limit - len(prefix)]
+            yield chunk
+    finally:
+        await on_complete(bytes(prefix), total)
+
+
+def describe_response_body(prefix: bytes, total: int, binary: bool = False) -> str:
+    """ 生成日志中记录的响应体内容，超出截取长度时注明总字节数 """
+    if binary:
+        return f"<二进制数据: {total} 字节>"
+    content = prefix.decode("utf-8", errors="replace")
+    if total > len(prefix):
+        content += f"...<已截断，共 {total} 字节>"
+    return content
+
+
 # ✅ 提取客户端 IP（支持 X-Forwarded-For）
 def get_client_ip(request: Request) -> str:
 
@@ -57,59 +94,66 @@ async def log_requests_middleware(request: Request, call_next: Callable) -> Resp
     if request.method in ("POST", "PUT", "PATCH", "DELETE"):
         if "multipart/form-data" in content_type:
             request_body = "<文件上传>"
+        elif content_type.startswith(STREAMING_CONTENT_TYPES):
+            request_body = "<流式导入>"
         else:
             try:
                 body_bytes = await request.body()
-                request_body = body_bytes.decode("utf-8", errors="replace")
+                request_body = log_policy.describe_request_body(body_bytes)
             except Exception as e:
                 request_body = f"<请求体错误: {str(e)}>"
-    else:
-        body_bytes = b""
 
-    # 重构 request 流，确保业务仍可读取
-    async def receive_gen():
-        yield {"type": "http.request", "body": body_bytes, "more_body": False}
-    request._receive = receive_gen().__anext__
+            # 重构 request 流，确保业务仍可读取
+            async def receive_gen():
+                yield {"type": "http.request", "body": body_bytes, "more_body": False}
+            request._receive = receive_gen().__anext__
+
+    async def write_log(response: Response, response_content: str):
+        # 写入日志：交给异步写入器攒批落库，不占用请求路径上的数据库连接
+        try:
+            await request_log_sink.put(RequestLog(
+                method=request.method,
+                path=request.url.path,
+                request_body=request_body,
+                request_params=dict(request.query_params),
+                request_headers=log_policy.filter_headers(request.headers),
+                response_content=response_content,
+                response_headers=log_policy.filter_headers(response.headers),
+                status_code=response.status_code,
+                duration=(time.time() - start_time) * 1000,
+                client_ip=get_client_ip(request),
+                created_at=timezone.now(),
+            ))
+        except Exception as log_error:
+            logging.error(f"[日志写入失败] {log_error}")
 
     try:
         response = await call_next(request)
-
-        # 读取响应体内容
-        response_body = b""
-        async for chunk in response.body_iterator:
-            response_body += chunk
-
-        # 重建 body_iterator
-        response.body_iterator = iterate_in_chunks(response_body)
-
-        # 解析响应体
-        response_content_type = response.headers.get("content-type", "")
-        if "application/octet-stream" in response_content_type:
-            response_content = "<二进制数据>"
-        else:
-            try:
-                response_content = response_body.decode("utf-8", errors="replace")
-            except Exception as e:
-                response_content = f"<响应体错误: {str(e)}>"
     except Exception as e:
         response_content = f"<服务器错误: {str(e)}>"
         response = Response(content=response_content, status_code=500)
+        if log_policy.should_log(request.method, request.url.path, response.status_code):
+            await write_log(response, response_content)
+        return response
 
-    # 写入日志
-    try:
-        await RequestLog.create(
-            method=request.method,
-            path=request.url.path,
-            request_body=request_body,
-            request_params=dict(request.query_params),
-            request_headers=dict(request.headers),
-            response_content=response_content,
-            response_headers=dict(response.headers),
-            status_code=response.status_code,
-            duration=(time.time() - start_time) * 1000,
-            client_ip=get_client_ip(request),
-        )
-    except Exception as log_error:
-        print(f"[日志写入失败] {log_error}")
+    # 按日志策略（路径采样、错误必记、变更必记）决定是否记录，不记录时响应原样返回
+    if not log_policy.should_log(request.method, request.url.path, response.status_code):
+        return response
+
+    binary = "application/octet-stream" in response.headers.get("content-type", "")
+
+    async def on_body_complete(prefix: bytes, total: int):
+        await write_log(response, describe_response_body(prefix, total, binary))
+
+    if RESPONSE_CAPTURE_MODE == "buffer":
+        # 整体缓冲：响应体全部生成后再发送给客户端
+        response_body = bytearray()
+        async for chunk in response.body_iterator:
+            response_body += chunk
+        response.body_iterator = iterate_in_chunks(bytes(response_body))
+        await on_body_complete(bytes(response_body[:log_policy.max_response_body]), len(response_body))
+    else:
+        # 流式透传：分块原样发送，仅保留前缀用于日志，响应结束后再写日志
+        response.body_iterator = capture_body(response.body_iterator, log_policy.max_response_body, on_body_complete)
 
     return response
@@ -1,6 +1,34 @@
+from typing import Any
+
 from tortoise import fields
 from tortoise.models import Model
 
+from BlackListProjectPlusUp.keys import key_hash, target_key
+
+
+class VarBinaryField(fields.Field[bytes], bytes):
+    """定长上限的二进制字段（VARBINARY），可用于过滤"""
+
+    field_type = bytes
+
+    def __init__(self, max_length: int, **kwargs: Any) -> None:
+        self.max_length = int(max_length)
+        super().__init__(**kwargs)
+
+    @property
+    def SQL_TYPE(self) -> str:
+        return f"VARBINARY({self.max_length})"
+
+
+class TargetHashMixin:
+    """创建实例时由 (target_id, target_value) 填充 target_key 与 target_hash，create/bulk_create 均经过此处"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        if self.target_key is None and self.target_id is not None and self.target_value is not None:
+            self.target_key = target_key(self.target_id, self.target_value)
+            self.target_hash = key_hash(self.target_id, self.target_key)
+
 
 class BlacklistCategory(Model):
     """
@@ -26,15 +54,18 @@ class BlacklistCategory(Model):
         return f"BlacklistCategory(id={self.id}, classification={self.classification}, entry_name={self.entry_name})"
 
 
-class BlacklistUser(Model):
+class BlacklistUser(TargetHashMixin, Model):
     """
     定义黑名单具体用户
     """
     id = fields.IntField(pk=True, description="主键ID")
 
-    target_id = fields.IntField(index=True, description='字段类型：1-uid,2-设备,3-IP')
-    target_value = fields.CharField(max_length=500,index=True, description='字段值')
+    target_id = fields.IntField(description='字段类型：1-uid,2-设备,3-IP,4-电话,5-邮箱')
+    target_value = fields.CharField(max_length=500, description='字段值（规范写法，按 target_hash/target_key 查找）')
     brand_id = fields.IntField(default=0, description='品牌id，在category属于的classification=IM时候才有意义，默认值为0')
+    target_key = VarBinaryField(max_length=2001, null=True,
+                                description='target_value 规范化后的紧凑编码（uid/电话8字节，IP 4/16字节，其余为文本）')
+    target_hash = fields.BigIntField(null=True, description='定长查找键：target_id+target_key 的63位哈希')
 
     # uid = fields.IntField(index=True, description='用户id')
     category = fields.ForeignKeyField("models.BlacklistCategory", related_name="users", db_column="category_id",
@@ -46,16 +77,20 @@ class BlacklistUser(Model):
     class Meta:
         table = "blacklist_users_aggregate"
         unique_together = [("target_id","target_value","brand_id", "category")]
+        indexes = [("target_hash", "category", "brand_id")]
         table_description = "所有黑名单字段"
 
 
-class BlacklistUserExclusion(Model):
+class BlacklistUserExclusion(TargetHashMixin, Model):
     """
     定义黑名单某一类型排除项
     """
     id = fields.IntField(pk=True, description="主键ID")
-    target_id = fields.IntField(index=True, description='字段类型：1-uid,2-设备,3-IP')
-    target_value = fields.CharField(max_length=500,index=True, description='字段值')
+    target_id = fields.IntField(description='字段类型：1-uid,2-设备,3-IP,4-电话,5-邮箱')
+    target_value = fields.CharField(max_length=500, description='字段值（规范写法，按 target_hash/target_key 查找）')
+    target_key = VarBinaryField(max_length=2001, null=True,
+                                description='target_value 规范化后的紧凑编码（uid/电话8字节，IP 4/16字节，其余为文本）')
+    target_hash = fields.BigIntField(null=True, description='定长查找键：target_id+target_key 的63位哈希')
     category = fields.ForeignKeyField("models.BlacklistCategory", related_name="exclusions", db_column="category_id",
                                       description="关联的黑名单类别ID")  # 手动指定数据库字段名
     level = fields.IntField(default=3,null=False,description='黑名单级别：1-全部过滤，2-按照所属的classification过滤，3-仅按照category过滤(默认级别)')
@@ -67,9 +102,58 @@ class BlacklistUserExclusion(Model):
         table = "blacklist_users_exclusion"
 
         unique_together = [("target_id","target_value", "category")]
+        indexes = [("target_hash", "category")]
         table_description = "白名单：黑名单排除项"
 
 
+class BlacklistChange(Model):
+    """
+    黑名单/白名单变更日志（只追加）
+
+    与数据变更在同一事务中写入，id 即变更序号，供 /blacklist/changes?since=<seq> 增量同步
+    """
+    id = fields.BigIntField(pk=True, description="变更序号，单调递增")
+    entity = fields.CharField(max_length=16, description="变更对象：user-黑名单，exclusion-白名单，category-分类（级联删除其下全部黑/白名单）")
+    op = fields.CharField(max_length=8, description="操作：insert/update/delete")
+    target_id = fields.IntField(null=True, description='字段类型：1-uid,2-设备,3-IP')
+    target_value = fields.CharField(max_length=500, null=True, description='字段值')
+    brand_id = fields.IntField(null=True, description='品牌id（仅黑名单）')
+    category_id = fields.IntField(description="黑名单类别ID（不设外键，分类删除后日志保留）")
+    level = fields.IntField(null=True, description='白名单级别（仅白名单）')
+    modify_user = fields.IntField(default=0, description='操作者id')
+    create_time = fields.DatetimeField(auto_now_add=True, description="变更时间")
+
+    class Meta:
+        table = "blacklist_change_journal"
+        table_description = "黑名单/白名单变更日志"
+
+
+class BlacklistJob(Model):
+    """
+    后台任务（级联清理等耗时操作）
+
+    接口只登记任务并返回 202，由进程内任务执行器分块执行、逐块提交并更新进度
+    """
+    id = fields.IntField(pk=True, description="任务ID")
+    kind = fields.CharField(max_length=32, description="任务类型：exclusion_cleanup-白名单级联清理，category_delete-删除分类")
+    status = fields.CharField(max_length=16, default='pending', index=True,
+                              description="状态：pending-排队中，running-执行中，succeeded-成功，failed-失败")
+    params = fields.JSONField(description="任务参数")
+    total = fields.BigIntField(null=True, description="开始执行时统计的待处理行数")
+    processed = fields.BigIntField(default=0, description="已处理（删除）的行数")
+    chunks = fields.IntField(default=0, description="已提交的块数")
+    error = fields.TextField(null=True, description="失败原因")
+    modify_user = fields.IntField(default=0, description='操作者id')
+    create_time = fields.DatetimeField(auto_now_add=True, description="创建时间")
+    start_time = fields.DatetimeField(null=True, description="开始执行时间")
+    finish_time = fields.DatetimeField(null=True, description="结束时间")
+    update_time = fields.DatetimeField(auto_now=True, description="最近一次进度更新时间")
+
+    class Meta:
+        table = "blacklist_jobs"
+        table_description = "后台任务"
+
+
 class RequestLog(Model):
     id = fields.IntField(pk=True, description='主键ID')
     client_ip = fields.CharField(max_length=45, null=True, description='客户端IP地址（支持IPv4/IPv6）')
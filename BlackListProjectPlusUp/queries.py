@@ -0,0 +1,179 @@
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Set, Tuple, Type
+
+from tortoise.expressions import Q
+from tortoise.models import Model
+
+from BlackListProjectPlusUp.keys import canonical_value, key_hash, pack_canonical, target_filter
+from BlackListProjectPlusUp.models import BlacklistCategory, BlacklistUser, BlacklistUserExclusion
+from BlackListProjectPlusUp.replicas import read_db
+
+
+def _dialect(db) -> str:
+    return db.capabilities.dialect
+
+
+def _quote(db, name: str) -> str:
+    return f"`{name}`" if _dialect(db) == 'mysql' else f'"{name}"'
+
+
+def _placeholder(db) -> str:
+    return '%s' if _dialect(db) == 'mysql' else '?'
+
+
+def build_tuple_in(db, columns: Sequence[str], count: int, alias: Optional[str] = None) -> str:
+    """
+    构建精确元组匹配条件，参数按元组顺序展开
+
+    - MySQL：行构造器 (a,b,c) IN ((%s,%s,%s),...)，可走联合索引的范围扫描
+    - SQLite：(a=? AND b=? AND c=?) OR ...，SQLite 对行值 IN 列表不走索引，用于本地基准测试
+    """
+    mark = _placeholder(db)
+    prefix = f"{alias}." if alias else ''
+    names = [prefix + _quote(db, c) for c in columns]
+    if _dialect(db) == 'mysql':
+        row = '(' + ','.join([mark] * len(columns)) + ')'
+        return '(' + ','.join(names) + ') IN (' + ','.join([row] * count) + ')'
+    row = '(' + ' AND '.join(f"{name}={mark}" for name in names) + ')'
+    return '(' + ' OR '.join([row] * count) + ')'
+
+
+async def fetch_by_tuples(model: Type[Model], key_columns: Sequence[str], keys: Sequence[Tuple],
+                          columns: Sequence[str], chunk_size: int = 500) -> List[Tuple[Any, ...]]:
+    """
+    按元组精确匹配查询，只返回与请求完全对应的行，避免多个独立 IN 条件产生的笛卡尔积
+
+    key_columns/columns 为数据库列名（外键使用 category_id 这类实际列名）
+    返回 columns 顺序的元组列表
+
+    键中同时含 target_id、target_value 且表带有 target_hash 时，按 (target_hash, target_id, target_key) 匹配目标：
+    走定长哈希索引，并与规范写法不同的历史记录一致匹配；返回行中的 target_value 为请求值的规范写法，便于与请求键比较
+    """
+    db = read_db(model)
+    table = _quote(db, model._meta.db_table)
+    keys = list(dict.fromkeys(keys))
+    rows: List[Tuple[Any, ...]] = []
+
+    hashed = ('target_hash' in model._meta.fields_map and 'target_id' in key_columns
+              and 'target_value' in key_columns)
+    select_columns = list(columns)
+    if hashed:
+        id_pos, value_pos = key_columns.index('target_id'), key_columns.index('target_value')
+        key_columns = ('target_hash',) + tuple('target_key' if c == 'target_value' else c for c in key_columns)
+        canonical = 'target_id' in columns and 'target_value' in columns
+        if canonical:
+            select_columns = [c for c in columns if c != 'target_value'] + ['target_key']
+    select = ','.join(_quote(db, c) for c in select_columns)
+
+    for i in range(0, len(keys), chunk_size):
+        chunk = keys[i:i + chunk_size]
+        sql = f"SELECT {select} FROM {table} WHERE {build_tuple_in(db, key_columns, len(chunk))}"
+        if hashed:
+            encoded, values_by_key = [], {}
+            for key in chunk:
+                key = list(key)
+                value = canonical_value(key[id_pos], key[value_pos])
+                key[value_pos] = pack_canonical(key[id_pos], value)
+                values_by_key[(key[id_pos], key[value_pos])] = value
+                encoded.append((key_hash(key[id_pos], key[value_pos]),) + tuple(key))
+            chunk = encoded
+        values = [v for key in chunk for v in key]
+        result = await db.execute_query_dict(sql, values)
+        if hashed and canonical:
+            # 命中行的 target_key 必与某个请求键相同，直接取回请求值的规范写法，无需逐行规范化
+            for r in result:
+                r['target_value'] = values_by_key[(r['target_id'], bytes(r['target_key']))]
+        rows.extend(tuple(r[c] for c in columns) for r in result)
+
+    return rows
+
+
+async def distinct_target_ids(model: Type[Model]) -> List[int]:
+    """表中出现过的 target_id：沿唯一键前缀逐个定位下一个值（每个值一次索引查找，不扫描整个索引）"""
+    target_ids: List[int] = []
+    while True:
+        query = model.filter(target_id__gt=target_ids[-1]) if target_ids else model.all()
+        found = await query.order_by('target_id').limit(1).values_list('target_id', flat=True)
+        if not found:
+            return target_ids
+        target_ids.append(found[0])
+
+
+async def target_value_filter(model: Type[Model], target_value: str) -> Q:
+    """
+    只给 target_value、未给 target_id 时的查询条件
+
+    target_value 没有单列索引：先取表中出现过的 target_id（见 distinct_target_ids），
+    再按每个 target_id 的 target_hash/target_key 组成 OR 条件，各分支走 (target_hash, ...) 联合索引。
+    target_value 按各 target_id 分别规范化，与带 target_id 的查询一致
+    """
+    target_ids = await distinct_target_ids(model)
+    if not target_ids:
+        return Q(target_value=target_value)
+    return Q(*[Q(**target_filter(target_id, target_value)) for target_id in target_ids], join_type=Q.OR)
+
+
+async def fetch_exclusions_for_targets(targets: Sequence[Tuple[int, str]], chunk_size: int = 500
+                                       ) -> Dict[Tuple[int, str], List[Tuple[int, Optional[int], int]]]:
+    """
+    一次查询（按 chunk_size 分块）取出多个目标的全部白名单记录，并关联分类得到 classification
+
+    返回 {(target_id, 规范写法的 target_value): [(category_id, level, classification), ...]}
+    """
+    db = read_db(BlacklistUserExclusion)
+    exclusion_table = _quote(db, BlacklistUserExclusion._meta.db_table)
+    category_table = _quote(db, BlacklistCategory._meta.db_table)
+    targets = list(dict.fromkeys(targets))
+    exclusions: Dict[Tuple[int, str], List[Tuple[int, Optional[int], int]]] = {}
+
+    for i in range(0, len(targets), chunk_size):
+        chunk = targets[i:i + chunk_size]
+        sql = (f"SELECT e.{_quote(db, 'target_id')},e.{_quote(db, 'target_key')},e.{_quote(db, 'category_id')},"
+               f"e.{_quote(db, 'level')},c.{_quote(db, 'classification')} "
+               f"FROM {exclusion_table} e JOIN {category_table} c ON c.{_quote(db, 'id')}=e.{_quote(db, 'category_id')} "
+               f"WHERE {build_tuple_in(db, ('target_hash', 'target_id', 'target_key'), len(chunk), alias='e')}")
+        values, values_by_key = [], {}
+        for target_id, target_value in chunk:
+            value = canonical_value(target_id, target_value)
+            key = pack_canonical(target_id, value)
+            values_by_key[(target_id, key)] = value
+            values += [key_hash(target_id, key), target_id, key]
+        result = await db.execute_query_dict(sql, values)
+        for row in result:
+            exclusions.setdefault((row['target_id'], values_by_key[(row['target_id'], bytes(row['target_key']))]),
+                                  []).append((row['category_id'], row['level'], row['classification']))
+
+    return exclusions
+
+
+async def fetch_exclusion_violations(chunk_size: int = 5000) -> AsyncIterator[dict]:
+    """
+    找出仍被白名单覆盖的黑名单记录（按白名单级别判定，与写入时的清理规则一致）
+
+    按白名单主键分段关联黑名单与分类表，每条黑名单记录只返回一次：
+    {"id", "target_id", "target_value", "brand_id", "category_id", "exclusion_category_id", "level"}
+    """
+    db = BlacklistUserExclusion._meta.db
+    q = lambda name: _quote(db, name)
+    mark = _placeholder(db)
+    exclusion_table = q(BlacklistUserExclusion._meta.db_table)
+    user_table = q(BlacklistUser._meta.db_table)
+    category_table = q(BlacklistCategory._meta.db_table)
+    sql = (f"SELECT u.{q('id')},u.{q('target_id')},u.{q('target_value')},u.{q('brand_id')},u.{q('category_id')},"
+           f"e.{q('category_id')} AS {q('exclusion_category_id')},e.{q('level')} "
+           f"FROM {exclusion_table} e "
+           f"JOIN {user_table} u ON u.{q('target_hash')}=e.{q('target_hash')} "
+           f"AND u.{q('target_id')}=e.{q('target_id')} AND u.{q('target_key')}=e.{q('target_key')} "
+           f"JOIN {category_table} cu ON cu.{q('id')}=u.{q('category_id')} "
+           f"JOIN {category_table} ce ON ce.{q('id')}=e.{q('category_id')} "
+           f"WHERE e.{q('id')}>{mark} AND e.{q('id')}<={mark} AND (e.{q('level')}=1 "
+           f"OR (e.{q('level')}=2 AND cu.{q('classification')}=ce.{q('classification')}) "
+           f"OR ((e.{q('level')}=3 OR e.{q('level')} IS NULL) AND u.{q('category_id')}=e.{q('category_id')})) "
+           f"ORDER BY u.{q('id')}")
+
+    max_id = await BlacklistUserExclusion.all().order_by('-id').limit(1).values_list('id', flat=True)
+    seen: Set[int] = set()
+    for start in range(0, max_id[0] if max_id else 0, chunk_size):
+        for row in await db.execute_query_dict(sql, [start, start + chunk_size]):
+            if row['id'] not in seen:
+                seen.add(row['id'])
+                yield row
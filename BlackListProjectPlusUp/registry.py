@@ -0,0 +1,74 @@
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from BlackListProjectPlusUp.models import BlacklistCategory
+
+
+class CategoryRegistry:
+    """
+    进程级黑名单分类注册表
+
+    分类表很小且极少变化，首次使用时整表加载：
+    - id -> {"id", "classification", "entry_name"}
+    - classification -> [category_id, ...]
+    分类的创建/更新/删除接口调用 invalidate() 使其失效；
+    多 worker 部署时其他进程依赖 CATEGORY_REGISTRY_TTL（秒）过期后重新加载。
+    """
+
+    def __init__(self, ttl: float = 60):
+        self.ttl = ttl
+        self._snapshot: Optional[Tuple[Dict[int, dict], Dict[int, List[int]]]] = None
+        self._loaded_at = 0.0
+        self._version = 0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        self._version += 1
+        self._snapshot = None
+
+    def _fresh(self) -> bool:
+        return self._snapshot is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    async def _load(self) -> Tuple[Dict[int, dict], Dict[int, List[int]]]:
+        if self._fresh():
+            return self._snapshot
+
+        async with self._lock:
+            if self._fresh():
+                return self._snapshot
+
+            version = self._version
+            rows = await BlacklistCategory.all().order_by('id').values('id', 'classification', 'entry_name')
+            by_id = {row['id']: row for row in rows}
+            by_classification: Dict[int, List[int]] = {}
+            for row in rows:
+                by_classification.setdefault(row['classification'], []).append(row['id'])
+
+            # 加载期间发生了失效，本次结果只用于当前调用，不缓存
+            if version == self._version:
+                self._snapshot = (by_id, by_classification)
+                self._loaded_at = time.monotonic()
+            return by_id, by_classification
+
+    async def all(self) -> List[dict]:
+        """按ID排序的全部分类"""
+        by_id, _ = await self._load()
+        return list(by_id.values())
+
+    async def get(self, category_id: int) -> Optional[dict]:
+        by_id, _ = await self._load()
+        return by_id.get(category_id)
+
+    async def classifications(self) -> Dict[int, int]:
+        """{category_id: classification}"""
+        by_id, _ = await self._load()
+        return {category_id: row['classification'] for category_id, row in by_id.items()}
+
+    async def ids_for_classification(self, classification: int) -> List[int]:
+        _, by_classification = await self._load()
+        return list(by_classification.get(classification, []))
+
+
+category_registry = CategoryRegistry(ttl=float(os.getenv("CATEGORY_REGISTRY_TTL", "60")))
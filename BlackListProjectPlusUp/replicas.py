@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from tortoise import timezone
+from tortoise.connection import connections
+from tortoise.transactions import in_transaction
+
+from BlackListProjectPlusUp.models import BlacklistChange
+
+# 当前请求选定的只读副本连接名，None 表示使用主库
+_read_connection: ContextVar[Optional[str]] = ContextVar('read_connection', default=None)
+
+
+class ReplicaPool:
+    """
+    只读副本选择
+
+    后台每 check_interval 秒估算各副本的复制延迟：副本上变更日志的最大序号之后，主库中第一条变更的写入时间距今的秒数
+    （副本已追上时为0；无需 REPLICATION CLIENT 权限）。查询失败或延迟超过 max_lag 的副本不参与路由；
+    延迟数据超过 3 个检查周期未更新（检查任务停止）时全部回退主库。
+
+    只读接口通过 prefer_replica 依赖在请求开始时选定一个副本（轮询），同一请求内的查询都走该副本；
+    写入路径与事务不受影响，始终使用主库。
+    """
+
+    def __init__(self, max_lag: float = 5, check_interval: float = 5):
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.primary: Optional[str] = None
+        self.replicas: List[str] = []
+        self._lags: Dict[str, Optional[float]] = {}
+        self._errors: Dict[str, str] = {}
+        self._checked_at = 0.0
+        self._cycle = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def healthy(self) -> List[str]:
+        """延迟在阈值内的副本"""
+        if time.monotonic() - self._checked_at > self.check_interval * 3:
+            return []
+        return [name for name in self.replicas
+                if self._lags.get(name) is not None and self._lags[name] <= self.max_lag]
+
+    def choose(self) -> Optional[str]:
+        """轮询选择一个可用副本，没有可用副本时返回 None（主库）"""
+        healthy = self.healthy
+        if not healthy:
+            return None
+        self._cycle += 1
+        return healthy[self._cycle % len(healthy)]
+
+    async def measure(self, name: str) -> float:
+        """估算副本的复制延迟（秒）"""
+        replica_seq = await BlacklistChange.all().using_db(connections.get(name)).order_by('-id').limit(
+            1).values_list('id', flat=True)
+        missing = await BlacklistChange.filter(id__gt=replica_seq[0] if replica_seq else 0).using_db(
+            connections.get(self.primary)).order_by('id').limit(1).values_list('create_time', flat=True)
+        if not missing:
+            return 0.0
+        created = missing[0] if timezone.is_aware(missing[0]) else timezone.make_aware(missing[0])
+        return max((timezone.now() - created).total_seconds(), 0.0)
+
+    async def check(self):
+        for name in self.replicas:
+            try:
+                self._lags[name] = await self.measure(name)
+                self._errors.pop(name, None)
+            except Exception as e:
+                if name not in self._errors:
+                    logging.error(f"Replica {name} lag check failed, reads fall back to primary: {e}")
+                self._lags[name] = None
+                self._errors[name] = str(e)
+        self._checked_at = time.monotonic()
+
+    async def start(self, primary: str, replicas: List[str]):
+        """首次检查完成后再开始路由，之后在后台周期检查"""
+        self.primary, self.replicas = primary, list(replicas)
+        if not self.replicas or self._task is not None:
+            return
+        await self.check()
+        self._task = asyncio.create_task(self._run())
+        logging.info(f"Replica routing enabled for {self.replicas} (max_lag={self.max_lag}s)")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            await self.check()
+
+    def stats(self) -> dict:
+        healthy = self.healthy
+        return {
+            "primary": self.primary,
+            "max_lag_seconds": self.max_lag,
+            "replicas": [{"name": name, "lag_seconds": self._lags.get(name), "healthy": name in healthy,
+                          "error": self._errors.get(name)} for name in self.replicas],
+        }
+
+
+replica_pool = ReplicaPool(
+    max_lag=float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "5")),
+    check_interval=float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "5")),
+)
+
+
+async def prefer_replica():
+    """只读接口依赖：为本次请求选定只读副本（无可用副本时使用主库）"""
+    _read_connection.set(replica_pool.choose())
+
+
+def read_db(model):
+    """原生 SQL 的读连接：当前请求选定的副本，否则为模型的默认连接（事务内即事务连接）"""
+    name = _read_connection.get()
+    return connections.get(name) if name else model._meta.db
+
+
+@asynccontextmanager
+async def primary_transaction():
+    """
+    主库事务（配置了多个连接时 in_transaction 必须指定连接名）
+
+    事务内的读查询同样走主库：即使当前请求已由 prefer_replica 选定副本，路由与 read_db 在事务期间也回到主库，
+    避免在事务内读到副本上的旧数据
+    """
+    token = _read_connection.set(None)
+    try:
+        async with in_transaction(BlacklistChange._meta.default_connection) as connection:
+            yield connection
+    finally:
+        _read_connection.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Tortoise 连接路由（配置于 TORTOISE_ORM3['routers']）
+
+    读查询使用当前请求选定的副本；未经 prefer_replica 标记的请求（含全部写入接口）与写查询均使用默认连接（主库）
+    """
+
+    def db_for_read(self, model) -> Optional[str]:
+        return _read_connection.get()
+
+    def db_for_write(self, model) -> Optional[str]:
+        return None
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional, Union
+from typing import Literal, Optional, Union
 
 from pydantic import BaseModel
 
@@ -15,6 +15,8 @@ class BlacklistExclusionQueryParams(BaseModel):
     category_id: Optional[int] = None
     offset: int = 0
     limit: int = 100
+    after_id: Optional[str] = None  # 游标分页：上一页返回的 next_cursor，传入后忽略 offset
+    count_mode: Literal['exact', 'estimate', 'none'] = 'exact'  # 总数：精确（按条件缓存）/统计信息估算/不计数
 
     class Config:
         json_schema_extra = {
@@ -15,6 +15,7 @@ class BlacklistUserQueryParams(BaseModel):
     classification: Optional[str] = None  # 分类名称参数
     offset: int = 0
     limit: int = 100
+    after_id: Optional[str] = None  # 游标分页：上一页返回的 next_cursor，传入后忽略 offset
 
     class Config:
         json_schema_extra = {
@@ -1,9 +1,8 @@
 from fastapi import APIRouter, Depends, Request
 from fastapi.encoders import jsonable_encoder
-from fastapi_cache.decorator import cache
-from fastapi_cache import FastAPICache
 
 from utils.BaseResponse import success_response, error_response, GeneralResponse
+from utils.CacheUtils import cached, filter_tags, clear_category_cache, invalidate_resource
 
 
 
@@ -20,7 +19,8 @@ black_category = APIRouter()
 
 
 @black_category.get("/", response_model=GeneralResponse[Union[List[ReadBlacklistCategory], ReadBlacklistCategory]])
-@cache(expire=60)  # 删除 key_builder 参数
+@cached("category", tags=lambda params: filter_tags("category", category_id=params.id,
+                                                    classification=params.classification), expire=60)
 async def query_categories(params: BlacklistCategoryQueryParams = Depends(), request: Request = None):
     """
     统一的黑名单类别查询接口
@@ -109,11 +109,6 @@ async def create_category(data: CreateBlacklistCategory):
             data=jsonable_encoder(ReadBlacklistCategory.model_validate(exists_en, from_attributes=True)),
             code=status.HTTP_400_BAD_REQUEST )
     
-    created = await BlacklistCategory.create(
-        classification=data.classification.value if isinstance(data.classification, IntEnum) else data.classification,
-            data=jsonable_encoder(ReadBlacklistCategory.model_validate(exists_en, from_attributes=True)),
-            code=status.HTTP_400_BAD_REQUEST )
-    
     created = await BlacklistCategory.create(
         classification=data.classification.value if isinstance(data.classification, IntEnum) else data.classification,
         cls_name=CategoryEnum.get_label(data.classification),
@@ -122,7 +117,7 @@ async def create_category(data: CreateBlacklistCategory):
         describe=data.describe
     )
 
-    await FastAPICache.clear(namespace="blacklist-cache")
+    await clear_category_cache(created.id, [created.classification])
 
     return success_response(message="Category insert successfully",
         data=jsonable_encoder(ReadBlacklistCategory.model_validate(created, from_attributes=True)),
@@ -151,7 +146,10 @@ async def delete_category(cat_id: int):
         # 删除该分类
         await category.delete()
 
-        await FastAPICache.clear(namespace="blacklist-cache")
+        # 分类删除会级联删除其下的黑名单/白名单，涉及的目标无法枚举，清空这两类缓存
+        await clear_category_cache(cat_id, [category.classification])
+        await invalidate_resource("user")
+        await invalidate_resource("exclusion")
 
         return success_response(message=f"Category with ID {cat_id} has been successfully deleted",
             data=jsonable_encoder(ReadBlacklistCategory.model_validate(category, from_attributes=True)),
@@ -186,6 +184,7 @@ async def update_category(cat_id: int, request: CategoryUpdateRequest):
 
     if not category:
         return error_response(message=f"Category {cat_id} does not exist",code=status.HTTP_404_NOT_FOUND)
+    old_classification = category.classification
 
     # 更新 entry_name
     if request.entry_name is not None and request.entry_name.strip() != '':
@@ -222,19 +221,19 @@ async def update_category(cat_id: int, request: CategoryUpdateRequest):
 
     await category.save()
 
-    await FastAPICache.clear(namespace="blacklist-cache")
+    await clear_category_cache(cat_id, {old_classification, category.classification})
 
     return success_response(message="Category updated successfully",
         data=jsonable_encoder(ReadBlacklistCategory.model_validate(category, from_attributes=True)),
         code=status.HTTP_200_OK)
 
-    await FastAPICache.clear(namespace="blacklist-cache")
+    await clear_category_cache(cat_id, {old_classification, category.classification})
 
     return success_response(message="Category updated successfully",
         data=jsonable_encoder(ReadBlacklistCategory.model_validate(category, from_attributes=True)),
         code=status.HTTP_200_OK)
 
-    await FastAPICache.clear(namespace="blacklist-cache")
+    await clear_category_cache(cat_id, {old_classification, category.classification})
 
     return success_response(message="Category updated successfully",
         data=jsonable_encoder(ReadBlacklistCategory.model_validate(category, from_attributes=True)),
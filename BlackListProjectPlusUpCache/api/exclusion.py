@@ -3,20 +3,22 @@ from typing import List, Union, Optional
 from fastapi import APIRouter, status, Depends, Request
 from fastapi.encoders import jsonable_encoder
 from tortoise.transactions import in_transaction
-from fastapi_cache.decorator import cache
-from fastapi_cache import FastAPICache
 
+from BlackListProjectPlusUp.keys import canonical_value, target_filter
 from BlackListProjectPlusUp.models import BlacklistUserExclusion, BlacklistCategory, BlacklistUser
 from BlackListProjectPlusUp.schemas import CreateBlacklistExclusion, ReadBlacklistExclusion, CreationResult, DeleteResult, \
     BlacklistExclusionQueryParams, DeleteBlacklistExclusion
 from utils.BaseResponse import success_response, error_response, GeneralResponse
+from utils.CacheUtils import cached, filter_tags, clear_exclusion_cache
+from BlackListProjectPlusUpCache.api.user import clear_user_changes
 import json
 
 black_exclusion = APIRouter()
 
 
 @black_exclusion.get('/', response_model=GeneralResponse[List[ReadBlacklistExclusion]], response_model_exclude_unset=True)
-@cache(expire=60)  # 删除 key_builder 参数
+@cached("exclusion", tags=lambda params: filter_tags("exclusion", params.target_id, params.target_value,
+                                                          params.category_id), expire=60)
 async def query_exclusions(params: BlacklistExclusionQueryParams = Depends(), request: Request = None):
     """
     统一白名单查询接口
@@ -44,7 +46,11 @@ async def query_exclusions(params: BlacklistExclusionQueryParams = Depends(), re
 
         # 添加过滤条件
         if params.target_id is not None:
-            query = query.filter(target_id=params.target_id,target_value=params.target_value)
+            if params.target_value is not None:
+                params.target_value = canonical_value(params.target_id, params.target_value)
+                query = query.filter(**target_filter(params.target_id, params.target_value))
+            else:
+                query = query.filter(target_id=params.target_id, target_value=None)
         if params.category_id is not None:
             # 检查分类是否存在
             if not await BlacklistCategory.filter(id=params.category_id).exists():
@@ -66,7 +72,7 @@ async def query_exclusions(params: BlacklistExclusionQueryParams = Depends(), re
         # 执行查询
         result = await query.all().offset(params.offset).limit(params.limit)
 
-        return success_response(message="Successfully retrieved exclusion data", data=jsonable_encoder(result),
+        return success_response(message="Successfully retrieved exclusion data", data=jsonable_encoder([ReadBlacklistExclusion.model_validate(r, from_attributes=True) for r in result]),
             code=status.HTTP_200_OK)
 
     except Exception as e:
@@ -126,6 +132,8 @@ async def create_exclusions(request: List[CreateBlacklistExclusion]):
     result = CreationResult(success_count=0, failed_count=0, skipped_count=0, skipped_items=[], failed_items=[],
         removed_from_blacklist=0
     )
+    removed_users = []
+    created = []
 
     try:
         async with in_transaction():
@@ -133,12 +141,11 @@ async def create_exclusions(request: List[CreateBlacklistExclusion]):
                 try:
                     # 设置默认level=3
                     level = item.level if item.level is not None else 3
-                    item.target_value = str(item.target_value)
+                    item.target_value = canonical_value(item.target_id, item.target_value)
 
                     # 检查是否已存在相同记录
                     if await BlacklistUserExclusion.filter(
-                            target_id=item.target_id,
-                            target_value=item.target_value,
+                            **target_filter(item.target_id, item.target_value),
                             category_id=item.category_id).exists():
                         result.skipped_count += 1
                         result.skipped_items.append(item.dict())
@@ -149,7 +156,8 @@ async def create_exclusions(request: List[CreateBlacklistExclusion]):
                         target_id=item.target_id,
                         target_value=item.target_value,
                         category_id=item.category_id,
-                        level=level
+                        level=level,
+                        removed=removed_users
                     )
                     result.removed_from_blacklist += removed_count
 
@@ -162,6 +170,7 @@ async def create_exclusions(request: List[CreateBlacklistExclusion]):
                         level=level
                     )
                     result.success_count += 1
+                    created.append((item.target_id, item.target_value, item.category_id))
 
                 except Exception as e:
                     result.failed_count += 1
@@ -173,7 +182,8 @@ async def create_exclusions(request: List[CreateBlacklistExclusion]):
         response_data = result.dict()
         status_code = status.HTTP_207_MULTI_STATUS if result.failed_count > 0 else status.HTTP_201_CREATED
 
-        await FastAPICache.clear(namespace="blacklist-cache")
+        await clear_user_changes(removed_users)
+        await clear_exclusion_changes(created)
 
         return success_response(
             message=f"Created {result.success_count} exclusions, removed {result.removed_from_blacklist} from blacklist",
@@ -188,7 +198,8 @@ async def create_exclusions(request: List[CreateBlacklistExclusion]):
         )
 
 
-async def clean_blacklist_by_level(target_id: int, target_value: str, category_id: int, level: int) -> int:
+async def clean_blacklist_by_level(target_id: int, target_value: str, category_id: int, level: int,
+                                   removed: Optional[list] = None) -> int:
     """
     根据白名单级别清理黑名单
 
@@ -197,11 +208,15 @@ async def clean_blacklist_by_level(target_id: int, target_value: str, category_i
     - level=2：删除同classification下所有category的该target黑名单记录
     - level=3（默认）：仅删除相同category的该target黑名单记录
 
+    removed 不为 None 时追加被清理的 (target_id, target_value, category_id)，用于提交后失效缓存
     返回删除的记录数
     """
     if level == 1:
         # 删除该uid的所有黑名单记录
-        return await BlacklistUser.filter(target_id=target_id,target_value=target_value).delete()
+        query = BlacklistUser.filter(**target_filter(target_id, target_value))
+        if removed is not None:
+            removed.extend((target_id, target_value, c) for c in await query.values_list('category_id', flat=True))
+        return await query.delete()
 
     elif level == 2:
         # 获取当前category的classification
@@ -210,19 +225,35 @@ async def clean_blacklist_by_level(target_id: int, target_value: str, category_i
         category_ids = await BlacklistCategory.filter(
             classification=category.classification
         ).values_list('id', flat=True)
+        if removed is not None:
+            removed.extend((target_id, target_value, c) for c in category_ids)
         # 删除这些category下的该uid记录
         return await BlacklistUser.filter(
-            target_id=target_id,target_value=target_value,
+            **target_filter(target_id, target_value),
             category_id__in=category_ids
         ).delete()
 
     else:  # level=3或未指定
+        if removed is not None:
+            removed.append((target_id, target_value, category_id))
         # 仅删除相同category的记录
         return await BlacklistUser.filter(
-            target_id=target_id,target_value=target_value,
+            **target_filter(target_id, target_value),
             category_id=category_id
         ).delete()
 
+async def clear_exclusion_changes(changes: List[tuple]):
+    """
+    白名单写入/删除提交后失效相关缓存
+    changes: [(target_id, target_value, category_id), ...]
+    target_value 可能是库中的历史写法，标签统一按规范写法构建，与查询缓存的标签一致
+    """
+    if changes:
+        await clear_exclusion_cache(targets={(target_id, canonical_value(target_id, target_value))
+                                             for target_id, target_value, _ in changes},
+                                    category_ids={category_id for _, _, category_id in changes})
+
+
 @black_exclusion.delete('/', response_model=GeneralResponse)
 async def delete_exclusions(requests: Union[DeleteBlacklistExclusion, List[DeleteBlacklistExclusion]]):
     """
@@ -259,12 +290,12 @@ async def delete_exclusions(requests: Union[DeleteBlacklistExclusion, List[Delet
 
     result = DeleteResult(success_count=0, failed_count=0, skipped_count=0, skipped_items=[], failed_items=[],
         deleted_items=[])
+    deleted = []
 
     try:
         async with in_transaction():
             for req in request_list:
                 try:
-                    req.target_value = str(req.target_value)
                     # 构建查询条件
                     query = BlacklistUserExclusion
                     if req.id is not None:
@@ -272,8 +303,9 @@ async def delete_exclusions(requests: Union[DeleteBlacklistExclusion, List[Delet
                     else:
                         if req.target_id is None or req.target_value is None or req.category_id is None:
                             raise ValueError("Must provide either id or both target_id, target_value and category_id")
-                        query = query.filter(target_id=req.target_id,
-                        target_value=req.target_value, category_id=req.category_id)
+                        req.target_value = canonical_value(req.target_id, req.target_value)
+                        query = query.filter(**target_filter(req.target_id, req.target_value),
+                                             category_id=req.category_id)
 
                     # 执行删除
                     exclusion = await query.first()
@@ -284,6 +316,7 @@ async def delete_exclusions(requests: Union[DeleteBlacklistExclusion, List[Delet
 
                     await exclusion.delete()
                     result.success_count += 1
+                    deleted.append((exclusion.target_id, exclusion.target_value, exclusion.category_id))
                     result.deleted_items.append(jsonable_encoder(ReadBlacklistExclusion.model_validate(exclusion)))
 
                 except Exception as e:
@@ -307,7 +340,7 @@ async def delete_exclusions(requests: Union[DeleteBlacklistExclusion, List[Delet
                 status_code = status.HTTP_404_NOT_FOUND
                 message = "No matching record found"
 
-        await FastAPICache.clear(namespace="blacklist-cache")
+        await clear_exclusion_changes(deleted)
 
         return success_response(message=message, data=response_data, code=status_code)
 
@@ -389,10 +422,9 @@ async def update_exclusions(request: CreateBlacklistExclusion):
         if request.id is not None:
             exclusion = await query.filter(id=request.id).first()
         else:
-            request.target_value = str(request.target_value)
+            request.target_value = canonical_value(request.target_id, request.target_value)
             exclusion = await query.filter(
-                target_id=request.target_id,
-                target_value=request.target_value,
+                **target_filter(request.target_id, request.target_value),
                 category_id=request.category_id
             ).first()
 
@@ -411,6 +443,7 @@ async def update_exclusions(request: CreateBlacklistExclusion):
         if request.level is not None:
             update_data['level'] = request.level
 
+        removed_users = []
         async with in_transaction():
             # 执行黑名单清理
             removed_count = 0
@@ -419,7 +452,8 @@ async def update_exclusions(request: CreateBlacklistExclusion):
                     target_id=exclusion.target_id,
                     target_value=exclusion.target_value,
                     category_id=exclusion.category_id,
-                    level=new_level
+                    level=new_level,
+                    removed=removed_users
                 )
 
             # 更新白名单记录
@@ -427,10 +461,13 @@ async def update_exclusions(request: CreateBlacklistExclusion):
                 await BlacklistUserExclusion.filter(id=exclusion.id).update(**update_data)
                 exclusion = await BlacklistUserExclusion.get(id=exclusion.id)
 
+        await clear_user_changes(removed_users)
+        await clear_exclusion_changes([(exclusion.target_id, exclusion.target_value, exclusion.category_id)])
+
         return success_response(
             message=f"Update successful{' and cleaned ' + str(removed_count) + ' blacklist records' if need_clean else ''}",
             data={
-                "updated_record": jsonable_encoder(exclusion),
+                "updated_record": jsonable_encoder(ReadBlacklistExclusion.model_validate(exclusion, from_attributes=True)),
                 "removed_from_blacklist": removed_count
             }
         )
@@ -4,19 +4,22 @@ import json
 from fastapi import APIRouter, status, Depends, Request
 from fastapi.encoders import jsonable_encoder
 from tortoise.exceptions import DBConnectionError
-from fastapi_cache.decorator import cache
-from fastapi_cache import FastAPICache
 
 from tortoise.transactions import in_transaction
+from BlackListProjectPlusUp.bloom import negative_filter
+from BlackListProjectPlusUp.keys import canonical_value, target_filter, target_hashes, target_keys
 from BlackListProjectPlusUp.models import BlacklistUserExclusion, BlacklistUser, BlacklistCategory
+from BlackListProjectPlusUp.queries import fetch_by_tuples, target_value_filter
 from BlackListProjectPlusUp.schemas import *
 from utils.BaseResponse import success_response, error_response, GeneralResponse
+from utils.CacheUtils import cached, cached_lookup, filter_tags, target_tag, clear_user_cache
 
 
 black_user = APIRouter()
 
 @black_user.get('/', response_model=GeneralResponse[List[ReadBlacklistUser]], response_model_exclude_unset=True)
-@cache(expire=60)
+@cached("user", tags=lambda params: filter_tags("user", params.target_id, params.target_value, params.category_id,
+                                                params.classification), expire=60)
 async def query_blacklist_users(params: BlacklistUserQueryParams = Depends(), request: Request = None):
     """
     统一黑名单查询接口
@@ -50,10 +53,15 @@ async def query_blacklist_users(params: BlacklistUserQueryParams = Depends(), re
 
         # 2. 构建查询条件（动态构建 filter_params）
         filter_params = {}
+        value_filters = []
         if params.target_id is not None:
             filter_params['target_id'] = params.target_id
         if params.target_value is not None:
-            filter_params['target_value'] = params.target_value
+            if params.target_id is not None:
+                params.target_value = canonical_value(params.target_id, params.target_value)
+                filter_params.update(target_filter(params.target_id, params.target_value))
+            else:
+                value_filters.append(await target_value_filter(BlacklistUser, params.target_value))
         if params.brand_id !=0:
             filter_params['brand_id'] = params.brand_id
         if category_ids is not None:
@@ -62,7 +70,7 @@ async def query_blacklist_users(params: BlacklistUserQueryParams = Depends(), re
             filter_params['category_id'] = params.category_id
 
         # 3. 直接查询数据
-        query = BlacklistUser.filter(**filter_params)
+        query = BlacklistUser.filter(*value_filters, **filter_params)
         result = await query.offset(params.offset).limit(params.limit).all()
 
         # 4. 如果结果为空，构造错误信息
@@ -92,7 +100,7 @@ async def query_blacklist_users(params: BlacklistUserQueryParams = Depends(), re
         # 5. 返回查询结果
         return success_response(
             message="Successfully retrieved blacklist records",
-            data=jsonable_encoder(result),
+            data=jsonable_encoder([ReadBlacklistUser.model_validate(r, from_attributes=True) for r in result]),
             code=status.HTTP_200_OK
         )
 
@@ -151,12 +159,13 @@ async def create_blacklist_users(request: List[CreateBlacklistUser]):
     """
     result = CreationResult(success_count=0, failed_count=0, skipped_count=0, skipped_items=[], failed_items=[],
                             removed_from_blacklist=0)
+    created = []
 
     try:
         async with in_transaction():
             for item in request:
                 try:
-                    item.target_value = str(item.target_value)
+                    item.target_value = canonical_value(item.target_id, item.target_value)
                     # 获取当前category的classification
                     category = await BlacklistCategory.get_or_none(id=item.category_id)
                     if not category:
@@ -173,8 +182,7 @@ async def create_blacklist_users(request: List[CreateBlacklistUser]):
                         continue
 
                     # 检查是否已存在于黑名单
-                    if await BlacklistUser.filter(target_id=item.target_id,
-                                                  target_value = item.target_value,
+                    if await BlacklistUser.filter(**target_filter(item.target_id, item.target_value),
                                                   brand_id = item.brand_id,
                                                   category_id=item.category_id).exists():
                         result.skipped_count += 1
@@ -186,7 +194,10 @@ async def create_blacklist_users(request: List[CreateBlacklistUser]):
 
                     # 创建黑名单记录
                     await BlacklistUser.create(target_id=item.target_id,target_value = item.target_value,brand_id = item.brand_id, category_id=item.category_id)
+                    # 事务提交前即写入负向过滤器：多出的"可能存在"只会多一次确认，不会漏判
+                    negative_filter.add(item.target_id, item.target_value, item.brand_id, item.category_id)
                     result.success_count += 1
+                    created.append((item.target_id, item.target_value, item.category_id))
 
 
                 except Exception as e:
@@ -196,6 +207,8 @@ async def create_blacklist_users(request: List[CreateBlacklistUser]):
                         "reason": str(e)
                     })
 
+        await clear_user_changes(created)
+
         response_data = {
             "success_count": result.success_count,
             "failed_count": result.failed_count,
@@ -224,6 +237,21 @@ async def create_blacklist_users(request: List[CreateBlacklistUser]):
         )
 
 
+async def clear_user_changes(changes: List[tuple]):
+    """
+    黑名单写入/删除提交后失效相关缓存
+    changes: [(target_id, target_value, category_id), ...]
+    target_value 可能是库中的历史写法，标签统一按规范写法构建，与查询缓存的标签一致
+    """
+    if not changes:
+        return
+    category_ids = {category_id for _, _, category_id in changes}
+    classifications = await BlacklistCategory.filter(id__in=category_ids).values_list('classification', flat=True)
+    await clear_user_cache(targets={(target_id, canonical_value(target_id, target_value))
+                                    for target_id, target_value, _ in changes},
+                           category_ids=category_ids, classifications=set(classifications))
+
+
 async def check_exclusion_levels(target_id: int, target_value: str, category_id: int, classification: int) -> Optional[str]:
     """
     检查白名单级别限制
@@ -235,7 +263,7 @@ async def check_exclusion_levels(target_id: int, target_value: str, category_id:
     - level=3（默认）：仅阻止相同category的黑名单创建
     """
     # 获取所有该用户的白名单记录
-    exclusions = await BlacklistUserExclusion.filter(target_id=target_id,target_value=target_value).prefetch_related('category')
+    exclusions = await BlacklistUserExclusion.filter(**target_filter(target_id, target_value)).prefetch_related('category')
 
     for exclusion in exclusions:
         # level=1：完全阻止
@@ -256,8 +284,50 @@ async def check_exclusion_levels(target_id: int, target_value: str, category_id:
     return None
 
 
+USER_KEY_COLUMNS = ('target_id', 'target_value', 'brand_id', 'category_id')
+
+
+def target_tags(key: tuple) -> List[str]:
+    """条目缓存的失效标签：键的前两位为 (target_id, target_value)"""
+    return [target_tag(key[0], key[1])]
+
+
+async def fetch_memberships(keys: List[tuple]) -> dict:
+    """按 (target_id, target_value, brand_id, category_id) 元组批量查询是否在黑名单中"""
+    existing = set(await fetch_by_tuples(BlacklistUser, USER_KEY_COLUMNS, keys, USER_KEY_COLUMNS))
+    return {key: key in existing for key in keys}
+
+
+async def fetch_target_entries(targets: List[tuple]) -> dict:
+    """按 (target_id, target_value) 批量查询目标所在的 [[category_id, brand_id], ...]"""
+    entries = {target: [] for target in targets}
+    rows = await fetch_by_tuples(BlacklistUser, ('target_id', 'target_value'), targets,
+                                 ('target_id', 'target_value', 'category_id', 'brand_id'))
+    for target_id, target_value, category_id, brand_id in rows:
+        entries[(target_id, target_value)].append([category_id, brand_id])
+    return entries
+
+
+async def lookup_memberships(keys: List[tuple]) -> dict:
+    """负向过滤器判定一定不在黑名单中的键直接返回 False，其余键走 cached_lookup（Redis，未命中再查 MySQL）"""
+    if not negative_filter.ready:
+        return await cached_lookup("user", "member", keys, fetch_memberships, target_tags)
+
+    memberships = {}
+    candidates = []
+    for key in dict.fromkeys(keys):
+        if negative_filter.might_contain(*key):
+            candidates.append(key)
+        else:
+            memberships[key] = False
+    if candidates:
+        found = await cached_lookup("user", "member", candidates, fetch_memberships, target_tags)
+        negative_filter.record_false_positives(sum(1 for key in candidates if not found[key]))
+        memberships.update(found)
+    return memberships
+
+
 @black_user.post('/bulk-check-optimized', response_model=GeneralResponse, response_model_exclude_unset=True)
-@cache(expire=60)
 async def bulk_check_users_in_blacklist_optimized(request: List[BlacklistUserCheckParams]):
     """
     批量检查目标是否在某一具体类的黑名单中
@@ -278,33 +348,12 @@ async def bulk_check_users_in_blacklist_optimized(request: List[BlacklistUserChe
     }
     """
     try:
-        batch_size = 200
-        results = []
-
-        for i in range(0, len(request), batch_size):
-            batch = request[i:i + batch_size]
-
-            # 查询所有匹配项
-            target_ids = list({user.target_id for user in batch})
-            target_values = list({str(user.target_value) for user in batch})
-            brand_ids = list({user.brand_id for user in batch})
-            category_ids = list({user.category_id for user in batch})
-
-            existing_records = await BlacklistUser.filter(
-                target_id__in=target_ids,
-                target_value__in=target_values,
-                brand_id__in=brand_ids,
-                category_id__in=category_ids
-            ).values_list('target_id', 'target_value', 'brand_id', 'category_id')
-
-            # 构建结果
-            existing_set = set(existing_records)
-            results.extend([
-                (user.target_id, user.target_value, user.brand_id, user.category_id) in existing_set
-                for user in batch
-            ])
-
-        return success_response(data=results)
+        # 整批与单条结果均缓存，只有未命中的条目按元组批量查询数据库
+        keys = [(user.target_id, canonical_value(user.target_id, user.target_value), user.brand_id, user.category_id)
+                for user in request]
+        memberships = await lookup_memberships(keys)
+
+        return success_response(data=[memberships[key] for key in keys])
 
     except Exception as e:
         return error_response(
@@ -351,6 +400,7 @@ async def delete_blacklist_users(requests: Union[DeleteBlacklistUser, List[Delet
                           skipped_items=[],
                           failed_items=[],
                           deleted_items=[])
+    deleted = []
 
     try:
         async with in_transaction():
@@ -363,8 +413,8 @@ async def delete_blacklist_users(requests: Union[DeleteBlacklistUser, List[Delet
                     else:
                         if req.target_id is None or req.target_value is None or req.category_id is None:
                             raise ValueError("Must provide either id or both uid and category_id")
-                        req.target_value = str(req.target_value)
-                        query = query.filter(target_id=req.target_id,target_value= req.target_value, category_id=req.category_id,brand_id=req.brand_id)
+                        req.target_value = canonical_value(req.target_id, req.target_value)
+                        query = query.filter(**target_filter(req.target_id, req.target_value), category_id=req.category_id,brand_id=req.brand_id)
 
                     # Execute deletion
                     user = await query.first()
@@ -375,6 +425,7 @@ async def delete_blacklist_users(requests: Union[DeleteBlacklistUser, List[Delet
 
                     await user.delete()
                     result.success_count += 1
+                    deleted.append((user.target_id, user.target_value, user.category_id))
                     result.deleted_items.append(
                         jsonable_encoder(ReadBlacklistUser.model_validate(user, from_attributes=True)))
 
@@ -400,7 +451,7 @@ async def delete_blacklist_users(requests: Union[DeleteBlacklistUser, List[Delet
                 status_code = status.HTTP_404_NOT_FOUND
                 message = "No matching record found"
 
-        await FastAPICache.clear(namespace="blacklist-cache")
+        await clear_user_changes(deleted)
 
         return success_response(message=message, data=response_data, code=status_code)
 
@@ -409,7 +460,6 @@ async def delete_blacklist_users(requests: Union[DeleteBlacklistUser, List[Delet
 
 
 @black_user.post('/check-all-black', response_model=GeneralResponse, response_model_exclude_unset=True)
-@cache(expire=60)
 async def check_all_category(requests: Union[BlacklistAllCheckParams, List[BlacklistAllCheckParams]]):
     """
     校验目标值所属的所有的类型的黑名单
@@ -491,66 +541,61 @@ async def check_all_category(requests: Union[BlacklistAllCheckParams, List[Black
                 code=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+        # 查询全部目标存在的黑名单分类（按目标缓存，未命中的目标一次批量查询）
+        # 按规范写法查询，响应中原样返回请求的 target_value
+        targets = [(item.target_id, canonical_value(item.target_id, item.target_value)) for item in request_list]
+        query_error = None
+        try:
+            target_entries = await cached_lookup("user", "entries", targets, fetch_target_entries, target_tags)
+        except DBConnectionError:
+            target_entries, query_error = {}, "Database connection error"
+        except Exception:
+            target_entries, query_error = {}, "Query failed"
+
         # 构建结果列表
         response_data = []
 
-        for request_item in request_list:
-            target_value = str(request_item.target_value)
-            target_id = request_item.target_id
-
-            try:
-                # 查询该目标值存在的所有黑名单分类
-                existing_entries = await BlacklistUser.filter(
-                    target_id=target_id,
-                    target_value=target_value
-                ).values_list("category_id","brand_id")
-
-                # 构建 {category_id: [brand_ids]} 的映射
-                existing_category_ids = set()
-                category_brands_map = {}
-                for cat_id, brand_id in existing_entries:
-                    existing_category_ids.add(cat_id)
-                    if cat_id not in category_brands_map:
-                        category_brands_map[cat_id] = []
-                    if brand_id:  # 确保brand_id不为空
-                        category_brands_map[cat_id].append(brand_id)
-
-
-                # 构建该目标值的检查结果
-                category_results = []
-                for category in all_categories:
-                    category_results.append({
-                        "category_id": category["id"],
-                        "entry_name": category["entry_name"],
-                        "classification":category["classification"],
-                        "black_flag": category["id"] in existing_category_ids,
-                        "black_brand": category_brands_map.get(category["id"], [])  # 新增品牌列表
-                    })
-
-                # 添加到响应数据中
+        for item, (target_id, target_value) in zip(request_list, targets):
+            if query_error:
+                # 查询失败不中断整个流程，逐个目标返回错误
                 response_data.append({
                     "target_id": target_id,
-                    "target_value": target_value,
-                    "result": category_results
-                })
-
-            except DBConnectionError:
-                # 对于单个目标值查询失败，不中断整个流程，返回部分结果
-                response_data.append({
-                    "target_id": target_id,
-                    "target_value": target_value,
+                    "target_value": item.target_value,
                     "result": [],
-                    "error": "Database connection error"
+                    "error": query_error
                 })
                 continue
-            except Exception:
-                response_data.append({
-                    "target_id": target_id,
-                    "target_value": target_value,
-                    "result": [],
-                    "error": "Query failed"
+
+            existing_entries = target_entries[(target_id, target_value)]
+
+            # 构建 {category_id: [brand_ids]} 的映射
+            existing_category_ids = set()
+            category_brands_map = {}
+            for cat_id, brand_id in existing_entries:
+                existing_category_ids.add(cat_id)
+                if cat_id not in category_brands_map:
+                    category_brands_map[cat_id] = []
+                if brand_id:  # 确保brand_id不为空
+                    category_brands_map[cat_id].append(brand_id)
+
+
+            # 构建该目标值的检查结果
+            category_results = []
+            for category in all_categories:
+                category_results.append({
+                    "category_id": category["id"],
+                    "entry_name": category["entry_name"],
+                    "classification":category["classification"],
+                    "black_flag": category["id"] in existing_category_ids,
+                    "black_brand": category_brands_map.get(category["id"], [])  # 新增品牌列表
                 })
-                continue
+
+            # 添加到响应数据中
+            response_data.append({
+                "target_id": target_id,
+                "target_value": item.target_value,
+                "result": category_results
+            })
 
         return success_response(data=response_data)
 
@@ -567,7 +612,6 @@ async def check_all_category(requests: Union[BlacklistAllCheckParams, List[Black
 
 
 @black_user.post('/return-blacklist-value', response_model=GeneralResponse, response_model_exclude_unset=True)
-@cache(expire=60)
 async def check_value_blacklist(request:BlacklistQuickCheck):
     """
     快速校验那些值在指定的黑名单中，并返回存在于校验类型黑名单中的值
@@ -601,14 +645,15 @@ async def check_value_blacklist(request:BlacklistQuickCheck):
             )
 
 
-        request.target_value = [str(request.target_value)] if not isinstance(request.target_value, list) else [str(v) for v in request.target_value]
+        # 按规范写法查询，返回命中的请求原值
+        values = {str(v): canonical_value(request.target_id, v) for v in (
+            request.target_value if isinstance(request.target_value, list) else [request.target_value])}
 
-        matched_records = await BlacklistUser.filter(
-            target_id=request.target_id,
-            brand_id=request.brand_id,
-            category_id=request.category_id,
-            target_value__in=request.target_value
-        ).values_list('target_value', flat=True)
+        # 与 bulk-check-optimized 共用单条结果缓存
+        keys = {value: (request.target_id, canonical, request.brand_id, request.category_id)
+                for value, canonical in values.items()}
+        memberships = await lookup_memberships(list(dict.fromkeys(keys.values())))
+        matched_records = [value for value, key in keys.items() if memberships[key]]
 
         return success_response(message=f"Found {len(matched_records)} items matching the blacklist",data=matched_records)
 
@@ -664,20 +709,25 @@ async def query_black_brands(request:BlacklistBlackBrand):
                 code=status.HTTP_400_BAD_REQUEST
             )
 
-        request.target_value = [str(request.target_value)] if not isinstance(request.target_value, list) else [str(v) for v in request.target_value]
+        # 按规范写法查询，响应中原样返回请求的 target_value
+        values = [(str(v), canonical_value(request.target_id, v)) for v in (
+            request.target_value if isinstance(request.target_value, list) else [request.target_value])]
 
         # 获取同IM类别下的所有category_id
         category_ids = await BlacklistCategory.filter(
             classification=2
         ).values_list('id', flat=True)
 
-        existing_entries = await BlacklistUser.filter(
+        canonicals = list(dict.fromkeys(canonical for _, canonical in values))
+        existing_entries = [(canonical_value(request.target_id, target_value), brand_id)
+                            for target_value, brand_id in await BlacklistUser.filter(
             target_id=request.target_id,
-            target_value__in=request.target_value,
+            target_hash__in=target_hashes(request.target_id, canonicals),
+            target_key__in=target_keys(request.target_id, canonicals),
             category_id__in=category_ids  # 外键的classification属于IM类别
         ).exclude(
             brand_id=0
-        ).values_list('target_value','brand_id')
+        ).values_list('target_value','brand_id')]
 
 
         # 构建 {category_id: [brand_ids]} 的映射
@@ -693,9 +743,9 @@ async def query_black_brands(request:BlacklistBlackBrand):
         black_brand_result = [
             {
                 "target_value": val,
-                "black_brand": category_brands_map.get(val,[])
+                "black_brand": category_brands_map.get(canonical,[])
             }
-            for val in request.target_value
+            for val, canonical in values
         ]
 
         return success_response(data=black_brand_result)
@@ -0,0 +1,65 @@
+"""
+基准脚本公共工具：测试数据写入、数据库返回行数统计、分位数计算
+"""
+from contextlib import contextmanager
+from typing import List, Sequence, Tuple
+
+from BlackListProjectPlusUp.models import BlacklistCategory, BlacklistUser
+
+
+async def seed_categories(count: int) -> List[int]:
+    """写入 count 个分类（classification 轮流取 0-5），返回分类ID"""
+    categories = [
+        await BlacklistCategory.create(classification=i % 6, cls_name='bench', entry_name=f'bench-{i}',
+                                       entry_name_en=f'bench-{i}')
+        for i in range(count)
+    ]
+    return [c.id for c in categories]
+
+
+async def seed_users(rows: Sequence[Tuple[int, str, int, int]], batch_size: int = 2000):
+    """批量写入 (target_id, target_value, brand_id, category_id)"""
+    objs = [BlacklistUser(target_id=t, target_value=v, brand_id=b, category_id=c) for t, v, b, c in rows]
+    await BlacklistUser.bulk_create(objs, batch_size=batch_size)
+
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class RowCounter:
+    """统计数据库连接返回的行数（即实际传输的行数）"""
+
+    def __init__(self):
+        self.rows = 0
+        self.queries = 0
+
+    def reset(self):
+        self.rows = 0
+        self.queries = 0
+
+    @contextmanager
+    def attach(self, db):
+        original_query, original_dict = db.execute_query, db.execute_query_dict
+
+        async def execute_query(query, values=None):
+            result = await original_query(query, values)
+            self.queries += 1
+            self.rows += len(result[1])
+            return result
+
+        async def execute_query_dict(query, values=None):
+            result = await original_dict(query, values)
+            self.queries += 1
+            self.rows += len(result)
+            return result
+
+        db.execute_query, db.execute_query_dict = execute_query, execute_query_dict
+        try:
+            yield self
+        finally:
+            db.execute_query, db.execute_query_dict = original_query, original_dict
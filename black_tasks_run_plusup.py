@@ -9,14 +9,22 @@ from fastapi_cache.backends.redis import RedisBackend
 from starlette.responses import RedirectResponse
 from tortoise.contrib.fastapi import register_tortoise
 import redis.asyncio as redis
-from BlackListProjectPlusUp import black_category, black_user, black_exclusion
+
+# 先加载环境变量，模块级单例（分类注册表、日志写入器）在导入时读取配置
+load_dotenv('.env')
+
+from BlackListProjectPlusUp import black_category, black_user, black_exclusion, black_changes, black_jobs
 from BlackListProjectPlusUp.middle import log_requests_middleware
+from BlackListProjectPlusUp.bloom import negative_filter
+from BlackListProjectPlusUp.membership import membership_index, effective_blacklist
+from BlackListProjectPlusUp.logsink import request_log_sink
+from BlackListProjectPlusUp.jobs import job_runner
+from BlackListProjectPlusUp.replicas import replica_pool
 
-from connections import TORTOISE_ORM3
+from connections import TORTOISE_ORM3, PRIMARY_CONNECTION, REPLICA_CONNECTIONS
 from fastapi_cache import FastAPICache
 from fastapi_cache.backends.inmemory import InMemoryBackend
-
-load_dotenv('.env')
+from utils.CacheBackend import create_cache_backend
 
 from utils.LogsColor import setup_logger
 # 接管日志
@@ -63,12 +71,18 @@ target_id: 1-uid, 2-设备，3-IP，4-电话，5-邮箱
 # 添加中间件
 app.middleware("http")(log_requests_middleware)
 
-# @app.on_event("startup")
-# async def startup():
-#     # 初始化缓存：开发阶段使用内存缓存，生产建议用 Redis
-#     # FastAPICache.init(InMemoryBackend(), prefix="blacklist")
-#     r = redis.from_url("redis://localhost", encoding="utf8", decode_responses=True)
-#     FastAPICache.init(RedisBackend(r), prefix="blacklist-cache")
+@app.on_event("startup")
+async def init_cache():
+    """ 初始化两级缓存：进程内 LRU + Redis（未配置 CACHE_REDIS_URL 时为内存缓存） """
+    if os.getenv("ENABLE_CACHE", "true").lower() == "true":
+        FastAPICache.init(await create_cache_backend(), prefix="blacklist-cache")
+
+
+@app.on_event("shutdown")
+async def close_cache():
+    """ 停止缓存失效订阅 """
+    if FastAPICache._backend is not None:
+        await FastAPICache.get_backend().stop()
 
 
 register_tortoise(
@@ -78,9 +92,64 @@ register_tortoise(
         # add_exception_handlers=True,  # 生产环境不要开
 )
 
+
+@app.on_event("startup")
+async def load_membership_index():
+    """ 加载进程内黑名单成员索引，校验类接口在索引就绪后不再访问数据库（索引只在本进程内同步，仅限单 worker 部署） """
+    if os.getenv("ENABLE_MEMBERSHIP_INDEX", "false").lower() == "true":
+        await membership_index.load()
+        if os.getenv("ENABLE_EFFECTIVE_INDEX", "false").lower() == "true":
+            # 在成员索引之上叠加白名单级别，供 /blacklist/user/effective 点查
+            await effective_blacklist.load()
+
+
+@app.on_event("startup")
+async def load_negative_filter():
+    """ 加载按分组划分的布隆过滤器，校验类接口对一定不在黑名单中的值不再访问数据库/缓存 """
+    if os.getenv("ENABLE_NEGATIVE_FILTER", "false").lower() == "true":
+        await negative_filter.load()
+
+
+@app.on_event("startup")
+async def start_request_log_sink():
+    """ 启动请求日志异步写入器 """
+    request_log_sink.start()
+
+
+@app.on_event("shutdown")
+async def stop_request_log_sink():
+    """ 关闭前写完队列中的请求日志（在数据库连接关闭之前执行） """
+    await request_log_sink.stop()
+
+
+@app.on_event("startup")
+async def start_job_runner():
+    """ 启动后台任务执行器，并继续上次未完成的任务 """
+    await job_runner.resume()
+
+
+@app.on_event("shutdown")
+async def stop_job_runner():
+    """ 在当前块提交后停止后台任务，执行中的任务下次启动继续 """
+    await job_runner.stop()
+
+
+@app.on_event("startup")
+async def start_replica_pool():
+    """ 检查只读副本延迟并开始路由只读接口（未配置 DB_REPLICA_HOSTS 时全部走主库） """
+    await replica_pool.start(PRIMARY_CONNECTION, REPLICA_CONNECTIONS)
+
+
+@app.on_event("shutdown")
+async def stop_replica_pool():
+    """ 停止副本延迟检查 """
+    await replica_pool.stop()
+
 app.include_router(black_category, prefix='/blacklist/category', tags=['黑名单种类'])
 app.include_router(black_user, prefix='/blacklist/user', tags=['黑名单用户'])
 app.include_router(black_exclusion, prefix='/blacklist/exclusion', tags=['白名单用户'])
+app.include_router(black_changes, prefix='/blacklist/changes', tags=['变更日志'])
+app.include_router(black_jobs, prefix='/blacklist/jobs', tags=['后台任务'])
 
 if __name__ == '__main__':
     uvicorn.run('black_tasks_run_plusup:app', host='0.0.0.0', port=8000, reload=True, workers=1)
@@ -1,3 +1,3 @@
 from .mysql_config import TORTOISE_ORM
 from .mysql_config2 import TORTOISE_ORM2
-from .mysql_config3 import TORTOISE_ORM3
\ No newline at end of file
+from .mysql_config3 import TORTOISE_ORM3, PRIMARY_CONNECTION, REPLICA_CONNECTIONS
\ No newline at end of file
@@ -1,29 +1,62 @@
-TORTOISE_ORM3 = {
-    'connections': {
-        'BlackListProject3': {
-            # 'engine': 'tortoise.backends.asyncpg',  PostgreSQL
-            'engine': 'tortoise.backends.mysql',  # MySQL or Mariadb
-            'credentials': {
-                'host': '192.168.10.3',
-                'port': '3307',
-                'user': 'root',
-                'password': '123456',
-                'database': 'test_all',
-                'minsize': 1,
-                'maxsize': 5,
-                'charset': 'utf8mb4',
-                "echo": True
-            }
-        },
+import os
+
+from dotenv import load_dotenv
+
+# aerich 等命令行工具直接导入本配置，需自行加载 .env（已存在的环境变量优先）
+load_dotenv('.env')
+
+PRIMARY_CONNECTION = 'BlackListProject3'
+
+
+def _credentials(host: str, port: str, user: str, password: str) -> dict:
+    return {
+        'host': host,
+        'port': port,
+        'user': user,
+        'password': password,
+        'database': os.getenv('DB_NAME', 'test_all'),
+        'minsize': 1,
+        'maxsize': int(os.getenv('DB_POOL_MAXSIZE', '5')),
+        'charset': 'utf8mb4',
+        "echo": os.getenv('DB_ECHO', 'true').lower() == 'true'
+    }
+
+
+_connections = {
+    PRIMARY_CONNECTION: {
+        # 'engine': 'tortoise.backends.asyncpg',  PostgreSQL
+        'engine': 'tortoise.backends.mysql',  # MySQL or Mariadb
+        'credentials': _credentials(os.getenv('DB_HOST', '127.0.0.1'), os.getenv('DB_PORT', '3307'),
+                                    os.getenv('DB_USER', 'root'), os.getenv('DB_PASSWORD', '')),
     },
+}
+
+# 只读副本：DB_REPLICA_HOSTS 为逗号分隔的 host:port，账号默认与主库相同
+REPLICA_CONNECTIONS = []
+for i, address in enumerate(h.strip() for h in os.getenv('DB_REPLICA_HOSTS', '').split(',') if h.strip()):
+    host, _, port = address.partition(':')
+    name = f'{PRIMARY_CONNECTION}_replica_{i + 1}'
+    _connections[name] = {
+        'engine': 'tortoise.backends.mysql',
+        'credentials': _credentials(host, port or os.getenv('DB_PORT', '3307'),
+                                    os.getenv('DB_REPLICA_USER') or os.getenv('DB_USER', 'root'),
+                                    os.getenv('DB_REPLICA_PASSWORD') or os.getenv('DB_PASSWORD', '')),
+    }
+    REPLICA_CONNECTIONS.append(name)
+
+TORTOISE_ORM3 = {
+    'connections': _connections,
     'apps': {
         'models': {
             'models': ['BlackListProjectPlusUp.models', "aerich.models"],
-            'default_connection': 'BlackListProject3',
+            'default_connection': PRIMARY_CONNECTION,
 
         }
     },
     'use_tz': False,
     'timezone': 'Asia/Shanghai',
     "log_level": None,  # 禁用日志
-}
\ No newline at end of file
+}
+if REPLICA_CONNECTIONS:
+    # 只读接口的查询按请求路由到副本，见 BlackListProjectPlusUp.replicas
+    TORTOISE_ORM3['routers'] = ['BlackListProjectPlusUp.replicas.ReplicaRouter']
@@ -0,0 +1,101 @@
+"""
+回填 target_key，并按 target_key 重新计算 target_hash
+
+规范化规则（IP、E.164 电话等）无法用 SQL 表达，下面冻结了编写本迁移时 BlackListProjectPlusUp/keys.py 的算法
+（不导入应用代码，之后修改 keys.py 不会改变本迁移的结果）。电话号码按 PHONE_DEFAULT_COUNTRY_CODE=86 补全国家码；
+若运行环境配置了不同的值，应用写入/查询的键会与回填结果不一致，此时迁移直接报错。
+按主键顺序分段读取、批量 UPDATE，每段只锁定 BACKFILL_CHUNK 行；以非事务方式执行迁移时（aerich upgrade 关闭事务）
+每段单独提交。按 id 递增遍历直到没有更多记录，分段期间新写入的记录同样会被处理。
+历史记录的 target_value 保持原写法，回填后按规范写法查询即可命中。
+"""
+import hashlib
+import ipaddress
+import os
+import re
+
+from tortoise import BaseDBAsyncClient
+
+BACKFILL_CHUNK = 10000
+TABLES = ("blacklist_users_aggregate", "blacklist_users_exclusion")
+PHONE_DEFAULT_COUNTRY_CODE = "86"
+
+_DIGITS = re.compile(r'\d+')
+_PHONE_SEPARATORS = re.compile(r'[\s\-().]')
+
+
+def _uid(value):
+    if _DIGITS.fullmatch(value) and int(value) < 1 << 63:
+        return int(value)
+    return None
+
+
+def _ip(value):
+    try:
+        address = ipaddress.ip_address(value)
+    except ValueError:
+        return None
+    if address.version == 6 and address.ipv4_mapped is not None:
+        return address.ipv4_mapped
+    return address
+
+
+def _phone(value):
+    value = _PHONE_SEPARATORS.sub('', value)
+    if value.startswith('+'):
+        digits = value[1:]
+    elif value.startswith('00'):
+        digits = value[2:]
+    else:
+        digits = PHONE_DEFAULT_COUNTRY_CODE + (value[1:] if value.startswith('0') else value)
+    if _DIGITS.fullmatch(digits) and len(digits) <= 15 and not digits.startswith('0'):
+        return int(digits)
+    return None
+
+
+def _target_key(target_id, target_value):
+    value = str(target_value).strip()
+    if target_id == 1 and _uid(value) is not None:
+        return b'\x01' + _uid(value).to_bytes(8, 'big')
+    if target_id == 3 and _ip(value) is not None:
+        return b'\x01' + _ip(value).packed
+    if target_id == 4 and _phone(value) is not None:
+        return b'\x01' + _phone(value).to_bytes(8, 'big')
+    if target_id == 5:
+        value = value.lower()
+    return b'\x00' + value.encode('utf-8')
+
+
+def _key_hash(target_id, key):
+    digest = hashlib.sha256(f"{target_id}:".encode('utf-8') + key).digest()
+    return int.from_bytes(digest[:8], 'big') >> 1
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    configured = os.getenv("PHONE_DEFAULT_COUNTRY_CODE", PHONE_DEFAULT_COUNTRY_CODE)
+    if configured != PHONE_DEFAULT_COUNTRY_CODE:
+        raise RuntimeError(f"PHONE_DEFAULT_COUNTRY_CODE={configured} differs from {PHONE_DEFAULT_COUNTRY_CODE} "
+                           f"used by this backfill; write a new migration for the new country code")
+    for table in TABLES:
+        last_id = 0
+        while True:
+            rows = await db.execute_query_dict(
+                f"SELECT `id`, `target_id`, `target_value` FROM `{table}` WHERE `id` > {last_id} "
+                f"ORDER BY `id` LIMIT {BACKFILL_CHUNK}")
+            if not rows:
+                break
+            values = []
+            for row in rows:
+                key = _target_key(row['target_id'], row['target_value'])
+                values.append([key, _key_hash(row['target_id'], key), row['id']])
+            await db.execute_many(f"UPDATE `{table}` SET `target_key` = %s, `target_hash` = %s WHERE `id` = %s",
+                                  values)
+            last_id = rows[-1]['id']
+    return ""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    # 恢复为 8_..._backfill_target_hash 的 target_id+target_value 哈希
+    return "\n".join(
+        f"        UPDATE `{table}` SET `target_key` = NULL, `target_hash` = "
+        f"CAST(CONV(LEFT(SHA2(CONCAT(`target_id`, ':', `target_value`), 256), 16), 16, 10) AS UNSIGNED) >> 1;"
+        for table in TABLES)
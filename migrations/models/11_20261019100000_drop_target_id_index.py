@@ -0,0 +1,19 @@
+"""
+删除 target_id 单列索引
+
+target_id 只有少数几个取值，按目标查找时该索引几乎不过滤任何行，却会被优化器选中而放弃
+(target_hash, ...) 联合索引；只按 target_id 过滤的查询仍可使用唯一键 (target_id, target_value, ...) 的最左前缀。
+"""
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `blacklist_users_aggregate` DROP INDEX `idx_blacklist_u_target__970aab`;
+        ALTER TABLE `blacklist_users_exclusion` DROP INDEX `idx_blacklist_u_target__5e72c1`;"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `blacklist_users_aggregate` ADD INDEX `idx_blacklist_u_target__970aab` (`target_id`);
+        ALTER TABLE `blacklist_users_exclusion` ADD INDEX `idx_blacklist_u_target__5e72c1` (`target_id`);"""
@@ -0,0 +1,22 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS `blacklist_change_journal` (
+    `id` BIGINT NOT NULL PRIMARY KEY AUTO_INCREMENT COMMENT '变更序号，单调递增',
+    `entity` VARCHAR(16) NOT NULL COMMENT '变更对象：user-黑名单，exclusion-白名单，category-分类（级联删除其下全部黑/白名单）',
+    `op` VARCHAR(8) NOT NULL COMMENT '操作：insert/update/delete',
+    `target_id` INT COMMENT '字段类型：1-uid,2-设备,3-IP',
+    `target_value` VARCHAR(500) COMMENT '字段值',
+    `brand_id` INT COMMENT '品牌id（仅黑名单）',
+    `category_id` INT NOT NULL COMMENT '黑名单类别ID（不设外键，分类删除后日志保留）',
+    `level` INT COMMENT '白名单级别（仅白名单）',
+    `modify_user` INT NOT NULL COMMENT '操作者id' DEFAULT 0,
+    `create_time` DATETIME(6) NOT NULL COMMENT '变更时间' DEFAULT CURRENT_TIMESTAMP(6)
+) CHARACTER SET utf8mb4 COMMENT='黑名单/白名单变更日志';"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS `blacklist_change_journal`;"""
@@ -0,0 +1,26 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS `blacklist_jobs` (
+    `id` INT NOT NULL PRIMARY KEY AUTO_INCREMENT COMMENT '任务ID',
+    `kind` VARCHAR(32) NOT NULL COMMENT '任务类型：exclusion_cleanup-白名单级联清理，category_delete-删除分类',
+    `status` VARCHAR(16) NOT NULL COMMENT '状态：pending-排队中，running-执行中，succeeded-成功，failed-失败' DEFAULT 'pending',
+    `params` JSON NOT NULL COMMENT '任务参数',
+    `total` BIGINT COMMENT '开始执行时统计的待处理行数',
+    `processed` BIGINT NOT NULL COMMENT '已处理（删除）的行数' DEFAULT 0,
+    `chunks` INT NOT NULL COMMENT '已提交的块数' DEFAULT 0,
+    `error` LONGTEXT COMMENT '失败原因',
+    `modify_user` INT NOT NULL COMMENT '操作者id' DEFAULT 0,
+    `create_time` DATETIME(6) NOT NULL COMMENT '创建时间' DEFAULT CURRENT_TIMESTAMP(6),
+    `start_time` DATETIME(6) COMMENT '开始执行时间',
+    `finish_time` DATETIME(6) COMMENT '结束时间',
+    `update_time` DATETIME(6) NOT NULL COMMENT '最近一次进度更新时间' DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    KEY `idx_blacklist_j_status_5c3f0e` (`status`)
+) CHARACTER SET utf8mb4 COMMENT='后台任务';"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS `blacklist_jobs`;"""
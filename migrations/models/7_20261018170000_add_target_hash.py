@@ -0,0 +1,17 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `blacklist_users_aggregate` ADD `target_hash` BIGINT COMMENT '定长查找键：target_id+target_value 的63位哈希';
+        ALTER TABLE `blacklist_users_aggregate` ADD INDEX `idx_blacklist_u_target__f05b1a` (`target_hash`, `category_id`, `brand_id`);
+        ALTER TABLE `blacklist_users_exclusion` ADD `target_hash` BIGINT COMMENT '定长查找键：target_id+target_value 的63位哈希';
+        ALTER TABLE `blacklist_users_exclusion` ADD INDEX `idx_blacklist_u_target__ea247b` (`target_hash`, `category_id`);"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `blacklist_users_exclusion` DROP INDEX `idx_blacklist_u_target__ea247b`;
+        ALTER TABLE `blacklist_users_exclusion` DROP COLUMN `target_hash`;
+        ALTER TABLE `blacklist_users_aggregate` DROP INDEX `idx_blacklist_u_target__f05b1a`;
+        ALTER TABLE `blacklist_users_aggregate` DROP COLUMN `target_hash`;"""
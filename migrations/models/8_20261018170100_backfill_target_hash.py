@@ -0,0 +1,33 @@
+"""
+回填 target_hash（与 BlackListProjectPlusUp/keys.py 中 target_hash() 的算法一致）
+
+按主键分段 UPDATE，每段只锁定 BACKFILL_CHUNK 行；以非事务方式执行迁移时（aerich upgrade 关闭事务）
+每段单独提交。返回的语句补齐分段期间新写入、尚未带 target_hash 的记录，并删除已由哈希索引取代的
+target_value 单列索引（按目标查找均带 target_hash，唯一约束仍由四列唯一键保证）。
+"""
+from tortoise import BaseDBAsyncClient
+
+BACKFILL_CHUNK = 10000
+TABLES = ("blacklist_users_aggregate", "blacklist_users_exclusion")
+HASH_EXPR = "CAST(CONV(LEFT(SHA2(CONCAT(`target_id`, ':', `target_value`), 256), 16), 16, 10) AS UNSIGNED) >> 1"
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    for table in TABLES:
+        rows = await db.execute_query_dict(f"SELECT COALESCE(MAX(`id`), 0) AS `max_id` FROM `{table}`")
+        max_id = int(rows[0]['max_id'])
+        for start in range(0, max_id, BACKFILL_CHUNK):
+            await db.execute_query(
+                f"UPDATE `{table}` SET `target_hash` = {HASH_EXPR} "
+                f"WHERE `id` > {start} AND `id` <= {start + BACKFILL_CHUNK} AND `target_hash` IS NULL")
+    return "\n".join(f"        UPDATE `{table}` SET `target_hash` = {HASH_EXPR} WHERE `target_hash` IS NULL;"
+                     for table in TABLES) + """
+        ALTER TABLE `blacklist_users_aggregate` DROP INDEX `idx_blacklist_u_target__65e207`;
+        ALTER TABLE `blacklist_users_exclusion` DROP INDEX `idx_blacklist_u_target__6d494f`;"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `blacklist_users_aggregate` ADD INDEX `idx_blacklist_u_target__65e207` (`target_value`);
+        ALTER TABLE `blacklist_users_exclusion` ADD INDEX `idx_blacklist_u_target__6d494f` (`target_value`);
+""" + "\n".join(f"        UPDATE `{table}` SET `target_hash` = NULL;" for table in TABLES)
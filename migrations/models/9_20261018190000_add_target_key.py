@@ -0,0 +1,15 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `blacklist_users_aggregate` ADD `target_key` VARBINARY(2001) COMMENT 'target_value 规范化后的紧凑编码（uid/电话8字节，IP 4/16字节，其余为文本）';
+        ALTER TABLE `blacklist_users_aggregate` MODIFY COLUMN `target_hash` BIGINT COMMENT '定长查找键：target_id+target_key 的63位哈希';
+        ALTER TABLE `blacklist_users_exclusion` ADD `target_key` VARBINARY(2001) COMMENT 'target_value 规范化后的紧凑编码（uid/电话8字节，IP 4/16字节，其余为文本）';
+        ALTER TABLE `blacklist_users_exclusion` MODIFY COLUMN `target_hash` BIGINT COMMENT '定长查找键：target_id+target_key 的63位哈希';"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE `blacklist_users_exclusion` DROP COLUMN `target_key`;
+        ALTER TABLE `blacklist_users_aggregate` DROP COLUMN `target_key`;"""
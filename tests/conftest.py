@@ -0,0 +1,60 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+from tortoise import Tortoise
+
+from BlackListProjectPlusUp import black_category, black_changes, black_exclusion, black_jobs, black_user
+from BlackListProjectPlusUp.bloom import negative_filter
+from BlackListProjectPlusUp.counts import count_cache
+from BlackListProjectPlusUp.membership import effective_blacklist, membership_index
+from BlackListProjectPlusUp.registry import category_registry
+
+MODELS = {'models': ['BlackListProjectPlusUp.models']}
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+def reset_process_state():
+    """进程级单例在用例之间互不影响"""
+    membership_index.__init__()
+    effective_blacklist.__init__(membership_index)
+    negative_filter.__init__(negative_filter.error_rate)
+    count_cache._entries.clear()
+    category_registry.invalidate()
+
+
+@pytest.fixture
+async def db():
+    await Tortoise.init(db_url='sqlite://:memory:', modules=MODELS)
+    await Tortoise.generate_schemas()
+    reset_process_state()
+    yield
+    await Tortoise.close_connections()
+    reset_process_state()
+
+
+@pytest.fixture
+def app():
+    app = FastAPI()
+    app.include_router(black_category, prefix='/blacklist/category')
+    app.include_router(black_user, prefix='/blacklist/user')
+    app.include_router(black_exclusion, prefix='/blacklist/exclusion')
+    app.include_router(black_changes, prefix='/blacklist/changes')
+    app.include_router(black_jobs, prefix='/blacklist/jobs')
+    return app
+
+
+@pytest.fixture
+async def client(db, app):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test') as c:
+        yield c
+
+
+async def create_categories(client, *classifications):
+    for i, classification in enumerate(classifications):
+        r = await client.post('/blacklist/category/', json={"classification": classification, "entry_name": f"c{i}",
+                                                            "entry_name_en": f"c{i}", "describe": ""})
+        assert r.json()['code'] == 200, r.json()
@@ -0,0 +1,70 @@
+import contextlib
+
+import pytest
+
+from BlackListProjectPlusUp.membership import ChangeSet, membership_index
+from BlackListProjectPlusUp.models import BlacklistChange, BlacklistUser
+from tests.conftest import create_categories
+
+pytestmark = pytest.mark.anyio
+
+
+async def seed(client):
+    await create_categories(client, 1)
+    await BlacklistUser.bulk_create([BlacklistUser(target_id=1, target_value=v, category_id=1) for v in ('1', '2')])
+    await membership_index.load()
+
+
+async def bulk_delete(client, values):
+    return (await client.request('DELETE', '/blacklist/user/', params={'bulk': True}, json=[
+        {"target_id": 1, "target_value": v, "brand_id": 0, "category_id": 1} for v in values])).json()
+
+
+async def test_bulk_delete_journals_in_transaction_and_publishes_after_commit(client, monkeypatch):
+    from BlackListProjectPlusUp.api import user as user_api
+
+    await seed(client)
+    events = []
+    write_journal, publish, primary_transaction = ChangeSet.write_journal, ChangeSet.publish, user_api.primary_transaction
+
+    async def recording_journal(self):
+        events.append('journal')
+        await write_journal(self)
+
+    def recording_publish(self):
+        events.append('publish')
+        publish(self)
+
+    @contextlib.asynccontextmanager
+    async def recording_transaction():
+        async with primary_transaction():
+            yield
+        events.append('commit')
+
+    monkeypatch.setattr(ChangeSet, 'write_journal', recording_journal)
+    monkeypatch.setattr(ChangeSet, 'publish', recording_publish)
+    monkeypatch.setattr(user_api, 'primary_transaction', recording_transaction)
+
+    body = await bulk_delete(client, ['1', '3'])
+    assert body['data']['success_count'] == 1, body
+    assert body['data']['skipped_count'] == 1
+    assert events == ['journal', 'commit', 'publish']
+    assert await BlacklistChange.all().values_list('op', 'target_value') == [('delete', '1')]
+    assert not membership_index.contains(1, '1', 0, 1)
+    assert membership_index.contains(1, '2', 0, 1)
+
+
+async def test_bulk_delete_failed_chunk_rolls_back_and_publishes_nothing(client, monkeypatch):
+    await seed(client)
+
+    async def failing_journal(self):
+        raise RuntimeError("journal unavailable")
+
+    monkeypatch.setattr(ChangeSet, 'write_journal', failing_journal)
+
+    body = await bulk_delete(client, ['1', '2'])
+    assert body['data']['failed_count'] == 2, body
+    assert body['data']['failed_items'][0]['reason'] == "journal unavailable"
+    assert sorted(await BlacklistUser.all().values_list('target_value', flat=True)) == ['1', '2']
+    assert await BlacklistChange.all().count() == 0
+    assert membership_index.contains(1, '1', 0, 1) and membership_index.contains(1, '2', 0, 1)
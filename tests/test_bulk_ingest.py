@@ -0,0 +1,75 @@
+import pytest
+
+from BlackListProjectPlusUp.models import BlacklistChange, BlacklistUser, BlacklistUserExclusion
+from tests.conftest import create_categories
+
+pytestmark = pytest.mark.anyio
+
+
+def user(value, **extra):
+    return {"target_id": 1, "target_value": value, "brand_id": 0, "category_id": 1, "modify_user": 1, **extra}
+
+
+def miss_existing_once(monkeypatch, module, name):
+    """第一次已存在查询返回空集合，模拟查询之后、插入之前另一请求写入了同一行"""
+    lookup = getattr(module, name)
+    calls = []
+
+    async def racing(keys, *args, **kwargs):
+        calls.append(keys)
+        return set() if len(calls) == 1 else await lookup(keys, *args, **kwargs)
+
+    monkeypatch.setattr(module, name, racing)
+
+
+async def test_bulk_users_skip_existing_and_duplicates(client):
+    await create_categories(client, 1)
+    await BlacklistUser.create(target_id=1, target_value='1', category_id=1)
+
+    body = (await client.post('/blacklist/user/', params={'bulk': True},
+                              json=[user('1'), user('2'), user(' 2'), user('3')])).json()
+    assert body['data']['success_count'] == 2, body
+    assert body['data']['skipped_count'] == 2
+    assert sorted(await BlacklistUser.all().values_list('target_value', flat=True)) == ['1', '2', '3']
+    assert sorted(await BlacklistChange.filter(entity='user').values_list('target_value', flat=True)) == ['2', '3']
+
+
+async def test_bulk_users_count_ignored_conflicts_as_skipped(client, monkeypatch):
+    from BlackListProjectPlusUp.api import user as user_api
+    from BlackListProjectPlusUp.bloom import negative_filter
+
+    await create_categories(client, 1)
+    await BlacklistUser.create(target_id=1, target_value='1', category_id=1)
+    miss_existing_once(monkeypatch, user_api, 'fetch_existing_user_keys')
+    published = []
+    monkeypatch.setattr(negative_filter, 'add', lambda *user: published.append(user))
+
+    body = (await client.post('/blacklist/user/', params={'bulk': True}, json=[user('1'), user('2')])).json()
+    assert body['data']['success_count'] == 1, body
+    assert body['data']['skipped_count'] == 1
+    assert body['data']['skipped_items'][0]['reason'] == "Already in blacklist"
+    assert await BlacklistChange.filter(entity='user').values_list('target_value', flat=True) == ['2']
+    assert published == [(1, '2', 0, 1)]
+
+
+def exclusion(value, **extra):
+    return {"target_id": 1, "target_value": value, "category_id": 1, "level": 3, "modify_user": 1, **extra}
+
+
+async def test_bulk_exclusions_count_ignored_conflicts_as_skipped(client, monkeypatch):
+    from BlackListProjectPlusUp.api import exclusion as exclusion_api
+
+    await create_categories(client, 1)
+    await BlacklistUserExclusion.create(target_id=1, target_value='1', category_id=1)
+    await BlacklistUser.bulk_create([BlacklistUser(target_id=1, target_value=v, category_id=1) for v in ('1', '2')])
+    miss_existing_once(monkeypatch, exclusion_api, 'fetch_by_tuples')
+
+    body = (await client.post('/blacklist/exclusion/', params={'bulk': True},
+                              json=[exclusion('1'), exclusion('2')])).json()
+    assert body['data']['success_count'] == 1, body
+    assert body['data']['skipped_count'] == 1
+    assert body['data']['skipped_items'][0]['target_value'] == '1'
+    assert body['data']['removed_from_blacklist'] == 1
+    assert await BlacklistUser.all().values_list('target_value', flat=True) == ['1']
+    assert sorted(await BlacklistChange.all().values_list('entity', 'op', 'target_value')) == [
+        ('exclusion', 'insert', '2'), ('user', 'delete', '2')]
@@ -0,0 +1,113 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from BlackListProjectPlusUp.models import BlacklistUser, BlacklistUserExclusion
+from tests.conftest import create_categories
+
+pytestmark = pytest.mark.anyio
+
+# 历史记录保留原写法（非规范），target_key 已按规范写法回填
+LEGACY_EMAIL = 'Foo@Example.COM'
+CANONICAL_EMAIL = 'foo@example.com'
+
+
+@pytest.fixture
+async def client(db):
+    """BlackListProjectPlusUpCache 的路由；未初始化 FastAPICache 时接口直接访问数据库"""
+    from BlackListProjectPlusUpCache import black_category, black_exclusion, black_user
+
+    app = FastAPI()
+    app.include_router(black_category, prefix='/blacklist/category')
+    app.include_router(black_user, prefix='/blacklist/user')
+    app.include_router(black_exclusion, prefix='/blacklist/exclusion')
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test') as c:
+        yield c
+
+
+@pytest.mark.parametrize('target_id,stored,requested', [
+    (4, '+8613800138000', '138-0013-8000'),
+    (5, LEGACY_EMAIL, ' FOO@example.com '),
+])
+async def test_query_users_matches_canonical_value(client, target_id, stored, requested):
+    await create_categories(client, 1)
+    await BlacklistUser.create(target_id=target_id, target_value=stored, category_id=1)
+
+    body = (await client.get('/blacklist/user/', params={'target_id': target_id, 'target_value': requested})).json()
+    assert body['code'] == 200, body
+    assert [row['target_value'] for row in body['data']] == [stored]
+
+
+async def test_user_writes_match_legacy_spelling(client):
+    await create_categories(client, 1)
+    await BlacklistUser.create(target_id=5, target_value=LEGACY_EMAIL, category_id=1)
+    user = {"target_id": 5, "target_value": CANONICAL_EMAIL, "brand_id": 0, "category_id": 1, "modify_user": 1}
+
+    body = (await client.post('/blacklist/user/', json=[user])).json()
+    assert body['data']['skipped_items'][0]['reason'] == "Already in blacklist", body
+
+    body = (await client.request('DELETE', '/blacklist/user/', json=user)).json()
+    assert body['data']['success_count'] == 1, body
+    assert not await BlacklistUser.exists()
+
+
+async def test_exclusions_match_legacy_spelling(client):
+    await create_categories(client, 1)
+    await BlacklistUserExclusion.create(target_id=5, target_value=LEGACY_EMAIL, category_id=1, level=3, modify_user=1)
+    user = {"target_id": 5, "target_value": CANONICAL_EMAIL, "brand_id": 0, "category_id": 1, "modify_user": 1}
+
+    body = (await client.post('/blacklist/user/', json=[user])).json()
+    assert body['data']['skipped_items'][0]['reason'].startswith("UID blocked by level=3"), body
+
+    body = (await client.get('/blacklist/exclusion/', params={'target_id': 5, 'target_value': CANONICAL_EMAIL})).json()
+    assert [row['target_value'] for row in body['data']] == [LEGACY_EMAIL]
+
+    exclusion = {"target_id": 5, "target_value": CANONICAL_EMAIL, "category_id": 1}
+    body = (await client.post('/blacklist/exclusion/', json=[dict(exclusion, modify_user=1)])).json()
+    assert body['data']['skipped_count'] == 1, body
+
+    body = (await client.request('DELETE', '/blacklist/exclusion/', json=exclusion)).json()
+    assert body['data']['success_count'] == 1, body
+    assert not await BlacklistUserExclusion.exists()
+
+
+@pytest.mark.parametrize('level', [1, 2, 3])
+async def test_exclusion_level_cleanup_removes_legacy_spelling(client, level):
+    await create_categories(client, 1)
+    await BlacklistUser.create(target_id=5, target_value=LEGACY_EMAIL, category_id=1)
+
+    body = (await client.post('/blacklist/exclusion/', json=[{
+        "target_id": 5, "target_value": CANONICAL_EMAIL, "category_id": 1, "level": level, "modify_user": 1}])).json()
+    assert body['data']['removed_from_blacklist'] == 1, body
+    assert not await BlacklistUser.exists()
+
+
+async def test_black_brands_match_legacy_spelling(client):
+    await create_categories(client, 2)
+    await BlacklistUser.create(target_id=5, target_value=LEGACY_EMAIL, brand_id=9, category_id=1)
+
+    body = (await client.post('/blacklist/user/return-all-black-brand', json={
+        "target_id": 5, "target_value": [' FOO@example.com ', 'bar@example.com']})).json()
+    assert body['data'] == [{"target_value": ' FOO@example.com ', "black_brand": [9]},
+                            {"target_value": 'bar@example.com', "black_brand": []}]
+
+
+async def test_invalidation_tags_use_canonical_value(client, monkeypatch):
+    from BlackListProjectPlusUpCache.api import exclusion as exclusion_api, user as user_api
+
+    await create_categories(client, 1)
+    await BlacklistUser.create(target_id=5, target_value=LEGACY_EMAIL, category_id=1)
+    await BlacklistUserExclusion.create(target_id=5, target_value=LEGACY_EMAIL, category_id=1, modify_user=1)
+    cleared = []
+
+    async def recording_clear(targets=(), **kwargs):
+        cleared.append(set(targets))
+
+    monkeypatch.setattr(user_api, 'clear_user_cache', recording_clear)
+    monkeypatch.setattr(exclusion_api, 'clear_exclusion_cache', recording_clear)
+
+    user_id = await BlacklistUser.first().values_list('id', flat=True)
+    exclusion_id = await BlacklistUserExclusion.first().values_list('id', flat=True)
+    assert (await client.request('DELETE', '/blacklist/user/', json={'id': user_id})).json()['code'] == 200
+    assert (await client.request('DELETE', '/blacklist/exclusion/', json={'id': exclusion_id})).json()['code'] == 200
+    assert cleared == [{(5, CANONICAL_EMAIL)}, {(5, CANONICAL_EMAIL)}]
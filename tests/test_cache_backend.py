@@ -0,0 +1,203 @@
+import asyncio
+import time
+
+import pytest
+
+from utils.CacheBackend import LocalLRUCache, RedisInvalidationBus, TwoTierBackend
+
+pytestmark = pytest.mark.anyio
+
+
+class FakePipeline:
+    """记录命令并在 execute 时按顺序返回结果，与 redis.asyncio 的 Pipeline 一样支持链式调用"""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    def ttl(self, key):
+        self.commands.append(('ttl', key))
+        return self
+
+    def get(self, key):
+        self.commands.append(('get', key))
+        return self
+
+    def set(self, key, value, ex=None):
+        self.commands.append(('set', key, value, ex))
+        return self
+
+    async def execute(self):
+        self.redis.round_trips += 1
+        results = [getattr(self.redis, '_' + name)(*args) for name, *args in self.commands]
+        self.commands = []
+        return results
+
+
+class FakePubSub:
+    def __init__(self, redis):
+        self.redis = redis
+        self.queue = asyncio.Queue()
+
+    async def subscribe(self, channel):
+        self.redis.subscribers.setdefault(channel, []).append(self.queue)
+        await self.queue.put({'type': 'subscribe', 'channel': channel, 'data': 1})
+
+    async def listen(self):
+        while True:
+            yield await self.queue.get()
+
+    async def aclose(self):
+        for queues in self.redis.subscribers.values():
+            if self.queue in queues:
+                queues.remove(self.queue)
+
+
+class FakeRedis:
+    """测试用的内存 Redis 客户端：只实现 TwoTierBackend / RedisInvalidationBus 用到的命令"""
+
+    def __init__(self):
+        self.data = {}
+        self.subscribers = {}
+        self.round_trips = 0
+
+    def _ttl(self, key):
+        if key not in self.data:
+            return -2
+        expires_at = self.data[key][1]
+        return -1 if expires_at is None else max(0, int(expires_at - time.monotonic()))
+
+    def _get(self, key):
+        entry = self.data.get(key)
+        return None if entry is None else entry[0]
+
+    def _set(self, key, value, ex=None):
+        self.data[key] = (value, None if ex is None else time.monotonic() + ex)
+        return True
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def get(self, key):
+        self.round_trips += 1
+        return self._get(key)
+
+    async def set(self, key, value, ex=None):
+        self.round_trips += 1
+        return self._set(key, value, ex)
+
+    async def delete(self, *keys):
+        self.round_trips += 1
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    async def publish(self, channel, message):
+        queues = self.subscribers.get(channel, [])
+        for queue in queues:
+            await queue.put({'type': 'message', 'channel': channel, 'data': message})
+        return len(queues)
+
+    def pubsub(self):
+        return FakePubSub(self)
+
+
+class FakeRedisBackend:
+    """与 fastapi_cache 的 RedisBackend 一致：get_with_ttl 一次 pipeline 取 TTL 与值"""
+
+    def __init__(self, redis):
+        self.redis = redis
+
+    async def get_with_ttl(self, key):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            return await pipe.ttl(key).get(key).execute()
+
+    async def set(self, key, value, expire=None):
+        await self.redis.set(key, value, ex=expire)
+
+
+def backend(redis, channel=None, local_ttl=10):
+    bus = RedisInvalidationBus(redis, channel) if channel else None
+    return TwoTierBackend(FakeRedisBackend(redis), LocalLRUCache(), local_ttl=local_ttl, bus=bus)
+
+
+async def wait_until(condition, timeout=1.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        await asyncio.sleep(0.01)
+
+
+async def test_get_many_fetches_misses_in_one_pipeline():
+    redis = FakeRedis()
+    redis._set('a', b'1', ex=100)
+    redis._set('c', b'3', ex=5)
+    cache = backend(redis)
+    cache.local.set('b', b'2', 10)
+
+    assert await cache.get_many(['a', 'b', 'c', 'd']) == [b'1', b'2', b'3', None]
+    assert redis.round_trips == 1
+
+    # 命中的值按 min(二级剩余 TTL, local_ttl) 回填一级缓存，不存在的键不回填
+    remaining, value = cache.local.get('a')
+    assert value == b'1' and 9 < remaining <= 10
+    remaining, value = cache.local.get('c')
+    assert value == b'3' and remaining <= 5
+    assert cache.local.get('d') is None
+
+    assert await cache.get_many(['a', 'b', 'c']) == [b'1', b'2', b'3']
+    assert redis.round_trips == 1
+
+
+async def test_set_many_writes_in_one_pipeline():
+    redis = FakeRedis()
+    cache = backend(redis)
+
+    await cache.set_many({'a': b'1', 'b': b'2'}, expire=3)
+    assert redis.round_trips == 1
+    assert redis._get('a') == b'1' and redis._ttl('b') in (2, 3)
+    assert cache.local.get('a')[1] == b'1'
+    assert cache.local.get('b')[0] <= 3
+
+
+async def test_invalidation_reaches_other_instances():
+    redis = FakeRedis()
+    first, second = backend(redis, 'invalidate'), backend(redis, 'invalidate')
+    await first.start()
+    await second.start()
+    try:
+        await wait_until(lambda: len(redis.subscribers.get('invalidate', [])) == 2)
+        await first.set_many({'user:a': b'1', 'user:b': b'2', 'other:c': b'3'})
+        assert await second.get_many(['user:a', 'user:b', 'other:c']) == [b'1', b'2', b'3']
+
+        await first.delete_many(['user:a'])
+        await wait_until(lambda: second.local.get('user:a') is None)
+        assert second.local.get('user:b')[1] == b'2'
+
+        second._on_invalidation({'origin': 'elsewhere', 'prefix': 'user:'})
+        assert second.local.get('user:b') is None
+        assert second.local.get('other:c')[1] == b'3'
+    finally:
+        await first.stop()
+        await second.stop()
+    assert redis.subscribers['invalidate'] == []
+
+
+async def test_invalidation_ignores_own_messages():
+    redis = FakeRedis()
+    cache = backend(redis, 'invalidate')
+    await cache.start()
+    try:
+        await wait_until(lambda: redis.subscribers.get('invalidate'))
+        cache.local.set('a', b'1', 10)
+        await redis.publish('invalidate', '{"origin": "%s", "keys": ["a"]}' % cache.instance_id)
+        await redis.publish('invalidate', '{"origin": "elsewhere", "keys": ["b"]}')
+        await wait_until(lambda: redis.subscribers['invalidate'][0].empty())
+        await asyncio.sleep(0.01)
+        assert cache.local.get('a')[1] == b'1'
+    finally:
+        await cache.stop()
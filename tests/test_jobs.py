@@ -0,0 +1,119 @@
+import asyncio
+import time
+
+import pytest
+
+from BlackListProjectPlusUp.jobs import JobRunner, job_runner
+from BlackListProjectPlusUp.membership import ChangeSet
+from BlackListProjectPlusUp.models import BlacklistCategory, BlacklistChange, BlacklistJob, BlacklistUser, \
+    BlacklistUserExclusion
+
+pytestmark = pytest.mark.anyio
+
+
+async def seed(count):
+    await BlacklistCategory.create(classification=1, cls_name='c', entry_name='c')
+    await BlacklistUser.bulk_create([BlacklistUser(target_id=1, target_value=str(v), category_id=1)
+                                     for v in range(count)])
+
+
+async def wait_for_job(job_id, condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        job = await BlacklistJob.get(id=job_id)
+        if condition(job):
+            return job
+        assert time.monotonic() < deadline, f"job stuck: {job.status} {job.processed}"
+        await asyncio.sleep(0.01)
+
+
+async def test_stop_at_chunk_boundary_and_resume(db):
+    await seed(5)
+    runner = JobRunner(chunk_size=2, chunk_interval_ms=200)
+    job = await runner.submit('category_delete', {'category_id': 1}, modify_user=7)
+    await wait_for_job(job.id, lambda j: j.chunks >= 1)
+    await runner.stop()
+
+    job = await BlacklistJob.get(id=job.id)
+    assert job.status == 'pending'
+    assert job.processed == job.chunks * 2 and job.processed < 5
+    assert await BlacklistUser.all().count() == 5 - job.processed
+    assert await BlacklistChange.filter(entity='user').count() == job.processed
+
+    runner = JobRunner(chunk_size=2, chunk_interval_ms=0)
+    await runner.resume()
+    job = await wait_for_job(job.id, lambda j: j.status != 'pending' and j.status != 'running')
+    await runner.stop()
+    assert (job.status, job.processed, job.total) == ('succeeded', 5, 5)
+    assert await BlacklistUser.all().count() == 0
+    assert not await BlacklistCategory.exists(id=1)
+    assert await BlacklistChange.filter(entity='user').count() == 5
+
+
+async def test_resume_requeues_interrupted_jobs(db):
+    await seed(3)
+    job = await BlacklistJob.create(kind='category_delete', params={'category_id': 1}, status='running')
+
+    runner = JobRunner(chunk_size=2, chunk_interval_ms=0)
+    await runner.resume()
+    job = await wait_for_job(job.id, lambda j: j.status == 'succeeded')
+    await runner.stop()
+    assert job.processed == 3 and job.chunks == 2
+
+
+async def test_claim_runs_each_job_once(db):
+    await seed(4)
+    job = await BlacklistJob.create(kind='category_delete', params={'category_id': 1})
+    runners = [JobRunner(chunk_size=2, chunk_interval_ms=0) for _ in range(2)]
+
+    await asyncio.gather(*(runner._execute(job.id) for runner in runners))
+    job = await BlacklistJob.get(id=job.id)
+    assert (job.status, job.processed, job.chunks) == ('succeeded', 4, 2)
+    assert await BlacklistChange.filter(entity='user').count() == 4
+
+    # 已结束的任务再次出队时直接跳过
+    await runners[0]._execute(job.id)
+    assert (await BlacklistJob.get(id=job.id)).chunks == 2
+
+
+def exclusion(value, level=1):
+    return {"target_id": 1, "target_value": value, "category_id": 1, "level": level, "modify_user": 3}
+
+
+@pytest.mark.parametrize('bulk', [False, True])
+async def test_cleanup_job_commits_with_exclusions(client, monkeypatch, bulk):
+    await seed(3)
+    enqueued = []
+    # 只记录不排队：模拟提交后、排队前进程退出
+    monkeypatch.setattr(job_runner, 'enqueue', enqueued.append)
+
+    body = (await client.post('/blacklist/exclusion/', params={'background': True, 'bulk': bulk, 'chunk_size': 1},
+                              json=[exclusion('0'), exclusion('1'), exclusion('2', level=3)])).json()
+    assert body['code'] == 202, body
+    job = await BlacklistJob.get()
+    assert enqueued == [job.id] == [body['data']['job_id']]
+    assert (job.status, job.modify_user) == ('pending', 3)
+    assert job.params['targets'] == [[1, '0', 1, 1, 3], [1, '1', 1, 1, 3]]
+
+    runner = JobRunner(chunk_size=2, chunk_interval_ms=0)
+    await runner.resume()
+    await wait_for_job(job.id, lambda j: j.status == 'succeeded')
+    await runner.stop()
+    assert await BlacklistUser.all().count() == 0
+
+
+async def test_failed_exclusion_write_registers_no_job(client, monkeypatch):
+    await seed(1)
+    enqueued = []
+    monkeypatch.setattr(job_runner, 'enqueue', enqueued.append)
+
+    async def failing_journal(self):
+        raise RuntimeError("journal unavailable")
+
+    monkeypatch.setattr(ChangeSet, 'write_journal', failing_journal)
+
+    body = (await client.post('/blacklist/exclusion/', params={'background': True}, json=[exclusion('0')])).json()
+    assert body['code'] == 400, body
+    assert enqueued == []
+    assert not await BlacklistJob.exists()
+    assert not await BlacklistUserExclusion.exists()
@@ -0,0 +1,62 @@
+import pytest
+
+from BlackListProjectPlusUp import effective, membership
+from BlackListProjectPlusUp.membership import effective_blacklist, membership_index
+from BlackListProjectPlusUp.models import BlacklistCategory, BlacklistUser, BlacklistUserExclusion
+
+pytestmark = pytest.mark.anyio
+
+
+def write_during_scan(monkeypatch, module, write):
+    """扫描到第一行时执行一次写入，模拟加载期间提交的变更"""
+    canonical_value = module.canonical_value
+    written = []
+
+    def scanning(target_id, target_value):
+        if not written:
+            written.append(target_value)
+            write()
+        return canonical_value(target_id, target_value)
+
+    monkeypatch.setattr(module, 'canonical_value', scanning)
+
+
+@pytest.mark.parametrize('reload', [False, True])
+async def test_membership_writes_during_load_are_replayed(db, monkeypatch, reload):
+    await BlacklistCategory.create(classification=1, cls_name='c', entry_name='c')
+    await BlacklistUser.bulk_create([BlacklistUser(target_id=1, target_value=v, category_id=1) for v in ('1', '2')])
+    if reload:
+        await membership_index.load()
+
+    def write():
+        membership_index.discard(1, '2', 0, 1)
+        membership_index.add(1, '3', 0, 1)
+
+    write_during_scan(monkeypatch, membership, write)
+    assert await membership_index.load(chunk_size=1) == 2
+    assert membership_index.contains(1, '1', 0, 1)
+    assert not membership_index.contains(1, '2', 0, 1)
+    assert membership_index.contains(1, '3', 0, 1)
+
+    membership_index.discard(1, '3', 0, 1)
+    assert not membership_index.contains(1, '3', 0, 1)
+
+
+@pytest.mark.parametrize('reload', [False, True])
+async def test_effective_writes_during_load_are_replayed(db, monkeypatch, reload):
+    await BlacklistCategory.create(classification=1, cls_name='c', entry_name='c')
+    await BlacklistUserExclusion.bulk_create([BlacklistUserExclusion(target_id=1, target_value=v, category_id=1)
+                                              for v in ('1', '2')])
+    await membership_index.load()
+    if reload:
+        await effective_blacklist.load()
+
+    def write():
+        effective_blacklist.remove_exclusion(1, '2', 1)
+        effective_blacklist.add_exclusion(1, '3', 1, 1)
+
+    write_during_scan(monkeypatch, effective, write)
+    assert await effective_blacklist.load(chunk_size=1) == 2
+    assert effective_blacklist.excludes(1, '1', 1)
+    assert not effective_blacklist.excludes(1, '2', 1)
+    assert effective_blacklist.excludes(1, '3', 2)
@@ -0,0 +1,30 @@
+import pytest
+from tortoise.queryset import QuerySet
+
+from BlackListProjectPlusUp.models import BlacklistUser
+from tests.conftest import create_categories
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_user_cursor_pages_skip_count(client, monkeypatch):
+    await create_categories(client, 1)
+    await BlacklistUser.bulk_create([BlacklistUser(target_id=1, target_value=str(v), category_id=1) for v in range(3)])
+    counts = []
+    count = QuerySet.count
+
+    def recording_count(self):
+        counts.append(self.model)
+        return count(self)
+
+    monkeypatch.setattr(QuerySet, 'count', recording_count)
+
+    body = (await client.get('/blacklist/user/', params={'category_id': 1, 'limit': 2})).json()
+    assert (len(body['data']), body['count']) == (2, 3), body
+    assert len(counts) == 1
+
+    body = (await client.get('/blacklist/user/', params={'category_id': 1, 'limit': 2,
+                                                         'after_id': body['next_cursor']})).json()
+    assert [row['target_value'] for row in body['data']] == ['2'], body
+    assert body['count'] is None and body['next_cursor'] is None
+    assert len(counts) == 1
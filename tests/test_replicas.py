@@ -0,0 +1,100 @@
+import asyncio
+import datetime
+
+import httpx
+import pytest
+from tortoise import Tortoise
+from tortoise.connection import connections
+from tortoise.utils import get_schema_sql
+
+from BlackListProjectPlusUp.models import BlacklistChange, BlacklistUser
+from BlackListProjectPlusUp.replicas import prefer_replica, primary_transaction, read_db, replica_pool
+from tests.conftest import create_categories, reset_process_state
+
+pytestmark = pytest.mark.anyio
+
+USER = {"target_id": 1, "target_value": "5", "brand_id": 0, "category_id": 1, "modify_user": 1}
+
+
+@pytest.fixture
+async def client(tmp_path, app):
+    """主库与一个只读副本（各自独立的 SQLite 文件），副本只建表不同步数据"""
+    await Tortoise.init(config={
+        'connections': {'primary': f"sqlite://{tmp_path / 'primary.db'}",
+                        'replica_1': f"sqlite://{tmp_path / 'replica.db'}"},
+        'apps': {'models': {'models': ['BlackListProjectPlusUp.models'], 'default_connection': 'primary'}},
+        'routers': ['BlackListProjectPlusUp.replicas.ReplicaRouter'],
+    })
+    await Tortoise.generate_schemas()
+    await connections.get('replica_1').execute_script(get_schema_sql(connections.get('primary'), safe=True))
+    reset_process_state()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test') as c:
+        yield c
+    await replica_pool.stop()
+    replica_pool.__init__(replica_pool.max_lag, replica_pool.check_interval)
+    await Tortoise.close_connections()
+    reset_process_state()
+
+
+async def request(coroutine):
+    """每个请求在独立任务中执行，prefer_replica 设置的上下文变量不会泄漏到用例中"""
+    return (await asyncio.create_task(coroutine)).json()
+
+
+async def count_users(connection_name):
+    return await BlacklistUser.all().using_db(connections.get(connection_name)).count()
+
+
+async def test_reads_use_healthy_replica_and_writes_use_primary(client):
+    await create_categories(client, 1)
+    assert (await request(client.post('/blacklist/user/', json=[USER])))['data']['success_count'] == 1
+    await replica_pool.start('primary', ['replica_1'])
+    assert replica_pool.healthy == ['replica_1']
+
+    # 副本没有同步数据：读到空结果说明查询走了副本
+    assert (await request(client.get('/blacklist/user/', params={'target_id': 1})))['data'] == []
+
+    body = await request(client.post('/blacklist/user/', json=[dict(USER, target_value='6')]))
+    assert body['data']['success_count'] == 1
+    assert (await count_users('primary'), await count_users('replica_1')) == (2, 0)
+
+
+async def test_lagging_replica_falls_back_to_primary(client):
+    await create_categories(client, 1)
+    await request(client.post('/blacklist/user/', json=[USER]))
+    await BlacklistChange.all().update(create_time=datetime.datetime.now() - datetime.timedelta(seconds=60))
+    await replica_pool.start('primary', ['replica_1'])
+
+    assert replica_pool.healthy == []
+    assert replica_pool.stats()['replicas'][0]['lag_seconds'] >= 60
+    body = await request(client.get('/blacklist/user/', params={'target_id': 1}))
+    assert [row['target_value'] for row in body['data']] == ['5']
+
+
+async def test_failing_replica_falls_back_to_primary(client):
+    await create_categories(client, 1)
+    await request(client.post('/blacklist/user/', json=[USER]))
+    await connections.get('replica_1').execute_script(f'DROP TABLE {BlacklistChange._meta.db_table}')
+    await replica_pool.start('primary', ['replica_1'])
+
+    assert replica_pool.healthy == []
+    assert replica_pool.stats()['replicas'][0]['error']
+    body = await request(client.get('/blacklist/user/', params={'target_id': 1}))
+    assert [row['target_value'] for row in body['data']] == ['5']
+
+
+async def test_primary_transaction_reads_primary_in_replica_request(client):
+    await create_categories(client, 1)
+    await request(client.post('/blacklist/user/', json=[USER]))
+    await replica_pool.start('primary', ['replica_1'])
+
+    async def replica_request():
+        await prefer_replica()
+        outside = (await BlacklistUser.all().count(), read_db(BlacklistUser).connection_name)
+        async with primary_transaction():
+            inside = (await BlacklistUser.all().count(), read_db(BlacklistUser).connection_name)
+        return outside, inside
+
+    outside, inside = await asyncio.create_task(replica_request())
+    assert outside == (0, 'replica_1')
+    assert inside == (1, 'primary')
@@ -0,0 +1,169 @@
+import pytest
+
+from BlackListProjectPlusUp.models import BlacklistUser, BlacklistUserExclusion
+from tests.conftest import create_categories
+
+pytestmark = pytest.mark.anyio
+
+# 紧凑编码不是合法 UTF-8 的目标：IP（4 字节地址）与 uid>=128（8 字节整数）
+PACKED_TARGETS = [(3, '192.168.1.1'), (1, '200')]
+
+
+@pytest.mark.parametrize('target_id,target_value', PACKED_TARGETS)
+async def test_query_users_with_packed_key(client, target_id, target_value):
+    await create_categories(client, 1)
+    await BlacklistUser.create(target_id=target_id, target_value=target_value, category_id=1)
+
+    body = (await client.get('/blacklist/user/', params={'target_id': target_id})).json()
+    assert body['code'] == 200, body
+    assert [row['target_value'] for row in body['data']] == [target_value]
+    assert 'target_key' not in body['data'][0]
+
+
+async def test_query_users_by_value_only(client):
+    """只给 target_value 时按各 target_id 的哈希查找，响应不含查找键"""
+    await create_categories(client, 1)
+    await BlacklistUser.bulk_create([BlacklistUser(target_id=1, target_value='123', category_id=1),
+                                     BlacklistUser(target_id=2, target_value='123', category_id=1),
+                                     BlacklistUser(target_id=2, target_value='456', category_id=1),
+                                     BlacklistUser(target_id=3, target_value='10.0.0.1', category_id=1)])
+
+    body = (await client.get('/blacklist/user/', params={'target_value': ' 123'})).json()
+    assert body['code'] == 200, body
+    assert sorted((row['target_id'], row['target_value']) for row in body['data']) == [(1, '123'), (2, '123')]
+    assert not {'target_key', 'target_hash'} & set(body['data'][0])
+
+    body = (await client.get('/blacklist/user/', params={'target_value': '789'})).json()
+    assert body['data'] == [], body
+
+
+async def test_value_only_filter_uses_hash_index(db):
+    from BlackListProjectPlusUp.models import BlacklistCategory
+    from BlackListProjectPlusUp.queries import target_value_filter
+
+    await BlacklistCategory.create(classification=1, cls_name='c', entry_name='c')
+    await BlacklistUser.bulk_create([BlacklistUser(target_id=t, target_value=str(v), category_id=1)
+                                     for t in (1, 2) for v in range(20)])
+    query = BlacklistUser.filter(await target_value_filter(BlacklistUser, '7'))
+    query.sql()
+    sql, values = query.query.get_parameterized_sql()
+    plan = ' '.join(r['detail'] for r in await query._db.execute_query_dict(f"EXPLAIN QUERY PLAN {sql}", values))
+    assert 'MULTI-INDEX OR' in plan, plan
+    assert 'SCAN' not in plan.replace('MULTI-INDEX OR', ''), plan
+
+
+@pytest.mark.parametrize('target_id,target_value', PACKED_TARGETS)
+async def test_query_and_update_exclusions_with_packed_key(client, target_id, target_value):
+    await create_categories(client, 1)
+    exclusion = await BlacklistUserExclusion.create(target_id=target_id, target_value=target_value, category_id=1)
+
+    body = (await client.get('/blacklist/exclusion/', params={'category_id': 1})).json()
+    assert body['code'] == 200, body
+    assert [row['target_value'] for row in body['data']] == [target_value]
+    assert 'target_key' not in body['data'][0]
+
+    body = (await client.put('/blacklist/exclusion/', json={'id': exclusion.id, 'describe': 'd', 'modify_user': 1})).json()
+    assert body['code'] == 200, body
+    assert body['data']['updated_record']['describe'] == 'd'
+    assert 'target_key' not in body['data']['updated_record']
+
+
+async def explain_tuple_queries(model, key_columns, keys, columns):
+    """执行 fetch_by_tuples 并返回其每条 SQL 的查询计划"""
+    from BlackListProjectPlusUp.queries import fetch_by_tuples
+
+    db = model._meta.db
+    captured = []
+    execute = db.execute_query_dict
+
+    async def capture(sql, values=None):
+        captured.append((sql, values))
+        return await execute(sql, values)
+
+    db.execute_query_dict = capture
+    try:
+        rows = await fetch_by_tuples(model, key_columns, keys, columns)
+    finally:
+        del db.execute_query_dict
+    plans = [' '.join(r['detail'] for r in await execute(f"EXPLAIN QUERY PLAN {sql}", values))
+             for sql, values in captured]
+    return rows, plans
+
+
+@pytest.mark.parametrize('key_columns,keys', [
+    (('target_id', 'target_value'), [(1, '7'), (1, '8')]),
+    (('target_id', 'target_value', 'brand_id', 'category_id'), [(1, '7', 0, 1), (1, '8', 0, 1)]),
+])
+async def test_tuple_match_uses_hash_index(db, key_columns, keys):
+    from BlackListProjectPlusUp.models import BlacklistCategory
+
+    await BlacklistCategory.create(classification=1, cls_name='c', entry_name='c')
+    await BlacklistUser.bulk_create([BlacklistUser(target_id=1, target_value=str(v), category_id=1)
+                                     for v in range(20)])
+    rows, plans = await explain_tuple_queries(BlacklistUser, key_columns, keys, ('target_id', 'target_value'))
+    assert sorted(rows) == [(1, '7'), (1, '8')]
+    for plan in plans:
+        assert '(target_hash=?' in plan, plan
+        assert '(target_id=?)' not in plan, plan
+
+
+@pytest.mark.parametrize('use_index', [False, True])
+async def test_check_endpoints_echo_request_values(client, use_index):
+    """按规范写法匹配，响应中的 target_value 为调用方传入的原值"""
+    from BlackListProjectPlusUp.membership import membership_index
+
+    await create_categories(client, 2)
+    r = await client.post('/blacklist/user/', json=[{"target_id": 4, "target_value": "+8613800138000", "brand_id": 7,
+                                                      "category_id": 1, "modify_user": 1}])
+    assert r.json()['data']['success_count'] == 1
+    if use_index:
+        await membership_index.load()
+
+    body = (await client.post('/blacklist/user/check-all-black',
+                              json=[{"target_id": 4, "target_value": "13800138000"}])).json()
+    assert body['data'][0]['target_value'] == '13800138000'
+    assert body['data'][0]['result'][0]['black_flag'] is True
+
+    body = (await client.post('/blacklist/user/return-blacklist-value', json={
+        "target_id": 4, "brand_id": 7, "category_id": 1, "modify_user": 1,
+        "target_value": ["13800138000", "138-0013-8000", "13900000000"]})).json()
+    assert body['data'] == ["13800138000", "138-0013-8000"]
+
+    body = (await client.post('/blacklist/user/return-all-black-brand', json={
+        "target_id": 4, "target_value": ["13800138000", "13900000000"]})).json()
+    assert body['data'] == [{"target_value": "13800138000", "black_brand": [7]},
+                            {"target_value": "13900000000", "black_brand": []}]
+
+
+def load_migration(name):
+    import importlib.util
+    from pathlib import Path
+
+    path = next(Path(__file__).resolve().parent.parent.joinpath('migrations', 'models').glob(f'{name}_*.py'))
+    spec = importlib.util.spec_from_file_location(f'migration_{name}', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+SAMPLE_TARGETS = [(1, ' 0123'), (1, '200'), (1, 'abc'), (1, '99999999999999999999'), (2, ' Device-A '),
+                  (3, '192.168.1.1'), (3, '::ffff:1.2.3.4'), (3, '2001:DB8::1'), (3, '1.2.3'),
+                  (4, '138-0013-8000'), (4, '+1 (415) 555-0100'), (4, '008613800138000'), (4, 'n/a'),
+                  (5, ' Foo@Example.COM '), (9, ' x ')]
+
+
+@pytest.mark.parametrize('target_id,target_value', SAMPLE_TARGETS)
+def test_backfill_migration_matches_keys(target_id, target_value):
+    """迁移中冻结的算法与编写时的 keys.py 一致"""
+    from BlackListProjectPlusUp import keys
+
+    migration = load_migration('10')
+    key = migration._target_key(target_id, target_value)
+    assert key == keys.target_key(target_id, target_value)
+    assert migration._key_hash(target_id, key) == keys.target_hash(target_id, target_value)
+
+
+async def test_backfill_migration_rejects_other_country_code(monkeypatch):
+    monkeypatch.setenv('PHONE_DEFAULT_COUNTRY_CODE', '1')
+    with pytest.raises(RuntimeError, match='PHONE_DEFAULT_COUNTRY_CODE'):
+        await load_migration('10').upgrade(None)
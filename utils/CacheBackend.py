@@ -0,0 +1,294 @@
+"""
+两级缓存后端：进程内 LRU/TTL（一级）+ Redis 或 InMemoryBackend（二级）
+
+- 一级缓存按字节数上限做 LRU 淘汰，条目过期时间取二级剩余 TTL 与 local_ttl 中较小者，热点键无需网络往返
+- 失效（删除键/清空命名空间）先作用于二级缓存，再通过 Redis pub/sub 广播给所有 worker 清理各自的一级缓存；
+  没有 Redis 时使用进程内的 LocalInvalidationBus 代替，只清理本进程
+- 广播消息丢失或与并发回填交错时，一级缓存最多陈旧 local_ttl 秒
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi_cache.backends.inmemory import InMemoryBackend
+from fastapi_cache.types import Backend
+
+
+class LocalLRUCache:
+    """按字节数上限淘汰的进程内 LRU 缓存，条目带过期时间"""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _cost(key: str, value: bytes) -> int:
+        return len(key) + len(value)
+
+    def get(self, key: str) -> Optional[Tuple[float, bytes]]:
+        """返回 (剩余秒数, 值)，不存在或已过期返回 None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        remaining = expires_at - time.monotonic()
+        if remaining <= 0:
+            self.delete(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return remaining, value
+
+    def set(self, key: str, value: bytes, ttl: float):
+        if ttl <= 0 or self._cost(key, value) > self.max_bytes:
+            self.delete(key)
+            return
+        self.delete(key)
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self.size += self._cost(key, value)
+        while self.size > self.max_bytes:
+            old_key, (_, old_value) = self._entries.popitem(last=False)
+            self.size -= self._cost(old_key, old_value)
+            self.evictions += 1
+
+    def delete(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= self._cost(key, entry[1])
+
+    def clear(self, prefix: Optional[str] = None) -> int:
+        if prefix is None:
+            count = len(self._entries)
+            self._entries.clear()
+            self.size = 0
+            return count
+        keys = [key for key in self._entries if key.startswith(prefix)]
+        for key in keys:
+            self.delete(key)
+        return len(keys)
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "bytes": self.size, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+class LocalInvalidationBus:
+    """没有 Redis 时的失效广播替身：单进程内无需通知其他 worker"""
+
+    async def publish(self, message: dict):
+        pass
+
+    async def start(self, handler):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class RedisInvalidationBus:
+    """基于 Redis pub/sub 的失效广播，断线后自动重新订阅"""
+
+    def __init__(self, redis, channel: str):
+        self.redis = redis
+        self.channel = channel
+        self._task: Optional[asyncio.Task] = None
+
+    async def publish(self, message: dict):
+        await self.redis.publish(self.channel, json.dumps(message))
+
+    async def start(self, handler):
+        self._task = asyncio.create_task(self._listen(handler))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _listen(self, handler):
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        handler(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.warning(f"Cache invalidation subscriber disconnected, retrying: {e}")
+                await asyncio.sleep(1)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+
+class TwoTierBackend(Backend):
+    """
+    fastapi-cache 后端：一级进程内 LRU + 二级共享后端
+
+    除 Backend 接口外提供 get_many / set_many / delete_many，供 utils.CacheUtils 的批量缓存与标签失效使用
+    """
+
+    def __init__(self, remote: Backend, local: LocalLRUCache, local_ttl: float = 10,
+                 bus=None):
+        self.remote = remote
+        self.local = local
+        self.local_ttl = local_ttl
+        self.bus = bus or LocalInvalidationBus()
+        self.instance_id = uuid.uuid4().hex
+
+    @property
+    def redis(self):
+        """二级后端为 Redis 时暴露其客户端（标签索引等共享状态直接存放在 Redis）"""
+        return getattr(self.remote, "redis", None)
+
+    async def start(self):
+        await self.bus.start(self._on_invalidation)
+
+    async def stop(self):
+        await self.bus.stop()
+
+    def _on_invalidation(self, message: dict):
+        if message.get("origin") == self.instance_id:
+            return
+        for key in message.get("keys", []):
+            self.local.delete(key)
+        if message.get("prefix") is not None:
+            self.local.clear(message["prefix"])
+
+    async def _broadcast(self, **message):
+        try:
+            await self.bus.publish({"origin": self.instance_id, **message})
+        except Exception as e:
+            logging.warning(f"Cache invalidation broadcast failed: {e}")
+
+    def _fill_local(self, key: str, ttl: Optional[float], value: Optional[bytes]):
+        if value is not None:
+            self.local.set(key, value, min(self.local_ttl, ttl) if ttl and ttl > 0 else self.local_ttl)
+
+    async def get_with_ttl(self, key: str) -> Tuple[int, Optional[bytes]]:
+        entry = self.local.get(key)
+        if entry is not None:
+            return int(entry[0]), entry[1]
+        ttl, value = await self.remote.get_with_ttl(key)
+        self._fill_local(key, ttl, value)
+        return ttl, value
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return (await self.get_with_ttl(key))[1]
+
+    async def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        values: Dict[str, Optional[bytes]] = {}
+        missing = []
+        for key in keys:
+            entry = self.local.get(key)
+            if entry is not None:
+                values[key] = entry[1]
+            else:
+                missing.append(key)
+
+        if missing:
+            redis = self.redis
+            if redis is not None:
+                async with redis.pipeline(transaction=False) as pipe:
+                    for key in missing:
+                        pipe.ttl(key).get(key)
+                    results = await pipe.execute()
+                fetched = zip(missing, results[0::2], results[1::2])
+            else:
+                fetched = [(key, *await self.remote.get_with_ttl(key)) for key in missing]
+            for key, ttl, value in fetched:
+                self._fill_local(key, ttl, value)
+                values[key] = value
+        return [values[key] for key in keys]
+
+    async def set(self, key: str, value: bytes, expire: Optional[int] = None) -> None:
+        await self.remote.set(key, value, expire)
+        self._fill_local(key, expire, value)
+
+    async def set_many(self, values: Dict[str, bytes], expire: Optional[int] = None):
+        redis = self.redis
+        if redis is not None:
+            async with redis.pipeline(transaction=False) as pipe:
+                for key, value in values.items():
+                    pipe.set(key, value, ex=expire)
+                await pipe.execute()
+        else:
+            for key, value in values.items():
+                await self.remote.set(key, value, expire)
+        for key, value in values.items():
+            self._fill_local(key, expire, value)
+
+    async def delete_many(self, keys: Iterable[str]) -> int:
+        keys = list(keys)
+        if not keys:
+            return 0
+        redis = self.redis
+        if redis is not None:
+            await redis.delete(*keys)
+        else:
+            for key in keys:
+                try:
+                    await self.remote.clear(key=key)
+                except KeyError:
+                    pass  # 条目已过期
+        for key in keys:
+            self.local.delete(key)
+        await self._broadcast(keys=keys)
+        return len(keys)
+
+    async def clear(self, namespace: Optional[str] = None, key: Optional[str] = None) -> int:
+        if namespace:
+            count = await self.remote.clear(namespace=namespace) or 0
+            self.local.clear(namespace)
+            await self._broadcast(prefix=namespace)
+            return count
+        if key:
+            return await self.delete_many([key])
+        return 0
+
+
+async def create_cache_backend() -> TwoTierBackend:
+    """
+    按环境变量创建两级缓存后端并启动失效订阅：
+    CACHE_REDIS_URL（为空时二级使用 InMemoryBackend）、CACHE_LOCAL_MAX_BYTES、CACHE_LOCAL_TTL、
+    CACHE_INVALIDATION_CHANNEL
+    """
+    local = LocalLRUCache(max_bytes=int(os.getenv("CACHE_LOCAL_MAX_BYTES", str(64 * 1024 * 1024))))
+    local_ttl = float(os.getenv("CACHE_LOCAL_TTL", "10"))
+    redis_url = os.getenv("CACHE_REDIS_URL", "")
+
+    if redis_url:
+        import redis.asyncio as aioredis
+        from fastapi_cache.backends.redis import RedisBackend
+
+        client = aioredis.from_url(redis_url)
+        backend = TwoTierBackend(RedisBackend(client), local, local_ttl, RedisInvalidationBus(
+            client, os.getenv("CACHE_INVALIDATION_CHANNEL", "blacklist-cache:invalidate")))
+    else:
+        backend = TwoTierBackend(InMemoryBackend(), local, local_ttl)
+
+    await backend.start()
+    logging.info(f"Two-tier cache initialised (remote={'redis' if redis_url else 'inmemory'}, "
+                 f"local_max_bytes={local.max_bytes}, local_ttl={local_ttl}s)")
+    return backend
@@ -1,90 +1,355 @@
 # cache_utils.py
+"""
+结构化缓存键 + 标签失效
+
+- 缓存键：{prefix}:{resource}:{参数摘要}，参数经规范化（去掉 None、按键排序）后取 sha1
+- 标签：每个缓存条目按其查询条件中最具体的维度打标签
+    target:{target_id}:{target_value}   按目标查询
+    category:{category_id}               按分类查询
+    classification:{classification}     按大类查询
+    all:{resource}                       无上述过滤条件的查询（如全量分页、仅按品牌查询）
+- 写操作按写入涉及的目标/分类/大类失效对应标签，不再清空整个缓存
+"""
+import hashlib
+import json
+import logging
+import time
+from functools import wraps
+from typing import Awaitable, Callable, Optional, Any, Dict, Iterable, List, Sequence, Set, Tuple
 
-from typing import Callable, Optional, Awaitable, Union, Any, Tuple, Dict
 from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
 from fastapi_cache import FastAPICache
 
-# ========= user 缓存 KeyBuilder =========
-async def get_user_cache_key(
-    func: Callable,
-    namespace: Optional[str],
-    request: Request,
-    response: Optional[Response],
-    *args: Tuple[Any, ...],
-    **kwargs: Dict[str, Any],
-) -> str:
-    params = kwargs.get("params") or kwargs  # 获取 Pydantic 参数对象或字典
-    if "target_id" in params:
-        return (
-            f"user:query:target_id={params.get('target_id')}:target_value={params.get('target_value')}:"
-            f"category_id={params.get('category_id')}:classification={params.get('classification')}:"
-            f"offset={params.get('offset')}:limit={params.get('limit')}"
-        )
-    else:
-        return (
-            f"user:check:target_id={params.get('target_id')}:target_value={params.get('target_value')}:"
-            f"category_id={params.get('category_id')}"
-        )
-
-
-async def clear_user_cache(target_id=None, target_value=None, category_id=None):
-    pattern = "user:*"
-    if target_id:
-        pattern += f"*:target_id={target_id}:*"
-    if target_value:
-        pattern += f"*:target_value={target_value}:*"
-    if category_id:
-        pattern += f"*:category_id={category_id}:*"
-    await FastAPICache.clear(namespace=pattern)
-
-
-# ========= category 缓存 KeyBuilder =========
-async def get_category_cache_key(
-    func: Callable,
-    namespace: Optional[str],
-    request: Request,
-    response: Optional[Response],
-    *args: Tuple[Any, ...],
-    **kwargs: Dict[str, Any],
-) -> str:
-    params = kwargs.get("params") or kwargs
-    return (
-        f"category:{params.get('id')}:{params.get('name')}:"
-        f"{params.get('classification')}"
-    )
-
-
-async def clear_category_cache(category_id=None, classification=None):
-    pattern = "category:*"
-    if category_id:
-        pattern += f"*:id={category_id}:*"
-    if classification:
-        pattern += f"*:classification={classification}:*"
-    await FastAPICache.clear(namespace=pattern)
-
-
-# ========= exclusion 缓存 KeyBuilder =========
-async def get_exclusion_cache_key(
-    func: Callable,
-    namespace: Optional[str],
-    request: Request,
-    response: Optional[Response],
-    *args: Tuple[Any, ...],
-    **kwargs: Dict[str, Any],
-) -> str:
-    params = kwargs.get("params") or kwargs
-    return (
-        f"exclusion:{params.get('target_id')}:{params.get('target_value')}:"
-        f"{params.get('level')}"
-    )
-
-
-async def clear_exclusion_cache(target_id=None, target_value=None, level=None):
-    pattern = "exclusion:*"
-    if target_id:
-        pattern += f"*:target_id={target_id}:*"
-    if target_value:
-        pattern += f"*:target_value={target_value}:*"
-    if level:
-        pattern += f"*:level={level}:*"
-    await FastAPICache.clear(namespace=pattern)
+
+# ========= 标签 =========
+def target_tag(target_id, target_value) -> str:
+    return f"target:{target_id}:{target_value}"
+
+
+def category_tag(category_id) -> str:
+    return f"category:{category_id}"
+
+
+def classification_tag(classification) -> str:
+    return f"classification:{classification}"
+
+
+def resource_tag(resource: str) -> str:
+    return f"all:{resource}"
+
+
+def filter_tags(resource: str, target_id=None, target_value=None, category_id=None, classification=None) -> List[str]:
+    """按查询条件中最具体的维度返回缓存条目的标签"""
+    if target_id is not None and target_value is not None:
+        return [target_tag(target_id, target_value)]
+    if category_id is not None:
+        return [category_tag(category_id)]
+    if classification is not None:
+        return [classification_tag(classification)]
+    return [resource_tag(resource)]
+
+
+# ========= 缓存键 =========
+def build_cache_key(resource: str, params: Dict[str, Any]) -> str:
+    """{prefix}:{resource}:{规范化参数的摘要}"""
+    normalized = {k: v for k, v in jsonable_encoder(params).items() if v is not None}
+    digest = hashlib.sha1(
+        json.dumps(normalized, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")).hexdigest()
+    return f"{FastAPICache.get_prefix()}:{resource}:{digest}"
+
+
+# ========= 标签索引 =========
+class CacheTagIndex:
+    """
+    标签 -> 缓存键 的索引
+
+    后端为 Redis 时索引存放在 Redis 集合 {prefix}:tag:{tag} 中，多 worker 共享；
+    其他后端（InMemoryBackend）存放在进程内，记录每个键的过期时间，写入时顺带清理已过期的键。
+    """
+
+    def __init__(self):
+        self._local: Dict[str, Dict[str, float]] = {}
+        self._tag_ttl = 0
+
+    @staticmethod
+    def _redis(backend):
+        return getattr(backend, "redis", None)
+
+    @staticmethod
+    def _tag_key(tag: str) -> str:
+        return f"{FastAPICache.get_prefix()}:tag:{tag}"
+
+    async def add(self, backend, key: str, tags: Iterable[str], expire: int):
+        """记录缓存键所属标签；标签集合的过期时间不短于其中任一条目"""
+        await self.add_many(backend, [(key, tags)], expire)
+
+    async def add_many(self, backend, entries: Iterable[Tuple[str, Iterable[str]]], expire: int):
+        """批量记录 [(缓存键, 标签)]，Redis 下合并为一次 pipeline"""
+        by_tag: Dict[str, Set[str]] = {}
+        for key, tags in entries:
+            for tag in tags:
+                by_tag.setdefault(tag, set()).add(key)
+        if not by_tag:
+            return
+
+        redis = self._redis(backend)
+        if redis is None:
+            now = time.monotonic()
+            for tag, new_keys in by_tag.items():
+                keys = self._local.setdefault(tag, {})
+                for stale in [k for k, expires_at in keys.items() if expires_at < now]:
+                    del keys[stale]
+                for key in new_keys:
+                    keys[key] = now + expire
+            return
+
+        self._tag_ttl = max(self._tag_ttl, expire)
+        async with redis.pipeline(transaction=False) as pipe:
+            for tag, new_keys in by_tag.items():
+                pipe.sadd(self._tag_key(tag), *new_keys)
+                pipe.expire(self._tag_key(tag), self._tag_ttl)
+            await pipe.execute()
+
+    async def pop(self, backend, tags: Iterable[str]) -> Set[str]:
+        """取出并删除标签下的全部缓存键"""
+        tags = list(tags)
+        redis = self._redis(backend)
+        if redis is None:
+            keys: Set[str] = set()
+            for tag in tags:
+                keys |= self._local.pop(tag, {}).keys()
+            return keys
+
+        async with redis.pipeline(transaction=True) as pipe:
+            for tag in tags:
+                pipe.smembers(self._tag_key(tag))
+            pipe.delete(*[self._tag_key(tag) for tag in tags])
+            members = await pipe.execute()
+        return {k.decode() if isinstance(k, bytes) else k for group in members[:-1] for k in group}
+
+
+tag_index = CacheTagIndex()
+
+
+def _cache_backend():
+    """缓存未初始化或被禁用时返回 None，接口直接访问数据库"""
+    if not FastAPICache.get_enable() or FastAPICache._backend is None:
+        return None
+    return FastAPICache.get_backend()
+
+
+async def invalidate_tags(tags: Iterable[str]) -> int:
+    """删除带有任一标签的缓存条目，返回删除的键数量"""
+    backend = _cache_backend()
+    tags = set(tags)
+    if backend is None or not tags:
+        return 0
+
+    try:
+        keys = await tag_index.pop(backend, tags)
+        if not keys:
+            return 0
+        redis = getattr(backend, "redis", None)
+        if hasattr(backend, "delete_many"):
+            await backend.delete_many(keys)
+        elif redis is not None:
+            await redis.delete(*keys)
+        else:
+            for key in keys:
+                try:
+                    await backend.clear(key=key)
+                except KeyError:
+                    pass  # 条目已过期
+        return len(keys)
+    except Exception as e:
+        logging.warning(f"Cache invalidation failed for tags {sorted(tags)}: {e}")
+        return 0
+
+
+async def invalidate_resource(resource: str) -> int:
+    """清空某一资源的全部缓存（仅用于分类删除这类影响面无法枚举的低频写操作）"""
+    backend = _cache_backend()
+    if backend is None:
+        return 0
+    try:
+        return await backend.clear(namespace=f"{FastAPICache.get_prefix()}:{resource}") or 0
+    except Exception as e:
+        logging.warning(f"Cache invalidation failed for resource {resource}: {e}")
+        return 0
+
+
+# ========= 缓存装饰器 =========
+def cached(resource: str, tags: Callable[..., Iterable[str]], expire: int = 60):
+    """
+    带标签的接口缓存
+
+    - resource：缓存键/全量标签使用的资源名（user、category、exclusion）
+    - tags：接收接口参数（关键字参数）并返回该条目标签的函数
+    只缓存正常返回值；error_response 返回的 JSONResponse 不缓存。
+    请求头 Cache-Control: no-store 跳过缓存，no-cache 跳过读取但写入新结果。
+    """
+
+    def wrapper(func):
+        @wraps(func)
+        async def inner(*args, **kwargs):
+            backend = _cache_backend()
+            request = next((v for v in kwargs.values() if isinstance(v, Request)), None)
+            cache_control = request.headers.get("Cache-Control") if request is not None else None
+            if backend is None or cache_control == "no-store":
+                return await func(*args, **kwargs)
+
+            params = {k: v for k, v in kwargs.items() if not isinstance(v, (Request, Response))}
+            key = build_cache_key(resource, params)
+            coder = FastAPICache.get_coder()
+
+            if cache_control != "no-cache":
+                try:
+                    hit = await backend.get(key)
+                    if hit is not None:
+                        return coder.decode(hit)
+                except Exception as e:
+                    logging.warning(f"Error retrieving cache key '{key}': {e}")
+
+            result = await func(*args, **kwargs)
+            if isinstance(result, Response):
+                return result
+
+            try:
+                await backend.set(key, coder.encode(result), expire)
+                await tag_index.add(backend, key, tags(**params), expire)
+            except Exception as e:
+                logging.warning(f"Error setting cache key '{key}': {e}")
+            return result
+
+        return inner
+
+    return wrapper
+
+
+# ========= 批量查询的请求体/条目缓存 =========
+def _digest(value: Any) -> str:
+    return hashlib.sha1(
+        json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+
+def normalize_items(items: Iterable[Sequence]) -> List[Tuple[str, ...]]:
+    """请求条目规范化：字段值统一转为字符串，去重并排序，使顺序不同或 int/str 混用的相同批次得到同一个键"""
+    return sorted({tuple(str(v) for v in item) for item in items})
+
+
+def build_body_cache_key(resource: str, kind: str, items: Iterable[Sequence]) -> str:
+    """整批请求的缓存键：{prefix}:{resource}:{kind}:body:{规范化条目摘要}"""
+    return f"{FastAPICache.get_prefix()}:{resource}:{kind}:body:{_digest(normalize_items(items))}"
+
+
+def build_item_cache_key(resource: str, kind: str, item: Sequence) -> str:
+    """单个条目的缓存键：{prefix}:{resource}:{kind}:{条目摘要}"""
+    return f"{FastAPICache.get_prefix()}:{resource}:{kind}:{_digest([str(v) for v in item])}"
+
+
+async def _get_many(backend, keys: List[str]) -> List[Optional[bytes]]:
+    if hasattr(backend, "get_many"):
+        return await backend.get_many(keys)
+    redis = getattr(backend, "redis", None)
+    if redis is not None:
+        return await redis.mget(keys)
+    return [await backend.get(key) for key in keys]
+
+
+async def _set_many(backend, values: Dict[str, bytes], expire: int):
+    if hasattr(backend, "set_many"):
+        return await backend.set_many(values, expire)
+    redis = getattr(backend, "redis", None)
+    if redis is None:
+        for key, value in values.items():
+            await backend.set(key, value, expire)
+        return
+    async with redis.pipeline(transaction=False) as pipe:
+        for key, value in values.items():
+            pipe.set(key, value, ex=expire)
+        await pipe.execute()
+
+
+async def cached_lookup(resource: str, kind: str, items: Sequence[Tuple],
+                        fetch: Callable[[List[Tuple]], Awaitable[Dict[Tuple, Any]]],
+                        tags: Callable[[Tuple], Iterable[str]], expire: int = 60) -> Dict[Tuple, Any]:
+    """
+    批量查询接口的两级缓存
+
+    1. 整批规范化键命中时直接返回（重复提交的相同批次只读一次缓存）
+    2. 否则逐条目读取缓存，只把未命中的条目交给 fetch 查询数据库，并写回条目缓存与整批缓存
+
+    - items：条目键元组，调用方需先做值的规范化（如 target_value 转为字符串）
+    - fetch(misses) -> {item: value}，需包含每个未命中条目，value 需可 JSON 序列化；fetch 抛出的异常直接向上传递，结果不缓存
+    - tags(item)：条目对应的失效标签
+    返回 {item: value}
+    """
+    items = list(dict.fromkeys(items))
+    backend = _cache_backend()
+    if backend is None or not items:
+        return await fetch(items) if items else {}
+
+    body_key = build_body_cache_key(resource, kind, items)
+    item_keys = {item: build_item_cache_key(resource, kind, item) for item in items}
+    found: Dict[Tuple, Any] = {}
+    try:
+        hit = await backend.get(body_key)
+        if hit is not None:
+            answers = {tuple(item): value for item, value in json.loads(hit)}
+            return {item: answers[tuple(str(v) for v in item)] for item in items}
+
+        for item, raw in zip(items, await _get_many(backend, list(item_keys.values()))):
+            if raw is not None:
+                found[item] = json.loads(raw)
+    except Exception as e:
+        logging.warning(f"Error retrieving cached {resource}:{kind} items: {e}")
+        found = {}
+
+    misses = [item for item in items if item not in found]
+    if misses:
+        fetched = await fetch(misses)
+        found.update(fetched)
+        try:
+            await _set_many(backend, {item_keys[item]: json.dumps(fetched[item]).encode("utf-8")
+                                      for item in misses}, expire)
+            await tag_index.add_many(backend, [(item_keys[item], tags(item)) for item in misses], expire)
+        except Exception as e:
+            logging.warning(f"Error setting cached {resource}:{kind} items: {e}")
+
+    try:
+        body = [[[str(v) for v in item], found[item]] for item in items]
+        await backend.set(body_key, json.dumps(body).encode("utf-8"), expire)
+        await tag_index.add(backend, body_key, {t for item in items for t in tags(item)}, expire)
+    except Exception as e:
+        logging.warning(f"Error setting cache key '{body_key}': {e}")
+
+    return found
+
+
+# ========= 各资源写操作后的失效 =========
+async def clear_user_cache(targets: Iterable[Tuple[int, str]] = (), category_ids: Iterable[int] = (),
+                           classifications: Iterable[int] = ()) -> int:
+    """黑名单写入/删除后调用：失效涉及的目标、分类、大类以及无过滤条件的黑名单查询缓存"""
+    tags = {resource_tag("user")}
+    tags |= {target_tag(target_id, str(target_value)) for target_id, target_value in targets}
+    tags |= {category_tag(c) for c in category_ids}
+    tags |= {classification_tag(c) for c in classifications}
+    return await invalidate_tags(tags)
+
+
+async def clear_category_cache(category_id: Optional[int] = None, classifications: Iterable[int] = ()) -> int:
+    """分类创建/更新后调用：classifications 传入变更前后的大类"""
+    tags = {resource_tag("category")}
+    if category_id is not None:
+        tags.add(category_tag(category_id))
+    tags |= {classification_tag(c) for c in classifications}
+    return await invalidate_tags(tags)
+
+
+async def clear_exclusion_cache(targets: Iterable[Tuple[int, str]] = (), category_ids: Iterable[int] = ()) -> int:
+    """白名单写入/删除后调用"""
+    tags = {resource_tag("exclusion")}
+    tags |= {target_tag(target_id, str(target_value)) for target_id, target_value in targets}
+    tags |= {category_tag(c) for c in category_ids}
+    return await invalidate_tags(tags)
@@ -0,0 +1,45 @@
+"""
+主键游标分页
+
+游标是对上一页最后一条记录主键的不透明编码，客户端把响应中的 next_cursor 原样作为 after_id 回传；
+查询按主键升序并以 id > 游标 定位，深分页与首页代价相同（offset 需要先扫描并丢弃前面的全部行）
+"""
+import base64
+import binascii
+from typing import List, Optional, Tuple
+
+from tortoise.queryset import QuerySet
+
+
+def encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(f"id:{last_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """解析游标，格式不正确时抛出 ValueError"""
+    try:
+        kind, _, value = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().partition(":")
+        if kind == "id":
+            return int(value)
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        pass
+    raise ValueError(f"Invalid cursor: {cursor}")
+
+
+async def fetch_page(query: QuerySet, limit: int, offset: int = 0, after_id: Optional[str] = None
+                     ) -> Tuple[List, Optional[str]]:
+    """
+    按主键升序取一页，返回 (记录列表, next_cursor)
+
+    - 传入 after_id（上一页的 next_cursor）时按 id > 游标 定位，忽略 offset
+    - 未传入时沿用 offset，首页同样返回 next_cursor，可从任意 offset 页切换到游标分页
+    多取一条判断是否还有下一页，最后一页的 next_cursor 为 None
+    """
+    if after_id:
+        query = query.filter(id__gt=decode_cursor(after_id))
+    elif offset:
+        query = query.offset(offset)
+    rows = await query.order_by('id').limit(limit + 1)
+    if len(rows) > limit:
+        return rows[:limit], encode_cursor(rows[limit - 1].id)
+    return rows, None